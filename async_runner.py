@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Asyncio runner for concurrent subprocess stages.
+
+Scripts start their external tools (ffmpeg, ffprobe, exiftool) with
+run_process() inside one event loop, so independent stages overlap instead
+of running back to back. Each child's stderr is read as it arrives, split on
+\\r and \\n so ffmpeg -stats redraws count as lines, and progress matches
+update that child's bar in a shared ProgressDisplay.
+
+Children run in their own process group. When the loop is cancelled (Ctrl-C
+under asyncio.run, or a sibling task failing in a TaskGroup), every running
+child gets SIGINT, then SIGKILL after STOP_TIMEOUT_S, before the cancellation
+propagates, so no ffmpeg is left writing frames in the background.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+import asyncio
+import os
+import re
+import signal
+import subprocess
+
+if TYPE_CHECKING:
+    from tqdm import tqdm
+
+STOP_TIMEOUT_S: float = 10.0
+STDERR_TAIL_LINES: int = 20
+
+
+class ProgressDisplay:
+    """One progress bar per child process, stacked in the terminal."""
+
+    def __init__(self) -> None:
+        self._bars: dict[str, tqdm] = {}
+
+    def __enter__(self) -> ProgressDisplay:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def add(self, label: str, total: int | None = None, unit: str = "it") -> None:
+        from tqdm import tqdm
+        self._bars[label] = tqdm(total=total, unit=unit, desc=label, position=len(self._bars), dynamic_ncols=True)
+
+    def set(self, label: str, value: int) -> None:
+        """Move a bar to an absolute count (children report totals, not increments)."""
+        bar = self._bars.get(label)
+        if bar is not None and value > bar.n:
+            bar.update(value - bar.n)
+
+    def write(self, message: str) -> None:
+        from tqdm import tqdm
+        tqdm.write(message)
+
+    def close(self) -> None:
+        for bar in self._bars.values():
+            bar.close()
+        self._bars.clear()
+
+
+@dataclass
+class ProcessResult:
+    args: list[str]
+    returncode: int
+    stdout: str
+    stderr_tail: list[str]
+
+
+async def _read_lines(stream: asyncio.StreamReader, on_line: Callable[[str], None]) -> None:
+    partial = b""
+    while chunk := await stream.read(65536):
+        parts = re.split(rb"[\r\n]", partial + chunk)
+        partial = parts.pop()
+        for part in parts:
+            if part:
+                on_line(part.decode(errors="replace"))
+    if partial:
+        on_line(partial.decode(errors="replace"))
+
+
+async def stop_process(process: asyncio.subprocess.Process) -> None:
+    """SIGINT to the child's process group, SIGKILL if it has not exited after STOP_TIMEOUT_S."""
+    for sig in (signal.SIGINT, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), STOP_TIMEOUT_S)
+            return
+        except asyncio.TimeoutError:
+            continue
+
+
+async def run_process(cmd: list[str], label: str | None = None, display: ProgressDisplay | None = None,
+                      progress: re.Pattern[str] | None = None, check: bool = True) -> ProcessResult:
+    """Run cmd and collect its stdout. stderr lines matching progress (one integer group)
+    move the bar of label; the last lines of stderr are kept for error messages."""
+    process = await asyncio.create_subprocess_exec(*cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                                   stderr=subprocess.PIPE, start_new_session=True)
+    tail: deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+
+    def on_line(line: str) -> None:
+        tail.append(line)
+        match = progress.search(line) if progress is not None else None
+        if match and display is not None and label is not None:
+            display.set(label, int(match.group(1)))
+
+    try:
+        stdout, _, returncode = await asyncio.gather(process.stdout.read(), _read_lines(process.stderr, on_line),
+                                                     process.wait())
+    except asyncio.CancelledError:
+        await stop_process(process)
+        raise
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout.decode(errors="replace"), "\n".join(tail))
+    return ProcessResult(list(cmd), returncode, stdout.decode(errors="replace"), list(tail))
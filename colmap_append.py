@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Append mode for the colmap_sfm_* scripts.
+
+Registers images that are not yet in a run's database into its existing
+sparse/0 model: features are extracted for the new images only, each new
+image is matched against its temporal or retrieved neighbours only, and the
+incremental mapper continues from sparse/0 with the existing poses fixed, so
+bundle adjustment only moves the new images and the points they observe.
+The cost scales with the delta rather than the dataset.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from pathlib import Path
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+import numpy as np
+
+from colmap_database import existing_image_names
+from colmap_features import run_feature_extraction
+from colmap_matching import (
+    RETRIEVAL_TOP_K, MatcherPlan, frame_streams, list_images, retrieval_pairs,
+    video_frame_pairs, write_pair_list,
+)
+from colmap_model import read_model_stats
+from feature_cache import camera_group
+from imu_extractor import load_heading_data_csv
+
+# Flags replaced by --ImageReader.existing_camera_id when new images join a model camera.
+_CAMERA_FLAGS: tuple[str, ...] = ("--ImageReader.single_camera", "--ImageReader.single_camera_per_folder")
+
+
+def append_pairs(
+    image_path: Path,
+    names: list[str],
+    new_names: list[str],
+    capture_type: str,
+    heading_csv: Path | None = None,
+    frame_interval_s: float = 1.0,
+    cache_path: Path | None = None,
+) -> np.ndarray:
+    """Pairs (indices into names) that involve at least one new image."""
+    index = {name: i for i, name in enumerate(names)}
+    new_idx = np.array([index[name] for name in new_names], dtype=np.int64)
+    if capture_type == "video" and frame_streams(names) is not None:
+        heading = None
+        if heading_csv is not None and heading_csv.is_file():
+            heading = load_heading_data_csv(heading_csv)
+        pairs = video_frame_pairs(names, heading, frame_interval_s)
+        is_new = np.zeros(len(names), dtype=bool)
+        is_new[new_idx] = True
+        return pairs[is_new[pairs[:, 0]] | is_new[pairs[:, 1]]]
+    return retrieval_pairs(image_path, names, RETRIEVAL_TOP_K, cache_path=cache_path, queries=new_idx)
+
+
+def append_extraction_groups(db_path: Path, extractor_options: list[str],
+                             new_names: list[str]) -> list[tuple[list[str], list[str]]]:
+    """(image names, feature_extractor options) per extraction run for the new images.
+
+    A new image whose camera group (single_camera / single_camera_per_folder, see
+    feature_cache.camera_group) already has a camera in the database is extracted
+    with --ImageReader.existing_camera_id, so it uses the model's calibrated
+    intrinsics instead of a new camera with guessed ones. Images of other groups
+    keep the original options and get new cameras.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cameras: dict[str, int] = {}
+        for name, camera_id in conn.execute("SELECT name, camera_id FROM images ORDER BY image_id"):
+            group = camera_group(name, extractor_options)
+            if group is not None:
+                cameras.setdefault(group, camera_id)
+    finally:
+        conn.close()
+    base = [arg for flag, value in zip(extractor_options[::2], extractor_options[1::2])
+            if flag not in _CAMERA_FLAGS for arg in (flag, value)]
+    groups: dict[int | None, list[str]] = defaultdict(list)
+    for name in new_names:
+        group = camera_group(name, extractor_options)
+        groups[cameras.get(group) if group is not None else None].append(name)
+    return [(names, extractor_options if camera_id is None
+             else [*base, "--ImageReader.existing_camera_id", str(camera_id)])
+            for camera_id, names in groups.items()]
+
+
+def append_mapper_command(db_path: Path, img_path: Path, model_dir: Path, out_dir: Path,
+                          refine_intrinsics: bool) -> list[str]:
+    """mapper continuing model_dir with the existing poses fixed. Intrinsics are only
+    refined when new images brought new cameras."""
+    command = [
+        "colmap", "mapper",
+        "--database_path", str(db_path),
+        "--image_path", str(img_path),
+        "--input_path", str(model_dir),
+        "--output_path", str(out_dir),
+        "--Mapper.fix_existing_images", "1",
+    ]
+    if not refine_intrinsics:
+        command += [
+            "--Mapper.ba_refine_focal_length", "0",
+            "--Mapper.ba_refine_principal_point", "0",
+            "--Mapper.ba_refine_extra_params", "0",
+        ]
+    return command
+
+
+def append_images(
+    run_dir: Path,
+    extractor_options: list[str],
+    capture_type: str,
+    use_gpu: int,
+    gpu_index: str,
+    heading_csv: Path | None = None,
+    frame_interval_s: float = 1.0,
+) -> None:
+    """Register images in run_dir/images that are missing from the run's database into sparse/0."""
+    db_path = run_dir / "database" / "database.db"
+    img_path = run_dir / "images"
+    model_dir = run_dir / "sparse" / "0"
+    if not db_path.is_file() or not (model_dir / "images.bin").is_file():
+        print(f"[ERROR] Append mode needs an existing database and sparse/0 model in {run_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    names = list_images(img_path)
+    known = set(existing_image_names(db_path))
+    new_names = [name for name in names if name not in known]
+    if not new_names:
+        print("[INFO] No new images to append")
+        return
+    before = read_model_stats(model_dir)
+    print(f"[INFO] Appending {len(new_names)} new images to model with {before.describe()}")
+
+    # Features for the new images only, in the model's cameras where their group has one
+    print("[INFO] Running feature extraction for new images...")
+    groups = append_extraction_groups(db_path, extractor_options, new_names)
+    new_cameras = 0
+    for group_names, options in groups:
+        if "--ImageReader.existing_camera_id" not in options:
+            new_cameras += len(group_names)
+        run_feature_extraction(db_path, img_path, options, use_gpu, image_names=group_names)
+    if new_cameras:
+        print(f"[INFO] {new_cameras} new images have no camera in the model; their intrinsics are refined")
+
+    # Match new images against their temporal / retrieved neighbours only
+    pairs = append_pairs(img_path, names, new_names, capture_type, heading_csv, frame_interval_s,
+                         cache_path=db_path.parent / "retrieval_descriptors.npz")
+    pairs_path = db_path.parent / "append_pairs.txt"
+    write_pair_list(pairs_path, names, pairs)
+    plan = MatcherPlan("matches_importer", f"{len(new_names)} new images against their neighbours",
+                       len(names), len(pairs), ["--match_list_path", str(pairs_path), "--match_type", "pairs"])
+    plan.log()
+    subprocess.run(plan.command(db_path, use_gpu, gpu_index), check=True)
+
+    # Register the new images into sparse/0; existing poses stay fixed
+    print("[INFO] Registering new images into sparse/0...")
+    out_dir = run_dir / "sparse" / "append_tmp"
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+    subprocess.run(append_mapper_command(db_path, img_path, model_dir, out_dir, refine_intrinsics=new_cameras > 0),
+                   check=True)
+
+    backup_dir = run_dir / "sparse" / "0_before_append"
+    if backup_dir.exists():
+        shutil.rmtree(backup_dir)
+    shutil.move(str(model_dir), str(backup_dir))
+    shutil.move(str(out_dir), str(model_dir))
+    after = read_model_stats(model_dir)
+    print(f"[INFO] Registered {after.num_images - before.num_images} of {len(new_names)} new images; "
+          f"model now has {after.describe()}")
+    print(f"[INFO] Previous model kept in {backup_dir}")
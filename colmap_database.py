@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Helpers for COLMAP's SQLite database (database/database.db).
+
+Column lists are read from the database itself, so extra columns of the
+installed COLMAP's schema are carried along. Merging needs to know how each
+table refers to images, cameras, rigs and frames: the tables of COLMAP 3.x
+up to the rig/frame schema of 3.12 (rigs, rig_sensors, frames, frame_data)
+are handled, and merging fails on any other non-empty table instead of
+dropping its rows.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import shutil
+import sqlite3
+
+# COLMAP packs an image pair into one integer: pair_id = id1 * MAX_IMAGE_ID + id2, id1 < id2.
+MAX_IMAGE_ID: int = 2**31 - 1
+PAIR_TABLES: tuple[str, ...] = ("matches", "two_view_geometries")
+# COLMAP SensorType::CAMERA: a camera sensor id is a camera_id, its data id an image_id.
+CAMERA_SENSOR: int = 0
+
+
+def table_columns(conn: sqlite3.Connection, table: str, schema: str = "main") -> list[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def list_tables(conn: sqlite3.Connection, schema: str = "main") -> list[str]:
+    rows = conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type='table' "
+                        "AND name NOT LIKE 'sqlite_%'")
+    return [row[0] for row in rows]
+
+
+def existing_image_names(db_path: Path) -> list[str]:
+    """Names of the images already registered in a database (empty if it has no schema yet)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        if "images" not in list_tables(conn):
+            return []
+        return [row[0] for row in conn.execute("SELECT name FROM images ORDER BY image_id")]
+    finally:
+        conn.close()
+
+
+def add_camera_frame(conn: sqlite3.Connection, image_id: int, camera_id: int) -> int:
+    """Give an image its single-camera frame on the COLMAP >= 3.12 schema, as feature_extractor does:
+    a frame of the camera's trivial rig (created if missing) holding the image. Returns the frame_id."""
+    where = "ref_sensor_id = ? AND ref_sensor_type = ?"
+    if "rig_sensors" in list_tables(conn):
+        where += " AND rig_id NOT IN (SELECT rig_id FROM rig_sensors)"
+    row = conn.execute(f"SELECT rig_id FROM rigs WHERE {where} LIMIT 1", (camera_id, CAMERA_SENSOR)).fetchone()
+    rig_id = row[0] if row else conn.execute("INSERT INTO rigs (ref_sensor_id, ref_sensor_type) VALUES (?, ?)",
+                                             (camera_id, CAMERA_SENSOR)).lastrowid
+    frame_id = conn.execute("INSERT INTO frames (rig_id) VALUES (?)", (rig_id,)).lastrowid
+    conn.execute("INSERT INTO frame_data (frame_id, data_id, sensor_id, sensor_type) VALUES (?, ?, ?, ?)",
+                 (frame_id, image_id, camera_id, CAMERA_SENSOR))
+    return frame_id
+
+
+def merge_databases(shard_dbs: list[Path], out_db: Path, share_cameras: bool = False) -> int:
+    """Merge COLMAP databases into out_db, renumbering image and camera ids.
+
+    The first database is copied as the base (so out_db keeps the installed
+    COLMAP's schema); every further database is attached and bulk-copied with
+    INSERT ... SELECT. With share_cameras, cameras with identical model, size
+    and parameters collapse into one (what --ImageReader.single_camera expects),
+    and so do the single-camera rigs of COLMAP >= 3.12. Raises ValueError for
+    non-empty tables whose ids it does not know how to renumber.
+    Returns the number of images in out_db.
+    """
+    if not shard_dbs:
+        raise ValueError("No databases to merge")
+    out_db.parent.mkdir(parents=True, exist_ok=True)
+    if out_db.exists():
+        out_db.unlink()
+    shutil.copyfile(shard_dbs[0], out_db)
+
+    conn = sqlite3.connect(out_db)
+    try:
+        main_tables = set(list_tables(conn))
+        camera_cols = [c for c in table_columns(conn, "cameras") if c != "camera_id"]
+        for shard_db in shard_dbs[1:]:
+            conn.execute("ATTACH DATABASE ? AS shard", (str(shard_db),))
+            with conn:
+                _merge_shard(conn, main_tables, camera_cols, share_cameras, shard_db)
+            conn.execute("DETACH DATABASE shard")
+        return conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _merge_shard(conn: sqlite3.Connection, main_tables: set[str], camera_cols: list[str],
+                 share_cameras: bool, shard_db: Path) -> None:
+    # Cameras: map every shard camera to an existing identical one or a new row.
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS camera_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+    conn.execute("DELETE FROM camera_map")
+    cols = ", ".join(camera_cols)
+    for row in conn.execute(f"SELECT camera_id, {cols} FROM shard.cameras").fetchall():
+        old_id, values = row[0], row[1:]
+        new_id = None
+        if share_cameras:
+            where = " AND ".join(f"{c} IS ?" for c in camera_cols)
+            found = conn.execute(f"SELECT camera_id FROM main.cameras WHERE {where} LIMIT 1", values).fetchone()
+            new_id = found[0] if found else None
+        if new_id is None:
+            placeholders = ", ".join("?" for _ in camera_cols)
+            new_id = conn.execute(f"INSERT INTO main.cameras ({cols}) VALUES ({placeholders})", values).lastrowid
+        conn.execute("INSERT INTO camera_map VALUES (?, ?)", (old_id, new_id))
+
+    # Images and frames: shift ids past the current maximum so they stay in shard order.
+    offsets = {"offset": conn.execute("SELECT COALESCE(MAX(image_id), 0) FROM main.images").fetchone()[0],
+               "frame_offset": 0}
+    if "frames" in main_tables:
+        offsets["frame_offset"] = conn.execute("SELECT COALESCE(MAX(frame_id), 0) FROM main.frames").fetchone()[0]
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS rig_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+    conn.execute("DELETE FROM rig_map")
+    shard_tables = list_tables(conn, "shard")
+    if "rigs" in shard_tables:
+        _merge_rigs(conn, share_cameras)
+
+    for table in ["images"] + [t for t in shard_tables if t not in ("cameras", "images", "rigs")]:
+        table_cols = table_columns(conn, table, "shard")
+        select = [_remap_column(table, c, table_cols) for c in table_cols]
+        if table not in main_tables or all(expr == f"s.{c}" for expr, c in zip(select, table_cols)):
+            # Nothing in it refers to an image, camera, rig or frame we know how to renumber.
+            if conn.execute(f"SELECT EXISTS (SELECT 1 FROM shard.{table})").fetchone()[0]:
+                raise ValueError(f"Cannot merge table '{table}' of {shard_db}: unknown schema")
+            continue
+        insert_cols = [c for c, expr in zip(table_cols, select) if expr is not None]
+        select = [expr for expr in select if expr is not None]
+        conn.execute(
+            f"INSERT INTO main.{table} ({', '.join(insert_cols)}) SELECT {', '.join(select)} FROM shard.{table} s",
+            offsets,
+        )
+
+
+def _merge_rigs(conn: sqlite3.Connection, share_cameras: bool) -> None:
+    """Copy shard rigs into rig_map. With share_cameras, a rig of only a camera that
+    already has such a rig (feature_extractor makes one per camera) maps to that rig."""
+    rig_cols = [c for c in table_columns(conn, "rigs", "shard") if c != "rig_id"]
+    select = ", ".join(_remap_column("rigs", c, rig_cols) for c in rig_cols)
+    with_sensors = {row[0] for row in conn.execute("SELECT DISTINCT rig_id FROM shard.rig_sensors")} \
+        if "rig_sensors" in list_tables(conn, "shard") else set()
+    for old_id, *values in conn.execute(f"SELECT rig_id, {select} FROM shard.rigs s").fetchall():
+        new_id = None
+        if share_cameras and old_id not in with_sensors:
+            where = " AND ".join(f"{c} IS ?" for c in rig_cols)
+            if "rig_sensors" in list_tables(conn):
+                where += " AND rig_id NOT IN (SELECT rig_id FROM main.rig_sensors)"
+            found = conn.execute(f"SELECT rig_id FROM main.rigs WHERE {where} LIMIT 1", values).fetchone()
+            new_id = found[0] if found else None
+        if new_id is None:
+            placeholders = ", ".join("?" for _ in rig_cols)
+            new_id = conn.execute(f"INSERT INTO main.rigs ({', '.join(rig_cols)}) VALUES ({placeholders})",
+                                  values).lastrowid
+        conn.execute("INSERT INTO rig_map VALUES (?, ?)", (old_id, new_id))
+
+
+def _remap_column(table: str, column: str, table_cols: list[str]) -> str | None:
+    """SQL expression (over shard table alias s) giving column's value in the merged database.
+
+    None drops the column so an autoincrement key gets a new value. Columns that
+    need no renumbering come back unchanged as s.<column>.
+    """
+    if column == "image_id":
+        return "s.image_id + :offset"
+    if column == "frame_id":
+        return "s.frame_id + :frame_offset"
+    if column == "camera_id":
+        return "(SELECT new_id FROM camera_map WHERE old_id = s.camera_id)"
+    if column == "rig_id":
+        return "(SELECT new_id FROM rig_map WHERE old_id = s.rig_id)"
+    if column == "pair_id" and table in PAIR_TABLES:
+        # Both ids shift by the same offset, so id1 < id2 still holds.
+        return (f"(s.pair_id / {MAX_IMAGE_ID} + :offset) * {MAX_IMAGE_ID} "
+                f"+ (s.pair_id % {MAX_IMAGE_ID} + :offset)")
+    for prefix in ("", "ref_", "corr_"):
+        sensor_type = f"{prefix}sensor_type"
+        if sensor_type not in table_cols:
+            continue
+        if column == f"{prefix}sensor_id":
+            return (f"CASE WHEN s.{sensor_type} = {CAMERA_SENSOR} THEN "
+                    f"(SELECT new_id FROM camera_map WHERE old_id = s.{column}) ELSE s.{column} END")
+        if column == f"{prefix}data_id":
+            return f"CASE WHEN s.{sensor_type} = {CAMERA_SENSOR} THEN s.{column} + :offset ELSE s.{column} END"
+    if column == f"{table.rstrip('s')}_id" and column != "pair_id":
+        return None  # the table's own key (e.g. pose_prior_id)
+    return f"s.{column}"
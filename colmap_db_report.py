@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Keypoint and match-graph statistics of a COLMAP database.db.
+
+When mapping fails or registers only part of the images, the database tells
+whether images had too few keypoints, whether matches failed geometric
+verification, or whether the view graph fell apart into components. Pair
+tables are read in bulk; the verified inlier blobs are concatenated per chunk
+and decoded with np.frombuffer, so databases with hundreds of thousands of
+pairs take seconds.
+
+    python colmap_db_report.py --run-dir <run dir>    # prints a summary, writes database/database_report.json
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import json
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from colmap_database import MAX_IMAGE_ID, list_tables
+
+# Inliers for a verified pair to count as a view-graph edge (the mapper's default min_num_matches).
+DEFAULT_MIN_INLIERS: int = 15
+# Images with fewer keypoints are listed as weak.
+DEFAULT_MIN_KEYPOINTS: int = 500
+# COLMAP TwoViewGeometry::ConfigurationType.
+TWO_VIEW_CONFIGS: dict[int, str] = {
+    0: "UNDEFINED", 1: "DEGENERATE", 2: "CALIBRATED", 3: "UNCALIBRATED", 4: "PLANAR",
+    5: "PANORAMIC", 6: "PLANAR_OR_PANORAMIC", 7: "WATERMARK", 8: "MULTIPLE",
+}
+_BLOB_CHUNK_PAIRS: int = 20_000
+_LISTED_IMAGES: int = 10
+
+
+@dataclass
+class DatabaseReport:
+    names: list[str]
+    keypoints: np.ndarray           # (n,) keypoints per image
+    inlier_keypoints: np.ndarray    # (n,) keypoints with at least one verified inlier match
+    verified_pairs: np.ndarray      # (n,) view-graph edges per image
+    components: np.ndarray          # (n,) view-graph component, 0 = largest
+    num_match_pairs: int
+    num_verified_pairs: int
+    num_edges: int
+    inlier_ratios: np.ndarray       # verified inliers / raw matches, per pair with raw matches
+    configs: dict[str, int]
+
+    def component_sizes(self) -> np.ndarray:
+        return np.bincount(self.components) if len(self.components) else np.zeros(0, dtype=np.int64)
+
+    def summary(self, min_keypoints: int = DEFAULT_MIN_KEYPOINTS) -> list[str]:
+        """Report lines, prefixed [INFO] or [WARN]."""
+        n = len(self.names)
+        if n == 0:
+            return ["[WARN] Database has no images"]
+        kp = self.keypoints
+        lines = [
+            f"[INFO] {n} images, {int(kp.sum()):,} keypoints (min {int(kp.min()):,}, "
+            f"median {int(np.median(kp)):,}, max {int(kp.max()):,})",
+            f"[INFO] {self.num_match_pairs:,} matched pairs, {self.num_verified_pairs:,} verified, "
+            f"{self.num_edges:,} with enough inliers",
+        ]
+        if len(self.inlier_ratios):
+            p10, p50, p90 = np.percentile(self.inlier_ratios, [10, 50, 90])
+            lines.append(f"[INFO] Inlier ratio per pair: p10 {p10:.2f}, median {p50:.2f}, p90 {p90:.2f}")
+        if self.configs:
+            lines.append("[INFO] Verified pair types: " + ", ".join(
+                f"{name} {count:,}" for name, count in sorted(self.configs.items(), key=lambda kv: -kv[1])))
+        with_kp = np.maximum(kp, 1)
+        lines.append(f"[INFO] Keypoints with a verified match: median {np.median(self.inlier_keypoints / with_kp):.0%}"
+                     f" per image")
+
+        sizes = self.component_sizes()
+        multi = sizes[sizes > 1]
+        isolated = int((sizes == 1).sum())
+        shown = ", ".join(str(s) for s in multi[:_LISTED_IMAGES]) + (", ..." if len(multi) > _LISTED_IMAGES else "")
+        level = "[INFO]" if len(multi) <= 1 and isolated == 0 else "[WARN]"
+        plural = "" if len(multi) == 1 else "s"
+        lines.append(f"{level} View graph: {len(multi)} connected component{plural}"
+                     f"{f' of {shown} images' if shown else ''}, {isolated} isolated images")
+        for label, indices in (
+            (f"fewer than {min_keypoints} keypoints", np.flatnonzero(kp < min_keypoints)),
+            ("no view-graph edge", np.flatnonzero(self.verified_pairs == 0)),
+        ):
+            if len(indices):
+                names = ", ".join(self.names[i] for i in indices[:_LISTED_IMAGES])
+                more = f", ... ({len(indices)} total)" if len(indices) > _LISTED_IMAGES else ""
+                lines.append(f"[WARN] {len(indices)} images with {label}: {names}{more}")
+        return lines
+
+    def to_json(self) -> dict:
+        sizes = self.component_sizes()
+        return {
+            "num_images": len(self.names),
+            "num_match_pairs": self.num_match_pairs,
+            "num_verified_pairs": self.num_verified_pairs,
+            "num_edges": self.num_edges,
+            "component_sizes": sizes[sizes > 1].tolist(),
+            "configs": self.configs,
+            "inlier_ratio_percentiles": (np.percentile(self.inlier_ratios, [10, 50, 90]).round(4).tolist()
+                                         if len(self.inlier_ratios) else []),
+            "images": {
+                "name": self.names,
+                "keypoints": self.keypoints.tolist(),
+                "inlier_keypoints": self.inlier_keypoints.tolist(),
+                "verified_pairs": self.verified_pairs.tolist(),
+                "component": self.components.tolist(),
+            },
+        }
+
+
+def split_pair_ids(pair_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(image_id1, image_id2) of COLMAP pair ids."""
+    pair_ids = pair_ids.astype(np.int64)
+    return pair_ids // MAX_IMAGE_ID, pair_ids % MAX_IMAGE_ID
+
+
+def connected_components(num_nodes: int, edges: np.ndarray) -> np.ndarray:
+    """Component label per node, numbered by decreasing component size."""
+    labels = np.arange(num_nodes)
+    if len(edges):
+        while True:
+            a, b = labels[edges[:, 0]], labels[edges[:, 1]]
+            if np.array_equal(a, b):
+                break
+            # Hook every root to the smallest root it is connected to, then compress paths.
+            low = np.minimum(a, b)
+            np.minimum.at(labels, a, low)
+            np.minimum.at(labels, b, low)
+            while True:
+                jumped = labels[labels]
+                if np.array_equal(jumped, labels):
+                    break
+                labels = jumped
+    roots, labels = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(labels, minlength=len(roots))
+    rank = np.empty(len(roots), dtype=np.int64)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(len(roots))
+    return rank[labels]
+
+
+def _image_index(image_ids: np.ndarray, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Positions of ids in the sorted image_ids, and which ids exist there."""
+    if not len(image_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+    pos = np.minimum(np.searchsorted(image_ids, ids), len(image_ids) - 1)
+    return pos, image_ids[pos] == ids
+
+
+def _rows_by_pair(conn: sqlite3.Connection, tables: set[str], table: str, columns: list[str]) -> np.ndarray:
+    """(pair_id, *columns) of the pairs with rows > 0, as an int64 array."""
+    if table not in tables:
+        return np.zeros((0, 1 + len(columns)), dtype=np.int64)
+    rows = conn.execute(f"SELECT pair_id, {', '.join(columns)} FROM {table} WHERE rows > 0").fetchall()
+    return np.array(rows, dtype=np.int64).reshape(len(rows), 1 + len(columns))
+
+
+def read_database_report(db_path: Path, min_inliers: int = DEFAULT_MIN_INLIERS) -> DatabaseReport:
+    """Per-image keypoint and match-graph statistics of a COLMAP database."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        tables = set(list_tables(conn))
+        images = conn.execute("SELECT image_id, name FROM images ORDER BY image_id").fetchall()
+        image_ids = np.array([row[0] for row in images], dtype=np.int64)
+        names = [row[1] for row in images]
+        n = len(names)
+
+        keypoints = np.zeros(n, dtype=np.int64)
+        if "keypoints" in tables:
+            kp = np.array(conn.execute("SELECT image_id, rows FROM keypoints").fetchall(), dtype=np.int64).reshape(-1, 2)
+            pos, known = _image_index(image_ids, kp[:, 0])
+            keypoints[pos[known]] = kp[known, 1]
+
+        matches = _rows_by_pair(conn, tables, "matches", ["rows"])
+        verified = _rows_by_pair(conn, tables, "two_view_geometries", ["rows", "config"])
+
+        # Inlier ratio: verified inliers over raw matches of the same pair.
+        matches = matches[np.argsort(matches[:, 0])]
+        pos = np.minimum(np.searchsorted(matches[:, 0], verified[:, 0]), max(len(matches) - 1, 0))
+        has_raw = matches[pos, 0] == verified[:, 0] if len(matches) else np.zeros(len(verified), dtype=bool)
+        inlier_ratios = verified[has_raw, 1] / matches[pos[has_raw], 1]
+        configs: dict[str, int] = {}
+        for config, count in zip(*np.unique(verified[:, 2], return_counts=True)):
+            configs[TWO_VIEW_CONFIGS.get(int(config), str(config))] = int(count)
+
+        edges_mask = verified[:, 1] >= min_inliers
+        (pos1, known1), (pos2, known2) = (_image_index(image_ids, ids)
+                                          for ids in split_pair_ids(verified[edges_mask, 0]))
+        edges = np.stack([pos1, pos2], axis=1)[known1 & known2]
+        verified_pairs = np.bincount(edges.ravel(), minlength=n)[:n]
+
+        inlier_keypoints = _inlier_keypoints(conn, image_ids, keypoints) if len(verified) else np.zeros(n, np.int64)
+    finally:
+        conn.close()
+    return DatabaseReport(
+        names=names,
+        keypoints=keypoints,
+        inlier_keypoints=inlier_keypoints,
+        verified_pairs=verified_pairs,
+        components=connected_components(n, edges),
+        num_match_pairs=len(matches),
+        num_verified_pairs=len(verified),
+        num_edges=len(edges),
+        inlier_ratios=inlier_ratios,
+        configs=configs,
+    )
+
+
+def _inlier_keypoints(conn: sqlite3.Connection, image_ids: np.ndarray, keypoints: np.ndarray) -> np.ndarray:
+    """Keypoints per image that are an inlier of at least one verified pair."""
+    offsets = np.concatenate([[0], np.cumsum(keypoints)])
+    matched = np.zeros(int(offsets[-1]), dtype=bool)
+    cursor = conn.execute("SELECT pair_id, rows, data FROM two_view_geometries WHERE rows > 0")
+    while chunk := cursor.fetchmany(_BLOB_CHUNK_PAIRS):
+        pair_ids = np.array([row[0] for row in chunk], dtype=np.int64)
+        counts = np.array([row[1] for row in chunk], dtype=np.int64)
+        idx = np.frombuffer(b"".join(row[2] for row in chunk), dtype=np.uint32).reshape(-1, 2).astype(np.int64)
+        for side, ids in enumerate(split_pair_ids(pair_ids)):
+            image, known = _image_index(image_ids, ids)
+            point = np.repeat(image, counts)
+            valid = np.repeat(known, counts) & (idx[:, side] < keypoints[point])
+            matched[offsets[point[valid]] + idx[valid, side]] = True
+    cumulative = np.concatenate([[0], np.cumsum(matched)])
+    return cumulative[offsets[1:]] - cumulative[offsets[:-1]]
+
+
+def write_database_report(db_path: Path, out_path: Path | None = None,
+                          min_inliers: int = DEFAULT_MIN_INLIERS,
+                          min_keypoints: int = DEFAULT_MIN_KEYPOINTS) -> DatabaseReport:
+    """Print the summary of db_path and write the JSON report (default: next to the database)."""
+    start = time.perf_counter()
+    report = read_database_report(db_path, min_inliers)
+    for line in report.summary(min_keypoints):
+        print(line)
+    out_path = out_path or db_path.with_name("database_report.json")
+    out_path.write_text(json.dumps(report.to_json()) + "\n")
+    print(f"[INFO] Database report written to {out_path} in {time.perf_counter() - start:.2f}s")
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Keypoint and match-graph statistics of a COLMAP database")
+    parser.add_argument("--run-dir", help="COLMAP run directory (default: the config.py data variant)")
+    parser.add_argument("--database", help="database.db path (overrides --run-dir)")
+    parser.add_argument("--out", help="JSON report path (default: database_report.json next to the database)")
+    parser.add_argument("--min-inliers", type=int, default=DEFAULT_MIN_INLIERS,
+                        help="Inliers for a verified pair to count as a view-graph edge")
+    parser.add_argument("--min-keypoints", type=int, default=DEFAULT_MIN_KEYPOINTS,
+                        help="Images with fewer keypoints are listed")
+    args = parser.parse_args()
+
+    if args.database:
+        db_path = Path(args.database).expanduser()
+    else:
+        if args.run_dir:
+            run_dir = Path(args.run_dir).expanduser()
+        else:
+            import config
+            run_dir = config.DATASET_PATH / "colmap_runs" / config.DATA_VARIANT
+        db_path = run_dir / "database" / "database.db"
+    if not db_path.is_file():
+        print(f"[ERROR] No database at {db_path}", file=sys.stderr)
+        return 1
+    write_database_report(db_path, Path(args.out).expanduser() if args.out else None,
+                          args.min_inliers, args.min_keypoints)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+COLMAP feature extraction, optionally sharded across processes.
+
+On CPU-only machines one `colmap feature_extractor` with affine shape and
+domain size pooling is the slowest SfM step. Sharding splits the image list
+into N contiguous parts, runs one extractor per part (own --image_list_path,
+own database, its own thread budget) and merges the shard databases into the
+run's database.db.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import TYPE_CHECKING
+
+from colmap_database import existing_image_names, merge_databases
+from colmap_matching import list_images
+from feature_cache import cache_from_env, option_value
+
+if TYPE_CHECKING:
+    from tqdm import tqdm
+
+# Images per shard below which sharding is not worth the extra process.
+MIN_IMAGES_PER_SHARD: int = 20
+DEFAULT_SHARD_THREADS: int = 4
+
+_PROGRESS_RE = re.compile(r"Processed file \[(\d+)/(\d+)\]")
+
+
+def shard_image_lists(names: list[str], num_shards: int) -> list[list[str]]:
+    """Split names into num_shards contiguous, near-equal parts (empty parts dropped)."""
+    num_shards = max(1, min(num_shards, len(names)))
+    size, extra = divmod(len(names), num_shards)
+    shards, start = [], 0
+    for i in range(num_shards):
+        stop = start + size + (1 if i < extra else 0)
+        shards.append(names[start:stop])
+        start = stop
+    return [s for s in shards if s]
+
+
+def auto_shard_count(num_images: int, use_gpu: int, threads_per_shard: int) -> int:
+    """One shard on GPU; on CPU as many shards as the thread budget allows."""
+    if use_gpu:
+        return 1
+    by_cores = max(1, (os.cpu_count() or 1) // max(1, threads_per_shard))
+    by_images = max(1, num_images // MIN_IMAGES_PER_SHARD)
+    return min(by_cores, by_images)
+
+
+def _follow_progress(process: subprocess.Popen, bar: tqdm, log_path: Path) -> None:
+    """Copy a shard's output to its log file and advance its progress bar."""
+    assert process.stdout is not None
+    with open(log_path, "w") as log:
+        for line in process.stdout:
+            log.write(line)
+            match = _PROGRESS_RE.search(line)
+            if match:
+                bar.total = int(match.group(2))
+                bar.n = int(match.group(1))
+                bar.refresh()
+
+
+def run_sharded_feature_extraction(
+    db_path: Path,
+    image_path: Path,
+    extractor_options: list[str],
+    num_shards: int,
+    threads_per_shard: int = DEFAULT_SHARD_THREADS,
+    names: list[str] | None = None,
+    colmap: str = "colmap",
+    share_cameras: bool = False,
+) -> int:
+    """Run one feature_extractor per shard in parallel and merge into db_path.
+
+    extractor_options are the feature_extractor flags other than the database,
+    image path, image list and thread count. Returns the number of merged images.
+    """
+    from tqdm import tqdm
+
+    names = list_images(image_path) if names is None else names
+    work_dir = db_path.parent / "shards"
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    work_dir.mkdir(parents=True)
+
+    # Like a plain feature_extractor run, keep what an existing database already has.
+    base_dbs: list[Path] = []
+    if db_path.exists():
+        base_db = work_dir / "existing.db"
+        shutil.move(str(db_path), str(base_db))
+        base_dbs.append(base_db)
+        done = set(existing_image_names(base_db))
+        names = [name for name in names if name not in done]
+        print(f"[INFO] {len(done)} images already in {db_path.name}; extracting {len(names)} new images")
+
+    shards = shard_image_lists(names, num_shards)
+    print(f"[INFO] Extracting features for {len(names)} images in {len(shards)} shards "
+          f"x {threads_per_shard} threads")
+
+    processes: list[tuple[subprocess.Popen, list[str]]] = []
+    followers: list[threading.Thread] = []
+    bars: list[tqdm] = []
+    shard_dbs: list[Path] = list(base_dbs)
+    try:
+        for i, shard in enumerate(shards):
+            shard_dir = work_dir / f"shard_{i:02d}"
+            shard_dir.mkdir()
+            list_path = shard_dir / "image_list.txt"
+            list_path.write_text("\n".join(shard) + "\n")
+            shard_db = shard_dir / "database.db"
+            shard_dbs.append(shard_db)
+            cmd = [
+                colmap, "feature_extractor",
+                "--database_path", str(shard_db),
+                "--image_path", str(image_path),
+                "--image_list_path", str(list_path),
+                "--SiftExtraction.num_threads", str(threads_per_shard),
+                *extractor_options,
+            ]
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, bufsize=1)
+            bar = tqdm(total=len(shard), unit="img", desc=f"shard {i:02d}", position=i,
+                       dynamic_ncols=True, leave=True)
+            follower = threading.Thread(target=_follow_progress,
+                                        args=(process, bar, shard_dir / "feature_extractor.log"),
+                                        daemon=True)
+            follower.start()
+            processes.append((process, cmd))
+            followers.append(follower)
+            bars.append(bar)
+
+        failed: tuple[int, list[str]] | None = None
+        for process, cmd in processes:
+            returncode = process.wait()
+            if returncode != 0 and failed is None:
+                failed = (returncode, cmd)
+                for other, _ in processes:
+                    if other.poll() is None:
+                        other.terminate()
+        for follower in followers:
+            follower.join()
+        if failed is not None:
+            print(f"[ERROR] Feature extraction shard failed; see logs in {work_dir}")
+            raise subprocess.CalledProcessError(*failed)
+    except BaseException:
+        for process, _ in processes:
+            if process.poll() is None:
+                process.kill()
+        if base_dbs and not db_path.exists():
+            shutil.move(str(base_dbs[0]), str(db_path))
+        raise
+    finally:
+        for bar in bars:
+            bar.close()
+
+    print(f"[INFO] Merging {len(shard_dbs)} shard databases into {db_path}")
+    num_images = merge_databases(shard_dbs, db_path, share_cameras=share_cameras)
+    print(f"[INFO] Merged database has {num_images} images")
+    shutil.rmtree(work_dir)
+    return num_images
+
+
+def _extract(
+    db_path: Path,
+    image_path: Path,
+    extractor_options: list[str],
+    use_gpu: int,
+    names: list[str],
+    use_list: bool,
+) -> None:
+    threads = int(os.environ.get("SHARD_THREADS", DEFAULT_SHARD_THREADS))
+    shards_env = os.environ.get("FEATURE_SHARDS")
+    num_shards = int(shards_env) if shards_env else auto_shard_count(len(names), use_gpu, threads)
+    if option_value(extractor_options, "--ImageReader.existing_camera_id") is not None:
+        num_shards = 1  # the camera only exists in the run database, not in fresh shard databases
+
+    if num_shards <= 1:
+        list_options: list[str] = []
+        if use_list:
+            list_path = db_path.parent / "feature_image_list.txt"
+            list_path.write_text("\n".join(names) + "\n")
+            list_options = ["--image_list_path", str(list_path)]
+        subprocess.run([
+            "colmap", "feature_extractor",
+            "--database_path", str(db_path),
+            "--image_path", str(image_path),
+            *list_options,
+            *extractor_options,
+        ], check=True)
+        return
+
+    share_cameras = option_value(extractor_options, "--ImageReader.single_camera") == "1"
+    run_sharded_feature_extraction(db_path, image_path, extractor_options, num_shards,
+                                   threads_per_shard=threads, names=names, share_cameras=share_cameras)
+
+
+def run_feature_extraction(
+    db_path: Path,
+    image_path: Path,
+    extractor_options: list[str],
+    use_gpu: int,
+    image_names: list[str] | None = None,
+) -> None:
+    """feature_extractor for a SfM run, sharded on CPU, through the feature cache.
+
+    FEATURE_SHARDS sets the shard count (default: CPU cores / SHARD_THREADS
+    when no GPU is used, else 1) and SHARD_THREADS the threads per shard.
+    image_names restricts extraction to those images (default: all in image_path).
+    Images found in the feature cache (FEATURE_CACHE, see feature_cache.py;
+    FEATURE_CACHE=0 disables it) are inserted into the database directly and
+    only the rest are extracted.
+    """
+    names = list_images(image_path) if image_names is None else image_names
+    cache = cache_from_env()
+    if cache is None:
+        _extract(db_path, image_path, extractor_options, use_gpu, names, image_names is not None)
+        return
+
+    try:
+        done = set(existing_image_names(db_path)) if db_path.exists() else set()
+        names = [name for name in names if name not in done]
+        keys = cache.keys(image_path, names, extractor_options)
+        cached = cache.cached(list(keys.values()))
+        hits = [name for name in names if keys[name] in cached]
+        misses = [name for name in names if keys[name] not in cached]
+        print(f"[INFO] Feature cache: {len(hits)} of {len(names)} images cached in {cache.cache_dir}")
+
+        if misses:
+            _extract(db_path, image_path, extractor_options, use_gpu, misses,
+                     image_names is not None or len(misses) < len(names))
+            stored = cache.store(db_path, {name: keys[name] for name in misses})
+            print(f"[INFO] Feature cache: stored features of {stored} images")
+        if hits:
+            if not db_path.exists():
+                subprocess.run(["colmap", "database_creator", "--database_path", str(db_path)], check=True)
+            restored = cache.restore(db_path, hits, keys, extractor_options)
+            print(f"[INFO] Feature cache: inserted features of {restored} images into {db_path.name}")
+    finally:
+        cache.close()
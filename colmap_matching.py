@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+COLMAP matcher selection shared by the colmap_sfm_* scripts.
+
+Picks sequential, vocab-tree or exhaustive matching from the image count and
+capture type, and estimates the number of image pairs each choice will match.
+For video frames with IMU headings it instead writes an explicit pair list
+(temporal neighbours, front/back pairs, heading loop closures) for
+`colmap matches_importer`; larger unordered photo sets get a pair list from
+global-descriptor retrieval (image_retrieval.py).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import os
+import re
+
+import numpy as np
+
+from imu_extractor import load_heading_data_csv
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+# Above this many images an unordered set is matched with the vocabulary tree
+# when one is available, otherwise with retrieval pairs.
+VOCAB_TREE_MIN_IMAGES: int = 500
+RETRIEVAL_MIN_IMAGES: int = 150
+RETRIEVAL_TOP_K: int = 30
+# COLMAP defaults for the matchers below (kept in sync with the options we pass).
+SEQUENTIAL_OVERLAP: int = 10
+LOOP_DETECTION_PERIOD: int = 10
+LOOP_DETECTION_NUM_IMAGES: int = 50
+VOCAB_TREE_NUM_IMAGES: int = 100
+# Custom pair list for video frames (frame indices, degrees, seconds).
+TEMPORAL_WINDOW: int = 10
+LOOP_QUERY_PERIOD: int = 5
+LOOP_CANDIDATES: int = 5
+LOOP_HEADING_TOLERANCE_DEG: float = 15.0
+LOOP_MIN_GAP_S: float = 30.0
+
+_FRAME_INDEX_RE = re.compile(r"\d{3,}")
+
+
+@dataclass
+class MatcherPlan:
+    """The matcher chosen for a run and the options it is launched with."""
+    matcher: str
+    reason: str
+    num_images: int
+    expected_pairs: int
+    options: list[str] = field(default_factory=list)
+
+    def command(self, db_path: Path, use_gpu: int, gpu_index: str) -> list[str]:
+        return [
+            "colmap", self.matcher,
+            "--database_path", str(db_path),
+            "--SiftMatching.use_gpu", str(use_gpu),
+            "--SiftMatching.gpu_index", str(gpu_index),
+            *self.options,
+        ]
+
+    def log(self) -> None:
+        exhaustive = exhaustive_pair_count(self.num_images)
+        print(f"[INFO] Matcher: {self.matcher} ({self.reason})")
+        print(f"[INFO] Expected pairs: ~{self.expected_pairs:,} for {self.num_images} images "
+              f"(exhaustive would be {exhaustive:,})")
+
+
+def list_images(image_dir: Path) -> list[str]:
+    """Return image names relative to image_dir, as COLMAP stores them."""
+    names = [
+        p.relative_to(image_dir).as_posix()
+        for p in image_dir.rglob("*")
+        if p.suffix.lower() in IMAGE_EXTENSIONS and p.is_file()
+    ]
+    return sorted(names)
+
+
+def parse_frame_name(name: str) -> tuple[str, int] | None:
+    """Split a frame name into its stream key and frame number."""
+    base = Path(name).name
+    # The frame number is the last run of digits, after any date or camera prefix.
+    match = None
+    for match in _FRAME_INDEX_RE.finditer(base):
+        pass
+    if match is None:
+        return None
+    return f"{Path(name).parent}/{base[:match.start()]}#{base[match.end():]}", int(match.group())
+
+
+def frame_streams(names: list[str]) -> dict[str, list[int]] | None:
+    """Group names like frame_000012_front.jpg into per-stream frame indices.
+
+    Returns None unless every name carries a frame number, there are at most
+    a couple of streams (e.g. front/back), frame numbers are unique within a
+    stream and sorting by name keeps frames in temporal order -- which is how
+    COLMAP's sequential_matcher orders images.
+    """
+    streams: dict[str, list[int]] = {}
+    for name in names:
+        parsed = parse_frame_name(name)
+        if parsed is None:
+            return None
+        streams.setdefault(parsed[0], []).append(parsed[1])
+
+    if not streams or len(streams) > 2:
+        return None
+    for indices in streams.values():
+        if len(set(indices)) != len(indices) or indices != sorted(indices):
+            return None
+    return streams
+
+
+def exhaustive_pair_count(num_images: int) -> int:
+    return num_images * (num_images - 1) // 2
+
+
+def sequential_pair_count(num_images: int, overlap: int, quadratic: bool = True) -> int:
+    """Pairs matched by sequential_matcher: each image against the next `overlap`
+    images and, with quadratic overlap, against images 2^k ahead."""
+    offsets = set(range(1, overlap + 1))
+    if quadratic:
+        offsets |= {2 ** k for k in range(overlap)}
+    return sum(max(0, num_images - d) for d in offsets)
+
+
+def select_matcher(
+    names: list[str],
+    capture_type: str,
+    vocab_tree_path: Path | None = None,
+    forced: str | None = None,
+    pairs_path: Path | None = None,
+    heading: tuple[np.ndarray, np.ndarray] | None = None,
+    frame_interval_s: float = 1.0,
+    image_dir: Path | None = None,
+) -> MatcherPlan:
+    """Choose a COLMAP matcher for the given images.
+
+    capture_type is "video" for frames extracted from a video (Insta360) and
+    "photo" for individually shot images (DSLR, Matterport skyboxes). Custom
+    pair lists ("pairs" for video frames, "retrieval" for photos) are written
+    to pairs_path and imported with matches_importer; retrieval also needs
+    image_dir to read thumbnails.
+    """
+    n = len(names)
+    if vocab_tree_path is not None and not vocab_tree_path.is_file():
+        print(f"[WARN] Vocabulary tree not found: {vocab_tree_path}")
+        vocab_tree_path = None
+
+    streams = frame_streams(names) if capture_type == "video" else None
+    choice = forced
+    if choice is None:
+        can_write_pairs = pairs_path is not None
+        if streams is not None and heading is not None and can_write_pairs:
+            choice = "pairs"
+        elif streams is not None:
+            choice = "sequential_matcher"
+        elif n > VOCAB_TREE_MIN_IMAGES and vocab_tree_path is not None:
+            choice = "vocab_tree_matcher"
+        elif n > RETRIEVAL_MIN_IMAGES and can_write_pairs and image_dir is not None:
+            choice = "retrieval"
+        else:
+            choice = "exhaustive_matcher"
+        if n > VOCAB_TREE_MIN_IMAGES and choice == "exhaustive_matcher":
+            print(f"[WARN] {n} unordered images but no VOCAB_TREE_PATH set; "
+                  "falling back to exhaustive matching")
+
+    if choice in ("pairs", "retrieval"):
+        if pairs_path is None:
+            raise ValueError(f"{choice} matching requires a pairs_path")
+        if choice == "pairs":
+            pairs = video_frame_pairs(names, heading, frame_interval_s)
+            reason = f"temporal window {TEMPORAL_WINDOW}, front/back and IMU loop pairs"
+        else:
+            if image_dir is None:
+                raise ValueError("retrieval matching requires image_dir")
+            pairs = retrieval_pairs(image_dir, names, RETRIEVAL_TOP_K,
+                                    cache_path=pairs_path.with_name("retrieval_descriptors.npz"))
+            reason = f"top-{RETRIEVAL_TOP_K} global-descriptor retrieval pairs"
+        write_pair_list(pairs_path, names, pairs)
+        options = ["--match_list_path", str(pairs_path), "--match_type", "pairs"]
+        return MatcherPlan("matches_importer", f"{reason} from {pairs_path.name}", n, len(pairs), options)
+
+    if choice == "sequential_matcher":
+        # Interleaved front/back frames sort next to each other, so widen the
+        # window to keep the same temporal reach per stream.
+        overlap = SEQUENTIAL_OVERLAP * max(1, len(streams or {}))
+        options = ["--SequentialMatching.overlap", str(overlap),
+                   "--SequentialMatching.quadratic_overlap", "1"]
+        expected = sequential_pair_count(n, overlap)
+        reason = f"video frames with sequential names, overlap {overlap}"
+        if vocab_tree_path is not None:
+            options += [
+                "--SequentialMatching.loop_detection", "1",
+                "--SequentialMatching.loop_detection_period", str(LOOP_DETECTION_PERIOD),
+                "--SequentialMatching.loop_detection_num_images", str(LOOP_DETECTION_NUM_IMAGES),
+                "--SequentialMatching.vocab_tree_path", str(vocab_tree_path),
+            ]
+            expected += (n // LOOP_DETECTION_PERIOD) * min(LOOP_DETECTION_NUM_IMAGES, max(0, n - 1))
+            reason += ", loop detection"
+        else:
+            print("[WARN] No VOCAB_TREE_PATH set; sequential matching without loop detection")
+        return MatcherPlan(choice, reason, n, expected, options)
+
+    if choice == "vocab_tree_matcher":
+        if vocab_tree_path is None:
+            raise ValueError("vocab_tree_matcher requires VOCAB_TREE_PATH")
+        options = ["--VocabTreeMatching.vocab_tree_path", str(vocab_tree_path),
+                   "--VocabTreeMatching.num_images", str(VOCAB_TREE_NUM_IMAGES)]
+        expected = min(exhaustive_pair_count(n), n * min(VOCAB_TREE_NUM_IMAGES, max(0, n - 1)))
+        return MatcherPlan(choice, f"{n} unordered images", n, expected, options)
+
+    if choice == "exhaustive_matcher":
+        return MatcherPlan(choice, f"{n} images", n, exhaustive_pair_count(n))
+
+    raise ValueError(f"Unknown matcher: {choice}")
+
+
+def _frame_table(names: list[str]) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """Frame index and stream id per image, plus the stream keys."""
+    frame_idx = np.empty(len(names), dtype=np.int64)
+    stream_idx = np.empty(len(names), dtype=np.int64)
+    stream_keys: list[str] = []
+    for i, name in enumerate(names):
+        parsed = parse_frame_name(name)
+        if parsed is None:
+            raise ValueError(f"No frame number in image name: {name}")
+        key, frame_idx[i] = parsed
+        if key not in stream_keys:
+            stream_keys.append(key)
+        stream_idx[i] = stream_keys.index(key)
+    return frame_idx, stream_idx, stream_keys
+
+
+def _unique_pairs(i: np.ndarray, j: np.ndarray, n: int) -> np.ndarray:
+    """Deduplicate unordered pairs, dropping self pairs; returns an (m, 2) array."""
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    keep = lo != hi
+    keys = np.unique(lo[keep] * n + hi[keep])
+    return np.stack([keys // n, keys % n], axis=1)
+
+
+def temporal_pairs(frame_idx: np.ndarray, stream_idx: np.ndarray, window: int) -> np.ndarray:
+    """Pairs within `window` frames in the same stream, plus every cross-stream
+    pair taken at the same frame index (front/back at the same timestamp)."""
+    n = len(frame_idx)
+    num_streams = int(stream_idx.max()) + 1 if n else 0
+    base = int(frame_idx.min()) if n else 0
+    num_frames = int(frame_idx.max()) - base + 1 if n else 0
+    table = np.full((num_streams, num_frames), -1, dtype=np.int64)
+    table[stream_idx, frame_idx - base] = np.arange(n)
+
+    firsts, seconds = [], []
+    for s in range(num_streams):
+        for d in range(1, window + 1):
+            a, b = table[s, :num_frames - d], table[s, d:]
+            valid = (a >= 0) & (b >= 0)
+            firsts.append(a[valid])
+            seconds.append(b[valid])
+        for t in range(s + 1, num_streams):
+            a, b = table[s], table[t]
+            valid = (a >= 0) & (b >= 0)
+            firsts.append(a[valid])
+            seconds.append(b[valid])
+    if not firsts:
+        return np.empty((0, 2), dtype=np.int64)
+    return _unique_pairs(np.concatenate(firsts), np.concatenate(seconds), n)
+
+
+def heading_loop_pairs(
+    directions_deg: np.ndarray,
+    times_s: np.ndarray,
+    query_period: int = LOOP_QUERY_PERIOD,
+    num_candidates: int = LOOP_CANDIDATES,
+    tolerance_deg: float = LOOP_HEADING_TOLERANCE_DEG,
+    min_gap_s: float = LOOP_MIN_GAP_S,
+) -> np.ndarray:
+    """Candidate loop closures between images looking the same way at different times.
+
+    Every `query_period`-th image (in time order) takes up to `num_candidates`
+    images spread across the run of images whose viewing direction is within
+    `tolerance_deg`, skipping those closer than `min_gap_s` in time.
+    """
+    n = len(directions_deg)
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    directions = np.mod(directions_deg, 360.0)
+    order = np.argsort(directions, kind="stable")
+    sorted_dir = directions[order]
+    # Wrap around 0/360 by searching a tiled copy of the sorted directions.
+    tiled = np.concatenate([sorted_dir - 360.0, sorted_dir, sorted_dir + 360.0])
+    tiled_idx = np.tile(order, 3)
+
+    queries = np.argsort(times_s, kind="stable")[::query_period]
+    lo = np.searchsorted(tiled, directions[queries] - tolerance_deg, side="left")
+    hi = np.searchsorted(tiled, directions[queries] + tolerance_deg, side="right")
+    span = np.minimum(hi - lo, n)
+
+    steps = (np.arange(num_candidates) + 0.5) / num_candidates
+    pos = lo[:, None] + (span[:, None] * steps[None, :]).astype(np.int64)
+    cand = tiled_idx[np.minimum(pos, len(tiled) - 1)]
+    query = np.broadcast_to(queries[:, None], cand.shape)
+    valid = np.abs(times_s[cand] - times_s[query]) >= min_gap_s
+    return _unique_pairs(query[valid], cand[valid], n)
+
+
+def video_frame_pairs(
+    names: list[str],
+    heading: tuple[np.ndarray, np.ndarray] | None,
+    frame_interval_s: float,
+    window: int = TEMPORAL_WINDOW,
+) -> np.ndarray:
+    """Temporal, front/back and (with IMU headings) loop-closure pairs as image indices."""
+    frame_idx, stream_idx, stream_keys = _frame_table(names)
+    pairs = temporal_pairs(frame_idx, stream_idx, window)
+    num_temporal = len(pairs)
+    if heading is not None and len(heading[0]) > 1:
+        # ffmpeg numbers frames from 1, sampling one every frame_interval_s.
+        times = (frame_idx - 1) * float(frame_interval_s)
+        yaw = np.interp(times, heading[0], heading[1])
+        # The back lens looks the opposite way to the front lens.
+        offsets = np.array([180.0 if "back" in key else 0.0 for key in stream_keys])
+        loops = heading_loop_pairs(yaw + offsets[stream_idx], times)
+        pairs = _unique_pairs(np.concatenate([pairs[:, 0], loops[:, 0]]),
+                              np.concatenate([pairs[:, 1], loops[:, 1]]), len(names))
+    print(f"[INFO] Pair list: {num_temporal:,} temporal/front-back pairs, "
+          f"{len(pairs) - num_temporal:,} IMU loop candidates")
+    return pairs
+
+
+def retrieval_pairs(
+    image_dir: Path,
+    names: list[str],
+    top_k: int = RETRIEVAL_TOP_K,
+    cache_path: Path | None = None,
+    queries: np.ndarray | None = None,
+) -> np.ndarray:
+    """Pairs between each query image (default: all) and its top_k retrieved neighbours."""
+    from image_retrieval import load_raw_descriptors, normalize_descriptors, top_k_neighbours
+    desc = normalize_descriptors(load_raw_descriptors(image_dir, names, cache_path))
+    query_idx = np.arange(len(names)) if queries is None else np.asarray(queries, dtype=np.int64)
+    neighbours = top_k_neighbours(desc, top_k, queries=query_idx)
+    query = np.repeat(query_idx, neighbours.shape[1])
+    return _unique_pairs(query, neighbours.ravel(), len(names))
+
+
+def write_pair_list(path: Path, names: list[str], pairs: np.ndarray) -> None:
+    """Write pairs as `name1 name2` lines for `colmap matches_importer --match_type pairs`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    name_arr = np.asarray(names, dtype=object)
+    lines = name_arr[pairs[:, 0]] + " " + name_arr[pairs[:, 1]]
+    path.write_text("\n".join(lines.tolist()) + ("\n" if len(lines) else ""))
+
+
+def plan_from_env(
+    image_dir: Path,
+    capture_type: str,
+    pairs_path: Path | None = None,
+    heading_csv: Path | None = None,
+    frame_interval_s: float = 1.0,
+) -> MatcherPlan:
+    """select_matcher() driven by the MATCHER and VOCAB_TREE_PATH env vars.
+
+    MATCHER=pairs forces the custom pair list for video frames and
+    MATCHER=retrieval the retrieval pair list.
+    """
+    vocab_tree = os.environ.get("VOCAB_TREE_PATH")
+    forced = os.environ.get("MATCHER")
+    if forced and forced not in ("pairs", "retrieval") and not forced.endswith("_matcher"):
+        forced = f"{forced}_matcher"
+
+    heading = None
+    if heading_csv is not None and heading_csv.is_file():
+        heading = load_heading_data_csv(heading_csv)
+        print(f"[INFO] Loaded {len(heading[0])} IMU heading samples from {heading_csv}")
+
+    return select_matcher(
+        list_images(image_dir),
+        capture_type,
+        vocab_tree_path=Path(vocab_tree).expanduser() if vocab_tree else None,
+        forced=forced or None,
+        pairs_path=pairs_path,
+        heading=heading,
+        frame_interval_s=frame_interval_s,
+        image_dir=image_dir,
+    )
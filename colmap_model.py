@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+NumPy reader and writer for COLMAP binary sparse models (cameras.bin, images.bin, points3D.bin).
+
+Records are decoded in blocks with np.frombuffer: per-record Python work is
+limited to locating variable-length records, and all fields come out as flat
+arrays (plus offset arrays for per-image 2D points and per-point tracks) that
+downstream tools can use directly. The writer packs the same arrays back into
+COLMAP's layout, so tools can filter or transform a model and save it.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from pathlib import Path
+import struct
+
+import numpy as np
+
+# COLMAP camera model id -> (name, number of params).
+CAMERA_MODELS: dict[int, tuple[str, int]] = {
+    0: ("SIMPLE_PINHOLE", 3),
+    1: ("PINHOLE", 4),
+    2: ("SIMPLE_RADIAL", 4),
+    3: ("RADIAL", 5),
+    4: ("OPENCV", 8),
+    5: ("OPENCV_FISHEYE", 8),
+    6: ("FULL_OPENCV", 12),
+    7: ("FOV", 5),
+    8: ("SIMPLE_RADIAL_FISHEYE", 4),
+    9: ("RADIAL_FISHEYE", 5),
+    10: ("THIN_PRISM_FISHEYE", 12),
+}
+MAX_CAMERA_PARAMS: int = 12
+
+_CAMERA_HEADER = np.dtype([("camera_id", "<i4"), ("model_id", "<i4"), ("width", "<u8"), ("height", "<u8")])
+_IMAGE_HEADER = np.dtype([("image_id", "<i4"), ("qvec", "<f8", 4), ("tvec", "<f8", 3), ("camera_id", "<i4")])
+_POINT2D = np.dtype([("xy", "<f8", 2), ("point3D_id", "<i8")])
+_POINT3D_HEADER = np.dtype([("point3D_id", "<u8"), ("xyz", "<f8", 3), ("rgb", "u1", 3),
+                            ("error", "<f8"), ("track_length", "<u8")])
+_TRACK_ELEM = np.dtype([("image_id", "<i4"), ("point2D_idx", "<i4")])
+
+
+@dataclass
+class Cameras:
+    ids: np.ndarray         # (n,) int32
+    model_ids: np.ndarray   # (n,) int32
+    widths: np.ndarray      # (n,) uint64
+    heights: np.ndarray     # (n,) uint64
+    params: np.ndarray      # (n, MAX_CAMERA_PARAMS) float64, NaN past each model's params
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def camera_params(self, i: int) -> np.ndarray:
+        return self.params[i, :CAMERA_MODELS[int(self.model_ids[i])][1]]
+
+
+@dataclass
+class Images:
+    ids: np.ndarray              # (n,) int32
+    qvecs: np.ndarray            # (n, 4) float64, world-to-camera rotation (w, x, y, z)
+    tvecs: np.ndarray            # (n, 3) float64, world-to-camera translation
+    camera_ids: np.ndarray       # (n,) int32
+    names: list[str]
+    point2D_offsets: np.ndarray  # (n + 1,) int64, image i owns xys[offsets[i]:offsets[i + 1]]
+    xys: np.ndarray              # (m, 2) float64
+    point3D_ids: np.ndarray      # (m,) int64, -1 when the keypoint has no 3D point
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def rotation_matrices(self) -> np.ndarray:
+        """World-to-camera rotations as an (n, 3, 3) array."""
+        q = self.qvecs / np.linalg.norm(self.qvecs, axis=1, keepdims=True)
+        w, x, y, z = q.T
+        return np.stack([
+            np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)], axis=-1),
+            np.stack([2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)], axis=-1),
+            np.stack([2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)], axis=-1),
+        ], axis=1)
+
+    def camera_centers(self) -> np.ndarray:
+        """Camera centres in world coordinates, C = -R^T t, as an (n, 3) array."""
+        return -np.einsum("nji,nj->ni", self.rotation_matrices(), self.tvecs)
+
+
+@dataclass
+class Points3D:
+    ids: np.ndarray                 # (n,) uint64
+    xyz: np.ndarray                 # (n, 3) float64
+    rgb: np.ndarray                 # (n, 3) uint8
+    errors: np.ndarray              # (n,) float64, mean reprojection error per point
+    track_offsets: np.ndarray       # (n + 1,) int64
+    track_image_ids: np.ndarray     # (m,) int32
+    track_point2D_idxs: np.ndarray  # (m,) int32
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def track_lengths(self) -> np.ndarray:
+        return np.diff(self.track_offsets)
+
+
+@dataclass
+class ModelStats:
+    path: Path
+    num_images: int
+    num_points: int
+    num_observations: int
+    mean_reprojection_error: float
+
+    def describe(self) -> str:
+        return (f"{self.num_images} images, {self.num_points:,} points, "
+                f"{self.num_observations:,} observations, "
+                f"{self.mean_reprojection_error:.3f} px mean reprojection error")
+
+
+@dataclass
+class ColmapModel:
+    cameras: Cameras
+    images: Images
+    points3D: Points3D
+
+    def stats(self, path: Path) -> ModelStats:
+        errors = self.points3D.errors
+        return ModelStats(
+            path=path,
+            num_images=len(self.images),
+            num_points=len(self.points3D),
+            num_observations=int(self.points3D.track_offsets[-1]),
+            mean_reprojection_error=float(errors.mean()) if len(errors) else float("nan"),
+        )
+
+
+class _ByteView:
+    """Random-access decoding of little-endian scalars at arbitrary byte offsets.
+
+    Keeps one shifted view of the buffer per alignment, so a field can be read
+    for many records at once with a single fancy-indexing gather per alignment.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._views: dict[tuple[str, int], np.ndarray] = {}
+
+    def _view(self, dtype: str, shift: int) -> np.ndarray:
+        key = (dtype, shift)
+        if key not in self._views:
+            size = np.dtype(dtype).itemsize
+            count = (len(self.data) - shift) // size
+            self._views[key] = np.frombuffer(self.data, dtype, count=count, offset=shift)
+        return self._views[key]
+
+    def take(self, positions: np.ndarray, dtype: str) -> np.ndarray:
+        size = np.dtype(dtype).itemsize
+        out = np.empty(len(positions), dtype=dtype)
+        if size == 1:
+            out[:] = self._view(dtype, 0)[positions]
+            return out
+        shifts = positions % size
+        for shift in np.unique(shifts):
+            mask = shifts == shift
+            out[mask] = self._view(dtype, int(shift))[(positions[mask] - shift) // size]
+        return out
+
+    def take_vec(self, positions: np.ndarray, dtype: str, width: int) -> np.ndarray:
+        """Read `width` consecutive values starting at each position -> (n, width)."""
+        size = np.dtype(dtype).itemsize
+        cols = [self.take(positions + k * size, dtype) for k in range(width)]
+        return np.stack(cols, axis=1) if cols else np.empty((len(positions), 0), dtype)
+
+
+def read_cameras_binary(path: Path) -> Cameras:
+    data = path.read_bytes()
+    num = int(np.frombuffer(data, "<u8", count=1)[0])
+    header_size = _CAMERA_HEADER.itemsize
+    headers = np.empty(num, dtype=_CAMERA_HEADER)
+    params = np.full((num, MAX_CAMERA_PARAMS), np.nan)
+    offset = 8
+    # A handful of cameras per model: walking the records is cheap here.
+    for i in range(num):
+        headers[i] = np.frombuffer(data, _CAMERA_HEADER, count=1, offset=offset)[0]
+        num_params = CAMERA_MODELS[int(headers[i]["model_id"])][1]
+        offset += header_size
+        params[i, :num_params] = np.frombuffer(data, "<f8", count=num_params, offset=offset)
+        offset += 8 * num_params
+    return Cameras(
+        ids=headers["camera_id"].copy(),
+        model_ids=headers["model_id"].copy(),
+        widths=headers["width"].copy(),
+        heights=headers["height"].copy(),
+        params=params,
+    )
+
+
+def read_images_binary(path: Path) -> Images:
+    data = path.read_bytes()
+    num = int(np.frombuffer(data, "<u8", count=1)[0])
+    header_size = _IMAGE_HEADER.itemsize
+    starts = np.empty(num, dtype=np.int64)
+    point_starts = np.empty(num, dtype=np.int64)
+    counts = np.empty(num, dtype=np.int64)
+    names: list[str] = []
+    offset = 8
+    # Only the name terminator and the 2D point count are located per record.
+    for i in range(num):
+        starts[i] = offset
+        name_end = data.index(b"\0", offset + header_size)
+        names.append(data[offset + header_size:name_end].decode("utf-8"))
+        counts[i] = int.from_bytes(data[name_end + 1:name_end + 9], "little")
+        point_starts[i] = name_end + 9
+        offset = point_starts[i] + counts[i] * _POINT2D.itemsize
+
+    view = _ByteView(data)
+    point_pos = (np.repeat(point_starts, counts)
+                 + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) * _POINT2D.itemsize)
+    return Images(
+        ids=view.take(starts, "<i4"),
+        qvecs=view.take_vec(starts + 4, "<f8", 4),
+        tvecs=view.take_vec(starts + 36, "<f8", 3),
+        camera_ids=view.take(starts + 60, "<i4"),
+        names=names,
+        point2D_offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        xys=view.take_vec(point_pos, "<f8", 2),
+        point3D_ids=view.take(point_pos + 16, "<i8"),
+    )
+
+
+def _locate_points3D(data: bytes, num: int) -> tuple[np.ndarray, np.ndarray]:
+    """Byte offset and track length of every point record.
+
+    Records are variable length and each offset depends on the previous
+    record's track length, so this chain cannot be vectorised; it is the one
+    sequential pass. It is bounded at one 8-byte read per point (~0.35 us, so
+    ~0.7 s for a 2M-point / 200 MB points3D.bin, under a fifth of the full
+    read) and leaves all decoding to NumPy.
+    """
+    starts = [0] * num
+    lengths = [0] * num
+    len_field = _POINT3D_HEADER.itemsize - 8
+    header_size = _POINT3D_HEADER.itemsize
+    track_size = _TRACK_ELEM.itemsize
+    read_u64 = struct.Struct("<Q").unpack_from
+    offset = 8
+    try:
+        for i in range(num):
+            starts[i] = offset
+            (length,) = read_u64(data, offset + len_field)
+            lengths[i] = length
+            offset += header_size + length * track_size
+    except struct.error:
+        offset = len(data) + 1
+    if offset > len(data):
+        raise ValueError(f"points3D.bin is truncated: {num} points need more than its {len(data)} bytes")
+    return np.array(starts, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def read_points3D_binary(path: Path, with_tracks: bool = True) -> Points3D:
+    data = path.read_bytes()
+    num = int(np.frombuffer(data, "<u8", count=1)[0])
+    starts, lengths = _locate_points3D(data, num)
+    view = _ByteView(data)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    if with_tracks:
+        track_pos = (np.repeat(starts + _POINT3D_HEADER.itemsize, lengths)
+                     + (np.arange(offsets[-1]) - np.repeat(offsets[:-1], lengths)) * _TRACK_ELEM.itemsize)
+        track_image_ids = view.take(track_pos, "<i4")
+        track_point2D_idxs = view.take(track_pos + 4, "<i4")
+    else:
+        track_image_ids = np.empty(0, dtype=np.int32)
+        track_point2D_idxs = np.empty(0, dtype=np.int32)
+    return Points3D(
+        ids=view.take(starts, "<u8"),
+        xyz=view.take_vec(starts + 8, "<f8", 3),
+        rgb=view.take_vec(starts + 32, "u1", 3),
+        errors=view.take(starts + 35, "<f8"),
+        track_offsets=offsets,
+        track_image_ids=track_image_ids,
+        track_point2D_idxs=track_point2D_idxs,
+    )
+
+
+def read_model(model_dir: Path, with_tracks: bool = True) -> ColmapModel:
+    return ColmapModel(
+        cameras=read_cameras_binary(model_dir / "cameras.bin"),
+        images=read_images_binary(model_dir / "images.bin"),
+        points3D=read_points3D_binary(model_dir / "points3D.bin", with_tracks=with_tracks),
+    )
+
+
+def read_model_stats(model_dir: Path) -> ModelStats:
+    """Registered images, points, observations and mean reprojection error of a model."""
+    images_data = (model_dir / "images.bin").read_bytes()
+    num_images = int(np.frombuffer(images_data, "<u8", count=1)[0])
+    points = read_points3D_binary(model_dir / "points3D.bin", with_tracks=False)
+    errors = points.errors
+    return ModelStats(
+        path=model_dir,
+        num_images=num_images,
+        num_points=len(points),
+        num_observations=int(points.track_offsets[-1]),
+        mean_reprojection_error=float(errors.mean()) if len(errors) else float("nan"),
+    )
+
+
+def write_cameras_binary(cameras: Cameras, path: Path) -> None:
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(cameras)))
+        for i in range(len(cameras)):
+            f.write(struct.pack("<iiQQ", int(cameras.ids[i]), int(cameras.model_ids[i]),
+                                int(cameras.widths[i]), int(cameras.heights[i])))
+            f.write(cameras.camera_params(i).astype("<f8").tobytes())
+
+
+def write_images_binary(images: Images, path: Path) -> None:
+    headers = np.empty(len(images), dtype=_IMAGE_HEADER)
+    headers["image_id"] = images.ids
+    headers["qvec"] = images.qvecs
+    headers["tvec"] = images.tvecs
+    headers["camera_id"] = images.camera_ids
+    points = np.empty(len(images.point3D_ids), dtype=_POINT2D)
+    points["xy"] = images.xys
+    points["point3D_id"] = images.point3D_ids
+    offsets = images.point2D_offsets
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(images)))
+        for i, name in enumerate(images.names):
+            f.write(headers[i].tobytes())
+            f.write(name.encode("utf-8") + b"\0")
+            f.write(struct.pack("<Q", int(offsets[i + 1] - offsets[i])))
+            f.write(points[offsets[i]:offsets[i + 1]].tobytes())
+
+
+def _pack_records(heads: np.ndarray, bodies: np.ndarray, body_sizes: np.ndarray,
+                  max_chunk_bytes: int = 1 << 24) -> np.ndarray:
+    """Interleave fixed-size heads (n, h) uint8 with variable-size bodies (flat uint8).
+
+    Records with the same body size are scattered into the output together,
+    in chunks that bound the size of the index arrays.
+    """
+    head_size = heads.shape[1]
+    sizes = head_size + body_sizes
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    body_starts = np.concatenate([[0], np.cumsum(body_sizes)[:-1]]).astype(np.int64)
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for body_size in np.unique(body_sizes):
+        rows = np.flatnonzero(body_sizes == body_size)
+        record_size = head_size + int(body_size)
+        per_chunk = max(1, max_chunk_bytes // record_size)
+        for k in range(0, len(rows), per_chunk):
+            chunk = rows[k:k + per_chunk]
+            body = bodies[body_starts[chunk, None] + np.arange(body_size)]
+            out[starts[chunk, None] + np.arange(record_size)] = np.concatenate([heads[chunk], body], axis=1)
+    return out
+
+
+def write_points3D_binary(points: Points3D, path: Path) -> None:
+    headers = np.empty(len(points), dtype=_POINT3D_HEADER)
+    headers["point3D_id"] = points.ids
+    headers["xyz"] = points.xyz
+    headers["rgb"] = points.rgb
+    headers["error"] = points.errors
+    headers["track_length"] = points.track_lengths
+    track = np.empty(len(points.track_image_ids), dtype=_TRACK_ELEM)
+    track["image_id"] = points.track_image_ids
+    track["point2D_idx"] = points.track_point2D_idxs
+    heads = headers.view(np.uint8).reshape(len(points), _POINT3D_HEADER.itemsize)
+    records = _pack_records(heads, track.view(np.uint8), points.track_lengths * _TRACK_ELEM.itemsize)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(points)))
+        f.write(records.tobytes())
+
+
+def write_model(model: ColmapModel, model_dir: Path) -> None:
+    """Write cameras.bin, images.bin and points3D.bin into model_dir."""
+    model_dir.mkdir(parents=True, exist_ok=True)
+    write_cameras_binary(model.cameras, model_dir / "cameras.bin")
+    write_images_binary(model.images, model_dir / "images.bin")
+    write_points3D_binary(model.points3D, model_dir / "points3D.bin")
+
+
+def filter_model(model: ColmapModel, keep_names: set[str] | list[str], min_track_length: int = 2) -> ColmapModel:
+    """Model restricted to the named images.
+
+    Observations by dropped images are removed from the tracks, points left
+    with fewer than min_track_length observations are removed, and the
+    remaining images' keypoints that referred to them become unmatched (-1).
+    Keypoints are kept, so point2D indices in the tracks stay valid.
+    """
+    images, points = model.images, model.points3D
+    keep_names = set(keep_names)
+    keep_image = np.array([name in keep_names for name in images.names], dtype=bool)
+    kept_ids = images.ids[keep_image]
+
+    # Tracks: drop observations by removed images, then short tracks.
+    obs_keep = np.isin(points.track_image_ids, kept_ids)
+    point_of_obs = np.repeat(np.arange(len(points)), points.track_lengths)
+    new_lengths = np.bincount(point_of_obs[obs_keep], minlength=len(points))
+    keep_point = new_lengths >= min_track_length
+    obs_keep &= keep_point[point_of_obs]
+    lengths = new_lengths[keep_point]
+
+    # Images: keep the selected records and unlink keypoints from removed points.
+    counts = np.diff(images.point2D_offsets)
+    rows = np.repeat(keep_image, counts)
+    point3D_ids = images.point3D_ids[rows].copy()
+    matched = point3D_ids >= 0
+    point3D_ids[matched & ~np.isin(point3D_ids, points.ids[keep_point].astype(np.int64))] = -1
+
+    camera_keep = np.isin(model.cameras.ids, images.camera_ids[keep_image])
+    cameras = model.cameras
+    return ColmapModel(
+        cameras=Cameras(
+            ids=cameras.ids[camera_keep],
+            model_ids=cameras.model_ids[camera_keep],
+            widths=cameras.widths[camera_keep],
+            heights=cameras.heights[camera_keep],
+            params=cameras.params[camera_keep],
+        ),
+        images=Images(
+            ids=images.ids[keep_image],
+            qvecs=images.qvecs[keep_image],
+            tvecs=images.tvecs[keep_image],
+            camera_ids=images.camera_ids[keep_image],
+            names=[name for name, keep in zip(images.names, keep_image) if keep],
+            point2D_offsets=np.concatenate([[0], np.cumsum(counts[keep_image])]).astype(np.int64),
+            xys=images.xys[rows],
+            point3D_ids=point3D_ids,
+        ),
+        points3D=Points3D(
+            ids=points.ids[keep_point],
+            xyz=points.xyz[keep_point],
+            rgb=points.rgb[keep_point],
+            errors=points.errors[keep_point],
+            track_offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            track_image_ids=points.track_image_ids[obs_keep],
+            track_point2D_idxs=points.track_point2D_idxs[obs_keep],
+        ),
+    )
+
+
+def select_points(model: ColmapModel, keep_point: np.ndarray) -> ColmapModel:
+    """Model with only the points where keep_point is True.
+
+    Keypoints that observed a removed point become unmatched (-1); images
+    and cameras are unchanged.
+    """
+    images, points = model.images, model.points3D
+    point_of_obs = np.repeat(np.arange(len(points)), points.track_lengths)
+    lengths = points.track_lengths[keep_point]
+    obs_keep = keep_point[point_of_obs]
+    point3D_ids = images.point3D_ids.copy()
+    removed = points.ids[~keep_point].astype(np.int64)
+    point3D_ids[(point3D_ids >= 0) & np.isin(point3D_ids, removed)] = -1
+    return ColmapModel(
+        cameras=model.cameras,
+        images=replace(images, point3D_ids=point3D_ids),
+        points3D=Points3D(
+            ids=points.ids[keep_point],
+            xyz=points.xyz[keep_point],
+            rgb=points.rgb[keep_point],
+            errors=points.errors[keep_point],
+            track_offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            track_image_ids=points.track_image_ids[obs_keep],
+            track_point2D_idxs=points.track_point2D_idxs[obs_keep],
+        ),
+    )
+
+
+def find_best_model(sparse_dir: Path) -> Path | None:
+    """Pick the best model under sparse_dir.
+
+    Models are ranked by registered image count, then point count, then lowest
+    mean reprojection error. Returns None if no readable model is found.
+    """
+    if not sparse_dir.exists():
+        return None
+
+    model_dirs = sorted((d for d in sparse_dir.iterdir() if d.is_dir() and d.name.isdigit()),
+                        key=lambda d: int(d.name))
+    if not model_dirs:
+        return None
+
+    print(f"[INFO] Found {len(model_dirs)} model(s), comparing registered images, points and error...")
+    best: ModelStats | None = None
+    for model_dir in model_dirs:
+        try:
+            stats = read_model_stats(model_dir)
+        except (OSError, ValueError, IndexError) as e:
+            print(f"[WARN] Failed to read model {model_dir.name}: {e}")
+            continue
+        print(f"[INFO] Model {model_dir.name}: {stats.describe()}")
+        if best is None or _rank(stats) > _rank(best):
+            best = stats
+
+    if best is None:
+        print("[WARN] Could not determine best model")
+        return None
+    print(f"[INFO] Selected model {best.path.name}: {best.describe()}")
+    return best.path
+
+
+def _rank(stats: ModelStats) -> tuple[int, int, float]:
+    error = stats.mean_reprojection_error
+    return stats.num_images, stats.num_points, -(error if error == error else float("inf"))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Partitioned mapping for long ordered image sequences.
+
+Incremental `colmap mapper` cost grows superlinearly with the sequence
+length. Here the ordered image list is cut into overlapping chunks that are
+mapped in parallel processes; consecutive chunk models are then aligned on
+their shared images (a NumPy Sim(3) fit on common camera centres checks the
+overlap) and merged with `colmap model_merger`, followed by one bundle
+adjustment of the merged model.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+import shutil
+import subprocess
+
+import numpy as np
+
+from colmap_matching import frame_streams
+from colmap_model import find_best_model, read_images_binary
+
+# Ordered sets larger than this are mapped in chunks by default.
+PARTITION_MIN_IMAGES: int = 1000
+DEFAULT_CHUNK_SIZE: int = 400
+DEFAULT_CHUNK_OVERLAP: int = 60
+DEFAULT_MAPPER_THREADS: int = 4
+# Chunks sharing fewer registered images than this are not merged.
+MIN_COMMON_IMAGES: int = 5
+# Chunks whose Sim(3) fit has a larger residual (relative to the camera spread) are not merged.
+MAX_RELATIVE_RESIDUAL: float = 0.05
+
+
+def partition_ordered(names: list[str], chunk_size: int, overlap: int) -> list[list[str]]:
+    """Cut an ordered list into chunks of exactly chunk_size images, each sharing at
+    least `overlap` images with the next.
+
+    Uses the fewest chunks that allow that overlap and spaces them evenly, so
+    there is no short tail chunk and no chunk larger than chunk_size.
+    """
+    if chunk_size <= overlap:
+        raise ValueError("chunk_size must be larger than overlap")
+    if len(names) <= chunk_size:
+        return [list(names)]
+    num_chunks = -(-(len(names) - overlap) // (chunk_size - overlap))
+    span = len(names) - chunk_size
+    starts = [round(k * span / (num_chunks - 1)) for k in range(num_chunks)]
+    return [names[s:s + chunk_size] for s in starts]
+
+
+def estimate_sim3(src: np.ndarray, dst: np.ndarray) -> tuple[float, np.ndarray, np.ndarray]:
+    """Least-squares similarity dst ~ s * R @ src + t (Umeyama). Returns (s, R, t)."""
+    mu_src, mu_dst = src.mean(axis=0), dst.mean(axis=0)
+    xs, xd = src - mu_src, dst - mu_dst
+    cov = xd.T @ xs / len(src)
+    U, S, Vt = np.linalg.svd(cov)
+    D = np.eye(3)
+    if np.linalg.det(U) * np.linalg.det(Vt) < 0:
+        D[2, 2] = -1.0
+    R = U @ D @ Vt
+    var_src = (xs ** 2).sum() / len(src)
+    s = float(np.trace(np.diag(S) @ D) / var_src) if var_src > 0 else 1.0
+    t = mu_dst - s * R @ mu_src
+    return s, R, t
+
+
+def overlap_alignment(model_a: Path, model_b: Path) -> tuple[int, float]:
+    """Common registered images between two models and the relative RMS residual
+    of the Sim(3) fit mapping b's camera centres onto a's."""
+    images_a = read_images_binary(model_a / "images.bin")
+    images_b = read_images_binary(model_b / "images.bin")
+    index_b = {name: i for i, name in enumerate(images_b.names)}
+    common = [(i, index_b[name]) for i, name in enumerate(images_a.names) if name in index_b]
+    if len(common) < 3:
+        return len(common), float("inf")
+    ia, ib = np.array(common).T
+    centers_a = images_a.camera_centers()[ia]
+    centers_b = images_b.camera_centers()[ib]
+    s, R, t = estimate_sim3(centers_b, centers_a)
+    residual = np.sqrt(((s * centers_b @ R.T + t - centers_a) ** 2).sum(axis=1).mean())
+    spread = np.sqrt(((centers_a - centers_a.mean(axis=0)) ** 2).sum(axis=1).mean())
+    return len(common), float(residual / spread) if spread > 0 else float("inf")
+
+
+def partition_chunk_size(names: list[str], capture_type: str) -> int:
+    """Chunk size for the mapper, or 0 to map in one run.
+
+    MAPPER_CHUNK_SIZE overrides the default (0 disables partitioning); by
+    default only long video sequences with sequential names are partitioned.
+    """
+    env = os.environ.get("MAPPER_CHUNK_SIZE")
+    if env is not None:
+        return int(env)
+    if capture_type == "video" and len(names) > PARTITION_MIN_IMAGES and frame_streams(names) is not None:
+        return DEFAULT_CHUNK_SIZE
+    return 0
+
+
+def _map_chunk(db_path: Path, image_path: Path, chunk_dir: Path, names: list[str], threads: int) -> Path | None:
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    list_path = chunk_dir / "image_list.txt"
+    list_path.write_text("\n".join(names) + "\n")
+    with open(chunk_dir / "mapper.log", "w") as log:
+        result = subprocess.run([
+            "colmap", "mapper",
+            "--database_path", str(db_path),
+            "--image_path", str(image_path),
+            "--image_list_path", str(list_path),
+            "--output_path", str(chunk_dir),
+            "--Mapper.num_threads", str(threads),
+            "--Mapper.min_model_size", "10",
+        ], stdout=log, stderr=subprocess.STDOUT)
+    if result.returncode != 0:
+        print(f"[WARN] Mapper failed for {chunk_dir.name} (see {chunk_dir / 'mapper.log'})")
+        return None
+    return find_best_model(chunk_dir)
+
+
+def run_partitioned_mapper(
+    db_path: Path,
+    image_path: Path,
+    sparse_dir: Path,
+    names: list[str],
+    chunk_size: int,
+    overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> None:
+    """Map overlapping chunks in parallel and merge them into sparse_dir/0, 1, ...
+
+    Consecutive chunks that cannot be aligned (too few common images, or a
+    Sim(3) fit of the common camera centres with a residual above
+    MAX_RELATIVE_RESIDUAL) start a new model, so a broken sequence yields
+    several models instead of one corrupted one.
+    """
+    threads = int(os.environ.get("MAPPER_THREADS", DEFAULT_MAPPER_THREADS))
+    chunks = partition_ordered(names, chunk_size, min(overlap, chunk_size - 1))
+    workers = max(1, min(len(chunks), (os.cpu_count() or 1) // max(1, threads)))
+    work_dir = sparse_dir.parent / "sparse_chunks"
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    print(f"[INFO] Mapping {len(names)} images in {len(chunks)} chunks of <= {chunk_size} "
+          f"(overlap {overlap}), {workers} in parallel x {threads} threads")
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        models = list(pool.map(
+            lambda item: _map_chunk(db_path, image_path, work_dir / f"chunk_{item[0]:03d}", item[1], threads),
+            enumerate(chunks),
+        ))
+
+    # Merge consecutive chunks; an unmergeable chunk starts a new component.
+    components: list[Path] = []
+    current: Path | None = None
+    for i, model in enumerate(models):
+        if model is None:
+            continue
+        if current is None:
+            current = model
+            continue
+        num_common, residual = overlap_alignment(current, model)
+        print(f"[INFO] Chunk {i:03d}: {num_common} common images, Sim(3) residual {residual:.3f} of camera spread")
+        if num_common < MIN_COMMON_IMAGES or residual > MAX_RELATIVE_RESIDUAL:
+            reason = "shares too few images" if num_common < MIN_COMMON_IMAGES else \
+                "overlap is geometrically inconsistent"
+            print(f"[WARN] Chunk {i:03d} {reason}; starting a new model")
+            components.append(current)
+            current = model
+            continue
+        merged = work_dir / f"merged_{i:03d}"
+        merged.mkdir(parents=True, exist_ok=True)
+        subprocess.run([
+            "colmap", "model_merger",
+            "--input_path1", str(current),
+            "--input_path2", str(model),
+            "--output_path", str(merged),
+        ], check=True)
+        current = merged
+    if current is not None:
+        components.append(current)
+
+    if not components:
+        print("[WARN] No chunk produced a model")
+        return
+
+    for model_dir in sparse_dir.iterdir():
+        if model_dir.is_dir() and model_dir.name.isdigit():
+            shutil.rmtree(model_dir)
+    for index, component in enumerate(components):
+        target = sparse_dir / str(index)
+        print(f"[INFO] Bundle adjusting merged model {index}...")
+        target.mkdir(parents=True)
+        subprocess.run([
+            "colmap", "bundle_adjuster",
+            "--input_path", str(component),
+            "--output_path", str(target),
+        ], check=True)
+    shutil.rmtree(work_dir)
@@ -8,11 +8,24 @@ import subprocess
 import sys
 
 import config
+from colmap_append import append_images
+from colmap_db_report import write_database_report
+from colmap_features import run_feature_extraction
+from colmap_matching import list_images, plan_from_env
+from colmap_model import find_best_model
+from colmap_partition import partition_chunk_size, run_partitioned_mapper
+from image_staging import stage_images
+from image_subsets import load_subset, subset_run_dir
+from telemetry import RunLog
+from skybox_faces import plan_from_env as skybox_plan_from_env, prepare_skybox_images
 
 # ===== User-configurable parameters =====
 # Change these to adjust the SfM run without editing the commands below.
 IMAGE_DIR_DEFAULT: Path = config.DATASET_PATH / "_source" / "colmap_images" / config.DATA_VARIANT
 RUN_DIR_DEFAULT: Path = config.DATASET_PATH / "colmap_runs" / config.DATA_VARIANT
+# "video" for extracted video frames, "photo" for individually shot images.
+# Override the automatic matcher choice with MATCHER=exhaustive|sequential|vocab_tree.
+CAPTURE_TYPE: str = "photo"
 # =======================================
 
 
@@ -37,144 +50,132 @@ def detect_gpu() -> tuple[int, str]:
     return use_gpu, gpu_index
 
 
-def rsync_copy(src_dir: Path, dst_dir: Path) -> None:
-    print("[INFO] Syncing images to run directory...")
-    if shutil.which("rsync") is not None:
-        subprocess.run(["rsync", "-a", f"{src_dir}/", f"{dst_dir}/"], check=True)
-    else:
-        # Fallback: shutil.copytree(copy) with dirs_exist_ok
-        for item in src_dir.rglob("*"):
-            rel = item.relative_to(src_dir)
-            target = dst_dir / rel
-            if item.is_dir():
-                target.mkdir(parents=True, exist_ok=True)
-            else:
-                target.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy2(item, target)
-
-
-def find_largest_model(sparse_dir: Path) -> Path | None:
-    """Find the model with the largest folder size by comparing directory sizes.
-    
-    Returns the path to the largest model directory, or None if no models found.
-    """
-    if not sparse_dir.exists():
-        return None
-    
-    model_dirs = [d for d in sparse_dir.iterdir() if d.is_dir() and d.name.isdigit()]
-    if not model_dirs:
-        return None
-    
-    if len(model_dirs) == 1:
-        return model_dirs[0]
-    
-    print(f"[INFO] Found {len(model_dirs)} models, comparing folder sizes...")
-    
-    largest_model = None
-    max_size = 0
-    
-    for model_dir in model_dirs:
-        try:
-            # Calculate total size of directory
-            total_size = sum(f.stat().st_size for f in model_dir.rglob('*') if f.is_file())
-            size_mb = total_size / (1024 * 1024)
-            print(f"[INFO] Model {model_dir.name}: {size_mb:.1f} MB")
-            
-            if total_size > max_size:
-                max_size = total_size
-                largest_model = model_dir
-        except OSError as e:
-            print(f"[WARN] Failed to analyze model {model_dir.name}: {e}")
-            continue
-    
-    if largest_model:
-        size_mb = max_size / (1024 * 1024)
-        print(f"[INFO] Selected largest model: {largest_model.name} ({size_mb:.1f} MB)")
-    else:
-        print("[WARN] Could not determine largest model")
-    
-    return largest_model
-
-
 def main() -> None:
     # Resolve parameters from env or defaults
     image_dir = Path(os.environ.get("IMAGE_DIR", str(IMAGE_DIR_DEFAULT))).expanduser()
     run_dir = Path(os.environ.get("RUN_DIR", str(RUN_DIR_DEFAULT))).expanduser()
+    # IMAGE_LIST: a subset from image_subsets.py (or a plain image list); runs in <run>__<subset> by default
+    subset = load_subset(Path(os.environ["IMAGE_LIST"]).expanduser()) if os.environ.get("IMAGE_LIST") else None
+    if subset is not None and "RUN_DIR" not in os.environ:
+        run_dir = subset_run_dir(run_dir, subset)
 
     print(f"[INFO] IMAGE_DIR: {image_dir}")
     print(f"[INFO] RUN_DIR:   {run_dir}")
+    if subset is not None:
+        print(f"[INFO] SUBSET:    {subset.name} ({len(subset.names)} images)")
 
     ensure_colmap_available()
     use_gpu, gpu_index = detect_gpu()
+    # Wall/CPU time, peak RSS and I/O of every stage go to run_log.jsonl (RUN_LOG)
+    log = RunLog(Path(__file__).stem, dataset=config.DATASET_NAME, variant=config.DATA_VARIANT,
+                 run_dir=run_dir)
 
     # Prepare workspace
     (run_dir / "database").mkdir(parents=True, exist_ok=True)
-    (run_dir / "images").mkdir(parents=True, exist_ok=True)
     (run_dir / "sparse").mkdir(parents=True, exist_ok=True)
     (run_dir / "dense").mkdir(parents=True, exist_ok=True)
 
-    rsync_copy(image_dir, run_dir / "images")
+    # Skybox faces to use: SKYBOX_FACES / SKYBOX_DOWNSAMPLE / SKYBOX_STITCH (default: all six)
+    names = subset.names if subset is not None else list_images(image_dir)
+    faces_plan = skybox_plan_from_env()
+    sources: dict[str, Path] = {}
+    if not faces_plan.is_default:
+        print(f"[INFO] Skybox faces: {faces_plan.describe()}")
+        num_source = len(names)
+        with log.stage("skybox_faces", faces=faces_plan.describe()):
+            names, sources = prepare_skybox_images(image_dir, run_dir / "skybox_cache", faces_plan, names)
+        print(f"[INFO] {len(names)} images instead of {num_source}")
+
+    # Stage images (and masks) as hardlinks/reflinks/symlinks instead of copying them
+    mask_dir = os.environ.get("MASK_DIR")
+    with log.stage("stage_images"):
+        stage_images(
+            image_dir,
+            run_dir / "images",
+            names=names,
+            mask_dir=Path(mask_dir).expanduser() if mask_dir else None,
+            mask_dst=run_dir / "masks" if mask_dir else None,
+            mode=os.environ.get("STAGE_MODE", "auto"),
+            sources=sources,
+        )
 
     db_path = run_dir / "database" / "database.db"
     img_path = run_dir / "images"
     sparse_dir = run_dir / "sparse"
 
-    # Feature extraction (PINHOLE)
-    print("[INFO] Running feature extraction (PINHOLE)...")
-    subprocess.run([
-        "colmap", "feature_extractor",
-        "--database_path", str(db_path),
-        "--image_path", str(img_path),
+    extractor_options = [
         "--ImageReader.camera_model", "PINHOLE",
-        "--ImageReader.single_camera", "1",
+        # Downsampled faces and stitched views live in their own folders, with their own camera
+        *(["--ImageReader.single_camera_per_folder", "1"] if sources else ["--ImageReader.single_camera", "1"]),
         "--SiftExtraction.use_gpu", str(use_gpu),
         "--SiftExtraction.gpu_index", str(gpu_index),
         "--SiftExtraction.estimate_affine_shape", "1",
         "--SiftExtraction.domain_size_pooling", "1",
-    ], check=True)
-
-    # Exhaustive matching
-    print("[INFO] Running exhaustive matching...")
-    subprocess.run([
-        "colmap", "exhaustive_matcher",
-        "--database_path", str(db_path),
-        "--SiftMatching.use_gpu", str(use_gpu),
-        "--SiftMatching.gpu_index", str(gpu_index),
-    ], check=True)
-
-    # Mapper (sparse reconstruction)
-    print("[INFO] Running mapper (sparse reconstruction)...")
-    (sparse_dir / "0").mkdir(parents=True, exist_ok=True)
-    subprocess.run([
-        "colmap", "mapper",
-        "--database_path", str(db_path),
-        "--image_path", str(img_path),
-        "--output_path", str(sparse_dir),
-        "--Mapper.min_model_size", "10",  # Minimum 10 registered images
-    ], check=True)
-
-    # Find the largest model and clean up others
-    print("[INFO] Analyzing models to find largest...")
-    largest_model = find_largest_model(sparse_dir)
+    ]
+    if mask_dir:
+        extractor_options += ["--ImageReader.mask_path", str(run_dir / "masks")]
+
+    # APPEND=1: register only images missing from the existing database into sparse/0
+    if os.environ.get("APPEND") == "1":
+        with log.stage("append"):
+            append_images(run_dir, extractor_options, CAPTURE_TYPE, use_gpu, gpu_index)
+        print(f"[INFO] Done. Run directory: {run_dir}")
+        return
+
+    # Feature extraction (PINHOLE)
+    print("[INFO] Running feature extraction (PINHOLE)...")
+    # On CPU this is split into FEATURE_SHARDS parallel extractors (SHARD_THREADS each).
+    with log.stage("feature_extraction", images=len(list_images(img_path))):
+        run_feature_extraction(db_path, img_path, extractor_options, use_gpu)
+
+    # Matching (sequential, vocab tree or exhaustive depending on the image set)
+    plan = plan_from_env(img_path, CAPTURE_TYPE, pairs_path=run_dir / "database" / "match_pairs.txt")
+    plan.log()
+    print(f"[INFO] Running {plan.matcher}...")
+    with log.stage("matching", matcher=plan.matcher, expected_pairs=plan.expected_pairs):
+        subprocess.run(plan.command(db_path, use_gpu, gpu_index), check=True)
+
+    # Mapper (sparse reconstruction); long ordered sequences are mapped in parallel chunks
+    names = list_images(img_path)
+    chunk_size = partition_chunk_size(names, CAPTURE_TYPE)
+    with log.stage("mapper", images=len(names), chunk_size=chunk_size or None):
+        if chunk_size:
+            run_partitioned_mapper(db_path, img_path, sparse_dir, names, chunk_size)
+        else:
+            print("[INFO] Running mapper (sparse reconstruction)...")
+            (sparse_dir / "0").mkdir(parents=True, exist_ok=True)
+            subprocess.run([
+                "colmap", "mapper",
+                "--database_path", str(db_path),
+                "--image_path", str(img_path),
+                "--output_path", str(sparse_dir),
+                "--Mapper.min_model_size", "10",  # Minimum 10 registered images
+            ], check=True)
+
+    # Find the best model (registered images, points, reprojection error) and clean up others
+    print("[INFO] Analyzing models to find the best one...")
+    best_model = find_best_model(sparse_dir)
     
-    if largest_model:
-        # If the largest model is not in sparse/0, move it there
-        if largest_model.name != "0":
-            print(f"[INFO] Moving largest model from {largest_model.name} to 0...")
+    if best_model:
+        # If the best model is not in sparse/0, move it there
+        if best_model.name != "0":
+            print(f"[INFO] Moving best model from {best_model.name} to 0...")
             target_dir = sparse_dir / "0"
             if target_dir.exists():
                 shutil.rmtree(target_dir)
-            shutil.move(str(largest_model), str(target_dir))
+            shutil.move(str(best_model), str(target_dir))
         
         # Remove all other model directories
         for model_dir in sparse_dir.iterdir():
             if model_dir.is_dir() and model_dir.name.isdigit() and model_dir.name != "0":
-                print(f"[INFO] Removing smaller model {model_dir.name}...")
+                print(f"[INFO] Removing model {model_dir.name}...")
                 shutil.rmtree(model_dir)
         
-        print("[INFO] Kept only the largest model in sparse/0")
+        print("[INFO] Kept only the best model in sparse/0")
     else:
         print("[WARN] No valid model found")
+        # Keypoint counts, inlier ratios and view-graph components show why mapping failed
+        write_database_report(db_path)
 
     print(f"[INFO] Done. Run directory: {run_dir}")
 
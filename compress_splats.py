@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Prune and compress the Gaussian splat PLYs exported by 3DGRUT training.
+
+run_3dgrut_train.py exports every trained scene as a binary PLY in the 3DGS
+layout (x, y, z, f_dc_*, f_rest_*, opacity as a logit, scale_* as logs,
+rot_* as a (w, x, y, z) quaternion), about 250 bytes per Gaussian. The file
+is memory-mapped through a NumPy structured dtype built from its header, so
+nothing is parsed per Gaussian.
+
+Gaussians that are nearly transparent (--min-opacity) or tiny (--min-scale,
+largest axis) are pruned. The rest are sorted along a Morton curve and
+written in the chunked compressed PLY layout that web splat viewers read:
+
+    element chunk     per CHUNK_SIZE Gaussians: min/max of position, log scale
+                      and base colour (float)
+    element vertex    packed_position, packed_scale   11/10/11-bit, chunk-relative
+                      packed_rotation                 smallest three, 10 bits each
+                      packed_color                    8-bit RGB (chunk-relative) + opacity
+    element sh        f_rest_* as uchar over the fixed range [-SH_RANGE, SH_RANGE]
+
+That is 16 bytes per Gaussian plus one byte per SH coefficient. The file is
+decoded again to report the round-trip error; --decompress turns it back into
+a standard 3DGS PLY for tools that only read that.
+
+    python compress_splats.py $DATASET/3dgrut_runs/FullSet_QuarterRes     # newest PLY of the run
+    python compress_splats.py export_last.ply --min-opacity 0.01 --min-scale 1e-4
+    python compress_splats.py export_last.compressed.ply --decompress
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import re
+import sys
+import time
+
+import numpy as np
+
+CHUNK_SIZE: int = 256
+DEFAULT_MIN_OPACITY: float = 0.005
+DEFAULT_MIN_SCALE: float = 0.0
+# Log scales are clamped to this range before quantisation.
+LOG_SCALE_LIMIT: float = 20.0
+# f_rest coefficients are quantised over [-SH_RANGE, SH_RANGE], the fixed range viewers decode.
+SH_RANGE: float = 4.0
+# Zeroth-order SH basis constant: colour = SH_C0 * f_dc + 0.5.
+SH_C0: float = 0.28209479177387814
+
+PLY_TYPES: dict[str, str] = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+_PLY_NAMES: dict[str, str] = {"i1": "char", "u1": "uchar", "i2": "short", "u2": "ushort",
+                              "i4": "int", "u4": "uint", "f4": "float", "f8": "double"}
+_FORMATS: dict[str, str] = {"binary_little_endian": "<", "binary_big_endian": ">"}
+_SPLAT_FIELDS: list[str] = ["x", "y", "z", "f_dc_0", "f_dc_1", "f_dc_2", "opacity",
+                            "scale_0", "scale_1", "scale_2", "rot_0", "rot_1", "rot_2", "rot_3"]
+# Chunk element: a min_<axis> and max_<axis> property per axis of each quantised group.
+_CHUNK_GROUPS: dict[str, list[str]] = {"position": ["x", "y", "z"], "scale": ["scale_x", "scale_y", "scale_z"],
+                                       "color": ["r", "g", "b"]}
+
+
+@dataclass
+class PlyElement:
+    name: str
+    count: int
+    dtype: np.dtype
+
+
+def read_ply_header(path: Path) -> tuple[list[PlyElement], int]:
+    """Elements of a binary PLY and the byte offset of its data."""
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"{path} is not a PLY file")
+        endian = "<"
+        elements: list[tuple[str, int, list[tuple[str, str]]]] = []
+        for line in f:
+            words = line.decode("ascii", errors="replace").split()
+            if not words or words[0] in ("comment", "obj_info"):
+                continue
+            if words[0] == "end_header":
+                break
+            if words[0] == "format":
+                if words[1] not in _FORMATS:
+                    raise ValueError(f"{path}: {words[1]} PLY is not supported (binary only)")
+                endian = _FORMATS[words[1]]
+            elif words[0] == "element":
+                elements.append((words[1], int(words[2]), []))
+            elif words[0] == "property":
+                if words[1] == "list":
+                    raise ValueError(f"{path}: list property '{words[-1]}' is not supported")
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+        else:
+            raise ValueError(f"{path}: PLY header has no end_header")
+        offset = f.tell()
+    return [PlyElement(name, count, np.dtype([(p, endian + t) for p, t in props]))
+            for name, count, props in elements], offset
+
+
+def read_ply(path: Path) -> dict[str, np.ndarray]:
+    """Elements of a binary PLY as structured arrays memory-mapped from the file."""
+    elements, offset = read_ply_header(path)
+    data: dict[str, np.ndarray] = {}
+    for element in elements:
+        if element.count:
+            data[element.name] = np.memmap(path, dtype=element.dtype, mode="r", offset=offset,
+                                           shape=(element.count,))
+        else:
+            data[element.name] = np.empty(0, dtype=element.dtype)
+        offset += element.count * element.dtype.itemsize
+    return data
+
+
+def write_ply(path: Path, elements: dict[str, np.ndarray]) -> None:
+    """Write structured arrays as the elements of a binary little-endian PLY."""
+    header = ["ply", "format binary_little_endian 1.0"]
+    for name, array in elements.items():
+        header.append(f"element {name} {len(array)}")
+        header += [f"property {_PLY_NAMES[f'{array.dtype[field].kind}{array.dtype[field].itemsize}']} {field}"
+                   for field in array.dtype.names]
+    header.append("end_header")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(("\n".join(header) + "\n").encode("ascii"))
+        for array in elements.values():
+            little = np.dtype([(field, array.dtype[field].newbyteorder("<")) for field in array.dtype.names])
+            f.write(np.ascontiguousarray(array, dtype=little).tobytes())
+
+
+def sh_rest_fields(names: tuple[str, ...] | list[str]) -> list[str]:
+    """The f_rest_* fields in coefficient order."""
+    rest = [name for name in names if re.fullmatch(r"f_rest_\d+", name)]
+    return sorted(rest, key=lambda name: int(name[7:]))
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _logit(p: np.ndarray) -> np.ndarray:
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    return np.log(p / (1 - p))
+
+
+def _columns(vertex: np.ndarray, names: list[str]) -> np.ndarray:
+    return np.stack([np.asarray(vertex[name], dtype=np.float32) for name in names], axis=1)
+
+
+def prune_mask(vertex: np.ndarray, min_opacity: float = DEFAULT_MIN_OPACITY,
+               min_scale: float = DEFAULT_MIN_SCALE) -> np.ndarray:
+    """Gaussians to keep: opacity >= min_opacity and largest axis >= min_scale (0 disables)."""
+    keep = _sigmoid(np.asarray(vertex["opacity"], dtype=np.float64)) >= min_opacity
+    if min_scale > 0:
+        largest = _columns(vertex, ["scale_0", "scale_1", "scale_2"]).max(axis=1)
+        keep &= largest >= np.log(min_scale)
+    return keep
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    """Insert two zero bits between the low 21 bits of v (for 63-bit Morton codes)."""
+    v = v.astype(np.uint64) & np.uint64(0x1FFFFF)
+    for shift, mask in ((32, 0x1F00000000FFFF), (16, 0x1F0000FF0000FF), (8, 0x100F00F00F00F00F),
+                        (4, 0x10C30C30C30C30C3), (2, 0x1249249249249249)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def morton_order(xyz: np.ndarray) -> np.ndarray:
+    """Permutation sorting points along a Morton curve, so chunks are spatially compact."""
+    if not len(xyz):
+        return np.arange(0)
+    lo = xyz.min(axis=0)
+    extent = np.maximum(xyz.max(axis=0) - lo, 1e-12)
+    cells = np.clip((xyz - lo) / extent * (2**21 - 1), 0, 2**21 - 1)
+    codes = _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << np.uint64(1)) \
+        | (_spread_bits(cells[:, 2]) << np.uint64(2))
+    return np.argsort(codes, kind="stable")
+
+
+def _unorm(v: np.ndarray, bits: int) -> np.ndarray:
+    top = (1 << bits) - 1
+    return np.clip(np.rint(v * top), 0, top).astype(np.uint32)
+
+
+def _chunk_bounds(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per-chunk minimum and maximum of (n, k) values, each (chunks, k)."""
+    starts = np.arange(0, len(values), CHUNK_SIZE)
+    return np.minimum.reduceat(values, starts, axis=0), np.maximum.reduceat(values, starts, axis=0)
+
+
+def _normalize(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    chunk = np.arange(len(values)) // CHUNK_SIZE
+    span = hi - lo
+    return (values - lo[chunk]) / np.where(span > 0, span, 1.0)[chunk]
+
+
+def _denormalize(unit: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    chunk = np.arange(len(unit)) // CHUNK_SIZE
+    return lo[chunk] + unit * (hi - lo)[chunk]
+
+
+def _pack_11_10_11(unit: np.ndarray) -> np.ndarray:
+    return (_unorm(unit[:, 0], 11) << 21) | (_unorm(unit[:, 1], 10) << 11) | _unorm(unit[:, 2], 11)
+
+
+def _unpack_11_10_11(packed: np.ndarray) -> np.ndarray:
+    return np.stack([(packed >> 21) / 2047.0, ((packed >> 11) & 0x3FF) / 1023.0, (packed & 0x7FF) / 2047.0],
+                    axis=1)
+
+
+def pack_rotations(rot: np.ndarray) -> np.ndarray:
+    """Smallest-three quaternion encoding: index of the largest component in the top two bits,
+    the other three (scaled from [-1/sqrt(2), 1/sqrt(2)]) in 10 bits each."""
+    q = rot / np.maximum(np.linalg.norm(rot, axis=1, keepdims=True), 1e-12)
+    largest = np.abs(q).argmax(axis=1)
+    q *= np.where(q[np.arange(len(q)), largest] < 0, -1.0, 1.0)[:, None]
+    others = np.array([[j for j in range(4) if j != i] for i in range(4)])[largest]
+    small = np.take_along_axis(q, others, axis=1) * np.sqrt(0.5) + 0.5
+    packed = largest.astype(np.uint32) << 30
+    for k in range(3):
+        packed |= _unorm(small[:, k], 10) << (20 - 10 * k)
+    return packed
+
+
+def unpack_rotations(packed: np.ndarray) -> np.ndarray:
+    largest = (packed >> 30).astype(np.int64)
+    small = np.stack([((packed >> (20 - 10 * k)) & 0x3FF) / 1023.0 for k in range(3)], axis=1)
+    small = (small - 0.5) / np.sqrt(0.5)
+    q = np.zeros((len(packed), 4))
+    others = np.array([[j for j in range(4) if j != i] for i in range(4)])[largest]
+    np.put_along_axis(q, others, small, axis=1)
+    q[np.arange(len(q)), largest] = np.sqrt(np.maximum(0.0, 1.0 - (small**2).sum(axis=1)))
+    return q
+
+
+def _chunk_dtype(groups: list[str]) -> np.dtype:
+    return np.dtype([(f"{kind}_{axis}", "<f4") for group in groups for kind in ("min", "max")
+                     for axis in _CHUNK_GROUPS[group]])
+
+
+def _group_bounds(chunk: np.ndarray, group: str) -> tuple[np.ndarray, np.ndarray]:
+    axes = _CHUNK_GROUPS[group]
+    return (np.stack([chunk[f"min_{axis}"] for axis in axes], axis=1),
+            np.stack([chunk[f"max_{axis}"] for axis in axes], axis=1))
+
+
+def pack_sh(sh: np.ndarray) -> np.ndarray:
+    """f_rest coefficients as uchar over [-SH_RANGE, SH_RANGE] (values outside are clamped)."""
+    return np.clip(np.floor((sh / (2 * SH_RANGE) + 0.5) * 256), 0, 255).astype(np.uint8)
+
+
+def unpack_sh(packed: np.ndarray) -> np.ndarray:
+    return ((packed + 0.5) / 256 - 0.5) * (2 * SH_RANGE)
+
+
+def compress(vertex: np.ndarray) -> dict[str, np.ndarray]:
+    """Compressed PLY elements (chunk, vertex and, with higher-order SH, sh) of 3DGS splats.
+
+    Chunks are runs of CHUNK_SIZE consecutive splats, so sort the splats with
+    morton_order() first for tight chunk ranges.
+    """
+    missing = [name for name in _SPLAT_FIELDS if name not in vertex.dtype.names]
+    if missing:
+        raise ValueError(f"Not a 3DGS splat PLY, missing: {', '.join(missing)}")
+    rest = sh_rest_fields(vertex.dtype.names)
+    values = {
+        "position": _columns(vertex, ["x", "y", "z"]),
+        "scale": np.clip(_columns(vertex, ["scale_0", "scale_1", "scale_2"]), -LOG_SCALE_LIMIT, LOG_SCALE_LIMIT),
+        "color": SH_C0 * _columns(vertex, ["f_dc_0", "f_dc_1", "f_dc_2"]) + 0.5,
+    }
+
+    chunk = np.empty((len(vertex) + CHUNK_SIZE - 1) // CHUNK_SIZE, dtype=_chunk_dtype(list(values)))
+    for group, array in values.items():
+        lo, hi = _chunk_bounds(array)
+        for k, axis in enumerate(_CHUNK_GROUPS[group]):
+            chunk[f"min_{axis}"], chunk[f"max_{axis}"] = lo[:, k], hi[:, k]
+    # Quantise against the stored float32 bounds, as a reader decodes them.
+    unit = {group: _normalize(array, *_group_bounds(chunk, group)) for group, array in values.items()}
+
+    color = _unorm(unit["color"], 8)
+    alpha = _unorm(_sigmoid(np.asarray(vertex["opacity"], dtype=np.float64)), 8)
+    packed = np.empty(len(vertex), dtype=[("packed_position", "<u4"), ("packed_rotation", "<u4"),
+                                          ("packed_scale", "<u4"), ("packed_color", "<u4")])
+    packed["packed_position"] = _pack_11_10_11(unit["position"])
+    packed["packed_rotation"] = pack_rotations(_columns(vertex, ["rot_0", "rot_1", "rot_2", "rot_3"]))
+    packed["packed_scale"] = _pack_11_10_11(unit["scale"])
+    packed["packed_color"] = (color[:, 0] << 24) | (color[:, 1] << 16) | (color[:, 2] << 8) | alpha
+    elements = {"chunk": chunk, "vertex": packed}
+    if rest:
+        sh = pack_sh(_columns(vertex, rest))
+        elements["sh"] = np.empty(len(vertex), dtype=[(name, "u1") for name in rest])
+        for k, name in enumerate(rest):
+            elements["sh"][name] = sh[:, k]
+    return elements
+
+
+def decompress(elements: dict[str, np.ndarray]) -> np.ndarray:
+    """Standard 3DGS vertex array (float32) of compressed PLY elements."""
+    chunk, packed = elements["chunk"], elements["vertex"]
+    rest = list(elements["sh"].dtype.names) if "sh" in elements else []
+    vertex = np.empty(len(packed), dtype=[(name, "<f4") for name in _SPLAT_FIELDS[:6] + rest + _SPLAT_FIELDS[6:]])
+    position = _denormalize(_unpack_11_10_11(packed["packed_position"]), *_group_bounds(chunk, "position"))
+    scale = _denormalize(_unpack_11_10_11(packed["packed_scale"]), *_group_bounds(chunk, "scale"))
+    color_bits = packed["packed_color"]
+    color = np.stack([((color_bits >> shift) & 0xFF) / 255.0 for shift in (24, 16, 8)], axis=1)
+    color = _denormalize(color, *_group_bounds(chunk, "color"))
+    rotation = unpack_rotations(packed["packed_rotation"])
+    for k in range(3):
+        vertex["xyz"[k]] = position[:, k]
+        vertex[f"scale_{k}"] = scale[:, k]
+        vertex[f"f_dc_{k}"] = (color[:, k] - 0.5) / SH_C0
+    for k in range(4):
+        vertex[f"rot_{k}"] = rotation[:, k]
+    vertex["opacity"] = _logit((color_bits & 0xFF) / 255.0)
+    if rest:
+        sh = unpack_sh(np.stack([elements["sh"][name] for name in rest], axis=1))
+        for k, name in enumerate(rest):
+            vertex[name] = sh[:, k]
+    return vertex
+
+
+def roundtrip_errors(original: np.ndarray, restored: np.ndarray) -> dict[str, float]:
+    """Maximum (and RMS position) errors of restored splats against the originals, in the same order."""
+    position = np.linalg.norm(_columns(original, ["x", "y", "z"]) - _columns(restored, ["x", "y", "z"]), axis=1)
+    rot_names = ["rot_0", "rot_1", "rot_2", "rot_3"]
+    q0, q1 = (_columns(v, rot_names) for v in (original, restored))
+    q0 /= np.maximum(np.linalg.norm(q0, axis=1, keepdims=True), 1e-12)
+    q1 /= np.maximum(np.linalg.norm(q1, axis=1, keepdims=True), 1e-12)
+    angle = np.degrees(2 * np.arccos(np.clip(np.abs((q0 * q1).sum(axis=1)), 0.0, 1.0)))
+    log_scale = np.abs(np.clip(_columns(original, ["scale_0", "scale_1", "scale_2"]), -LOG_SCALE_LIMIT,
+                               LOG_SCALE_LIMIT) - _columns(restored, ["scale_0", "scale_1", "scale_2"]))
+    dc = ["f_dc_0", "f_dc_1", "f_dc_2"]
+    color = SH_C0 * np.abs(_columns(original, dc) - _columns(restored, dc))
+    opacity = np.abs(_sigmoid(_columns(original, ["opacity"])) - _sigmoid(_columns(restored, ["opacity"])))
+    rest = sh_rest_fields(original.dtype.names)
+    sh = np.abs(_columns(original, rest) - _columns(restored, rest)) if rest else np.zeros(1)
+    return {
+        "position_max": float(position.max(initial=0.0)),
+        "position_rms": float(np.sqrt(np.mean(position**2))) if len(position) else 0.0,
+        "scale_max_rel": float(np.expm1(log_scale.max(initial=0.0))),
+        "rotation_max_deg": float(angle.max(initial=0.0)),
+        "color_max": float(color.max(initial=0.0)),
+        "opacity_max": float(opacity.max(initial=0.0)),
+        "sh_max": float(sh.max(initial=0.0)),
+    }
+
+
+def find_splat_ply(path: Path) -> Path | None:
+    """path itself, or the newest exported (uncompressed) PLY below a 3DGRUT run directory."""
+    if path.is_file():
+        return path
+    plys = [p for p in path.rglob("*.ply") if not p.name.endswith((".compressed.ply", ".decompressed.ply"))]
+    return max(plys, key=lambda p: p.stat().st_mtime, default=None)
+
+
+def _size(num_bytes: int) -> str:
+    return f"{num_bytes / 2**20:.1f} MB"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prune and compress a 3DGS/3DGRUT splat PLY")
+    parser.add_argument("ply", type=Path, help="Splat PLY, or a 3DGRUT run directory (newest exported PLY)")
+    parser.add_argument("--output", type=Path,
+                        help="Output PLY (default: <input>.compressed.ply, or <input>.decompressed.ply)")
+    parser.add_argument("--min-opacity", type=float, default=DEFAULT_MIN_OPACITY,
+                        help=f"Prune Gaussians below this opacity (default: {DEFAULT_MIN_OPACITY})")
+    parser.add_argument("--min-scale", type=float, default=DEFAULT_MIN_SCALE,
+                        help="Prune Gaussians whose largest axis is below this size, in scene units "
+                             f"(default: {DEFAULT_MIN_SCALE}, off)")
+    parser.add_argument("--decompress", action="store_true", help="Write a compressed PLY back as a 3DGS PLY")
+    args = parser.parse_args()
+
+    path = find_splat_ply(args.ply.expanduser())
+    if path is None:
+        print(f"[ERROR] No splat PLY in {args.ply}", file=sys.stderr)
+        return 1
+    stem = path.name.removesuffix(".ply").removesuffix(".compressed")
+    try:
+        data = read_ply(path)
+        if args.decompress:
+            if "chunk" not in data:
+                raise ValueError(f"{path} is not a compressed splat PLY")
+            output = args.output or path.with_name(f"{stem}.decompressed.ply")
+            vertex = decompress(data)
+            write_ply(output, {"vertex": vertex})
+            print(f"[INFO] Wrote {len(vertex):,} splats to {output} ({_size(output.stat().st_size)})")
+            return 0
+        if "vertex" not in data or "chunk" in data:
+            raise ValueError(f"{path} is not an uncompressed splat PLY")
+        vertex = data["vertex"]
+
+        start = time.perf_counter()
+        kept = vertex[prune_mask(vertex, args.min_opacity, args.min_scale)]
+        if not len(kept):
+            raise ValueError("No splats left after pruning")
+        kept = kept[morton_order(_columns(kept, ["x", "y", "z"]))]
+        print(f"[INFO] Pruned {len(vertex):,} -> {len(kept):,} splats "
+              f"({len(vertex) - len(kept):,} below opacity {args.min_opacity} / scale {args.min_scale})")
+        elements = compress(kept)
+        output = args.output or path.with_name(f"{stem}.compressed.ply")
+        write_ply(output, elements)
+        print(f"[INFO] Compressed in {time.perf_counter() - start:.2f}s")
+    except ValueError as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    errors = roundtrip_errors(kept, decompress(read_ply(output)))
+    extent = float(np.linalg.norm(np.ptp(_columns(kept, ["x", "y", "z"]), axis=0))) if len(kept) else 0.0
+    in_size, out_size = path.stat().st_size, output.stat().st_size
+    print(f"[INFO] Size: {_size(in_size)} -> {_size(out_size)} ({in_size / max(out_size, 1):.1f}x smaller). "
+          f"Wrote {output}")
+    print(f"[INFO] Round-trip error: position max {errors['position_max']:.4g} / rms {errors['position_rms']:.4g} "
+          f"(scene diagonal {extent:.4g}), scale {100 * errors['scale_max_rel']:.2f}%, "
+          f"rotation {errors['rotation_max_deg']:.2f} deg, colour {errors['color_max']:.4f}, "
+          f"opacity {errors['opacity_max']:.4f}, SH {errors['sh_max']:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,32 @@
+import os
 from pathlib import Path
 
-DATASET_ROOT = Path("/home/pc-04/Research/_datasets")
+from datasets import Dataset, find_dataset
+
+# DATASET_ROOT=<dir> overrides the workstation default.
+DATASET_ROOT = Path(os.environ.get("DATASET_ROOT", "/home/pc-04/Research/_datasets"))
 
 DATASET_LOCATION = "YJP-Lvl04"
 DATASET_TYPE = "SonyA7Mk4"
 DATASET_DATE = "250828"
 DATASET_NO = "00"
 
-if DATASET_TYPE == "SonyA7Mk4":
-    DATA_COMPLETENESS = "Full"
-    DATA_RESOLUTION = "Quarter"
-    DATA_VARIANT = f"{DATA_COMPLETENESS}Set_{DATA_RESOLUTION}Res"
-elif DATASET_TYPE == "MatterportPro3":
-    DATA_COMPLETENESS = "Full"
-    DATA_RESOLUTION = "Full"
-    DATA_VARIANT = f"{DATA_COMPLETENESS}Set_{DATA_RESOLUTION}Res"
-elif DATASET_TYPE == "Insta360X4":
-    EVERY_SECONDS: int = 1
-    CAMERA: str = "front" 
-    DATA_VARIANT: Path = f"every_{EVERY_SECONDS}/{CAMERA}"
+# DATASET=<name> selects another dataset (datasets.toml entry or {location}_{type}_{date}-{no} name).
+# The type-specific DATA_VARIANT logic lives in datasets.Dataset.
+if os.environ.get("DATASET"):
+    DATASET = find_dataset(os.environ["DATASET"], DATASET_ROOT)
+else:
+    DATASET = Dataset(DATASET_LOCATION, DATASET_TYPE, DATASET_DATE, DATASET_NO, root=DATASET_ROOT)
+DATASET_ROOT = DATASET.root
+DATASET_LOCATION, DATASET_TYPE, DATASET_DATE, DATASET_NO = DATASET.location, DATASET.type, DATASET.date, DATASET.no
+
+if DATASET_TYPE == "Insta360X4":
+    EVERY_SECONDS: int = DATASET.every_seconds
+    CAMERA: str = DATASET.camera
+else:
+    DATA_COMPLETENESS = DATASET.completeness
+    DATA_RESOLUTION = DATASET.resolution
+DATA_VARIANT = DATASET.data_variant
 
-DATASET_NAME = f"{DATASET_LOCATION}_{DATASET_TYPE}_{DATASET_DATE}-{DATASET_NO}"
-DATASET_PATH = Path(DATASET_ROOT) / DATASET_NAME
\ No newline at end of file
+DATASET_NAME = DATASET.name
+DATASET_PATH = DATASET.path
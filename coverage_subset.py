@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Pick a small training subset that keeps the coverage of a finished SfM run.
+
+Reads the run's sparse/0 model, builds the sparse image x 3D-point
+visibility (CSR from the point tracks) and greedily adds the image that
+covers the most still under-observed points, until a target fraction of
+the observations is kept. Observations count up to --min-views per point,
+so a point only needs a few views, not all of them. The subset is written as
+a run variant (see image_subsets.py) for run_3dgrut_train.py.
+
+Example:
+    python coverage_subset.py --target 0.95 --min-views 3
+    python run_3dgrut_train.py --subset <colmap_runs>/<variant>__coverage95
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import argparse
+import heapq
+import sys
+import time
+
+import numpy as np
+
+from colmap_model import ColmapModel, read_model
+from image_subsets import load_subset, make_subset_run, write_subset
+
+DEFAULT_TARGET: float = 0.95
+DEFAULT_MIN_VIEWS: int = 3
+
+
+@dataclass
+class CoverageSelection:
+    image_indices: np.ndarray   # selected images, in selection order
+    coverage: np.ndarray        # covered fraction after each selection
+    point_views: np.ndarray     # selected views per point at the end
+
+
+def visibility_csr(model: ColmapModel) -> tuple[np.ndarray, np.ndarray]:
+    """Image -> point visibility as CSR (offsets over images, point indices).
+
+    A point observed twice in one image counts once for that image.
+    """
+    images, points = model.images, model.points3D
+    order = np.argsort(images.ids)
+    pos = np.searchsorted(images.ids, points.track_image_ids, sorter=order)
+    obs_image = order[np.minimum(pos, len(order) - 1)]
+    valid = images.ids[obs_image] == points.track_image_ids
+    obs_point = np.repeat(np.arange(len(points)), points.track_lengths)
+    keys = np.unique(obs_image[valid].astype(np.int64) * len(points) + obs_point[valid])
+    image_of, point_of = np.divmod(keys, max(1, len(points)))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(image_of, minlength=len(images)))]).astype(np.int64)
+    return offsets, point_of
+
+
+def greedy_coverage(
+    offsets: np.ndarray,
+    point_idx: np.ndarray,
+    num_points: int,
+    target: float = DEFAULT_TARGET,
+    min_views: int = DEFAULT_MIN_VIEWS,
+    max_images: int | None = None,
+) -> CoverageSelection:
+    """Lazy greedy max-coverage with per-point demand min(track length, min_views).
+
+    Gains only shrink as images are selected (the objective is submodular),
+    so a popped image whose recomputed gain still tops the heap is the true
+    best choice; most images are never re-evaluated.
+    """
+    num_images = len(offsets) - 1
+    demand = np.minimum(np.bincount(point_idx, minlength=num_points), min_views)
+    total = int(demand.sum())
+    views = np.zeros(num_points, dtype=np.int64)
+    heap = [(-int(offsets[i + 1] - offsets[i]), i) for i in range(num_images)]
+    heapq.heapify(heap)
+
+    covered = 0
+    selected: list[int] = []
+    coverage: list[float] = []
+    limit = num_images if max_images is None else max_images
+    while heap and len(selected) < limit and covered < target * total:
+        _, i = heapq.heappop(heap)
+        pts = point_idx[offsets[i]:offsets[i + 1]]
+        gain = int(np.count_nonzero(views[pts] < demand[pts]))
+        if gain == 0:
+            continue
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, i))
+            continue
+        views[pts] += 1
+        covered += gain
+        selected.append(i)
+        coverage.append(covered / total if total else 1.0)
+    return CoverageSelection(np.array(selected, dtype=np.int64), np.array(coverage), views)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Select a coverage-preserving training subset from sparse/0")
+    parser.add_argument("--run-dir", help="COLMAP run directory (default: the config.py data variant)")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET,
+                        help="Fraction of (capped) point observations to keep")
+    parser.add_argument("--min-views", type=int, default=DEFAULT_MIN_VIEWS,
+                        help="Views per point that count towards coverage")
+    parser.add_argument("--max-images", type=int, help="Stop after this many images")
+    parser.add_argument("--name", help="Subset name (default: coverage<target %%>)")
+    args = parser.parse_args()
+
+    if args.run_dir:
+        run_dir = Path(args.run_dir).expanduser()
+    else:
+        import config
+        run_dir = config.DATASET_PATH / "colmap_runs" / config.DATA_VARIANT
+    model_dir = run_dir / "sparse" / "0"
+    if not (model_dir / "points3D.bin").is_file():
+        print(f"[ERROR] No sparse model in {model_dir}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    model = read_model(model_dir)
+    offsets, point_idx = visibility_csr(model)
+    print(f"[INFO] Loaded {len(model.images)} images, {len(model.points3D):,} points, "
+          f"{len(point_idx):,} visibilities in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    selection = greedy_coverage(offsets, point_idx, len(model.points3D), args.target, args.min_views,
+                                args.max_images)
+    num_selected = len(selection.image_indices)
+    coverage = float(selection.coverage[-1]) if num_selected else 0.0
+    full_views = np.bincount(point_idx, minlength=len(model.points3D))
+    well_seen = float(np.mean(selection.point_views >= np.minimum(full_views, args.min_views))) \
+        if len(model.points3D) else 1.0
+    print(f"[INFO] Selected {num_selected} of {len(model.images)} images in {time.perf_counter() - start:.2f}s: "
+          f"{coverage:.1%} coverage, {well_seen:.1%} of points keep min(track, {args.min_views}) views")
+
+    names = sorted(model.images.names[i] for i in selection.image_indices)
+    name = args.name or f"coverage{round(args.target * 100)}"
+    out_dir = run_dir.with_name(f"{run_dir.name}__{name}")
+    write_subset(out_dir, names, run_dir / "images", name=name, selection={
+        "method": "greedy_coverage",
+        "target": args.target,
+        "min_views": args.min_views,
+        "max_images": args.max_images,
+        "coverage": coverage,
+    }, num_source_images=len(model.images))
+    make_subset_run(run_dir, load_subset(out_dir), out_dir)
+    print(f"[INFO] Train with: python run_3dgrut_train.py --subset {out_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
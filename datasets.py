@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Dataset registry: every capture as a Dataset value instead of config.py globals.
+
+Datasets are named {location}_{type}_{date}-{no} (see README Setup). They come
+from datasets.toml next to this file (DATASETS_TOML overrides the path) or,
+without a registry file, from a scan of the dataset root for directories with
+such names. The type-specific data variant (Full/Quarter resolution photo
+sets, every_N/<camera> video frames) is derived here; entries in the registry
+can override it per dataset:
+
+    root = "/home/pc-04/Research/_datasets"
+
+    [[dataset]]
+    name = "YJP-Lvl04_SonyA7Mk4_250828-00"
+
+    [[dataset]]
+    name = "YJP-Lvl05_Insta360X4_250901-00"
+    every_seconds = 2
+    camera = "both"
+
+config.py builds its constants from the dataset named by the DATASET
+environment variable (default: the one configured in config.py), so every
+script can be pointed at another capture without editing it; run_batch.py
+uses that to process many datasets.
+
+    python datasets.py                      # registered (or scanned) datasets and their variants
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field, fields
+from fnmatch import fnmatch
+from pathlib import Path
+import argparse
+import os
+import re
+import sys
+import tomllib
+
+REGISTRY_PATH: Path = Path(__file__).resolve().parent / "datasets.toml"
+NAME_RE = re.compile(r"^(?P<location>.+)_(?P<type>[^_]+)_(?P<date>\d{6})-(?P<no>\d+)$")
+
+# Per camera type: data variant parameters and the command that processes a dataset.
+DATASET_TYPES: dict[str, dict] = {
+    "SonyA7Mk4": {"completeness": "Full", "resolution": "Quarter", "command": ["pipeline.py", "photos"]},
+    "MatterportPro3": {"completeness": "Full", "resolution": "Full", "command": ["colmap_sfm_skybox.py"]},
+    "Insta360X4": {"every_seconds": 1, "camera": "front", "command": ["pipeline.py", "video"]},
+}
+
+
+@dataclass(frozen=True)
+class Dataset:
+    location: str
+    type: str
+    date: str
+    no: str = "00"
+    root: Path = field(default=Path("."), compare=False)
+    completeness: str | None = None
+    resolution: str | None = None
+    every_seconds: int | None = None
+    camera: str | None = None
+
+    def __post_init__(self) -> None:
+        if self.type not in DATASET_TYPES:
+            raise ValueError(f"Unknown dataset type '{self.type}' (known: {', '.join(DATASET_TYPES)})")
+        for key, value in DATASET_TYPES[self.type].items():
+            if key != "command" and getattr(self, key) is None:
+                object.__setattr__(self, key, value)
+        object.__setattr__(self, "root", Path(self.root).expanduser())
+
+    @property
+    def name(self) -> str:
+        return f"{self.location}_{self.type}_{self.date}-{self.no}"
+
+    @property
+    def path(self) -> Path:
+        return self.root / self.name
+
+    @property
+    def data_variant(self) -> str:
+        if self.type == "Insta360X4":
+            return f"every_{self.every_seconds}/{self.camera}"
+        return f"{self.completeness}Set_{self.resolution}Res"
+
+    @property
+    def command(self) -> list[str]:
+        """Script (and arguments) that processes this dataset, relative to the repository."""
+        command = list(DATASET_TYPES[self.type]["command"])
+        if self.type == "Insta360X4":
+            command += ["--every-seconds", str(self.every_seconds), "--cameras", str(self.camera)]
+        return command
+
+    @classmethod
+    def from_name(cls, name: str, root: Path, **overrides: object) -> Dataset:
+        match = NAME_RE.match(name)
+        if match is None:
+            raise ValueError(f"'{name}' is not a {{location}}_{{type}}_{{date}}-{{no}} dataset name")
+        return cls(**match.groupdict(), root=root, **overrides)
+
+
+def scan_root(root: Path) -> list[Dataset]:
+    """Datasets found as directories of the root, by name."""
+    datasets = []
+    for path in sorted(root.iterdir()) if root.is_dir() else []:
+        match = NAME_RE.match(path.name)
+        if path.is_dir() and match and match["type"] in DATASET_TYPES:
+            datasets.append(Dataset.from_name(path.name, root))
+    return datasets
+
+
+def registry_path() -> Path:
+    return Path(os.environ.get("DATASETS_TOML") or REGISTRY_PATH).expanduser()
+
+
+def load_registry(root: Path, path: Path | None = None) -> list[Dataset]:
+    """Datasets of the registry file, or of a scan of root when there is none."""
+    path = path or registry_path()
+    if not path.is_file():
+        return scan_root(root)
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    root = Path(data.get("root", root))
+    allowed = {f.name for f in fields(Dataset)} - {"root"}
+    datasets = []
+    for entry in data.get("dataset", []):
+        entry = dict(entry)
+        unknown = set(entry) - allowed - {"name"}
+        if unknown:
+            raise ValueError(f"Unknown key(s) in {path}: {', '.join(sorted(unknown))}")
+        name = entry.pop("name", None)
+        datasets.append(Dataset.from_name(name, root, **entry) if name else Dataset(root=root, **entry))
+    return datasets
+
+
+def find_dataset(name: str, root: Path) -> Dataset:
+    """The registry entry for name, or the dataset parsed from the name."""
+    for dataset in load_registry(root):
+        if dataset.name == name:
+            return dataset
+    return Dataset.from_name(name, root)
+
+
+def select_datasets(datasets: list[Dataset], patterns: list[str] | None = None,
+                    types: list[str] | None = None) -> list[Dataset]:
+    """Datasets whose name matches any glob pattern and whose type is listed."""
+    return [d for d in datasets
+            if (not patterns or any(fnmatch(d.name, p) for p in patterns)) and (not types or d.type in types)]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="List the registered datasets")
+    parser.add_argument("patterns", nargs="*", help="Dataset name globs")
+    parser.add_argument("--root", type=Path, help="Dataset root (default: config.py DATASET_ROOT)")
+    args = parser.parse_args()
+
+    if args.root is None:
+        import config
+        args.root = config.DATASET_ROOT
+    try:
+        datasets = select_datasets(load_registry(args.root), args.patterns)
+    except (ValueError, tomllib.TOMLDecodeError) as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+    for dataset in datasets:
+        present = "" if dataset.path.is_dir() else "  (missing)"
+        print(f"{dataset.name:<40} {dataset.data_variant:<22} {' '.join(dataset.command)}{present}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
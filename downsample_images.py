@@ -3,11 +3,12 @@
 Script to downsample images by a factor of 2.
 """
 
-import cv2
-import numpy as np
 from pathlib import Path
+import argparse
 import os
 
+from telemetry import RunLog
+
 # Define paths
 #/home/pc-04/Research/_datasets/YJP_Lvl04_250828_DSLR/_source/editedFull
 DATASET_NAME = "YJP_Lvl04_250828_DSLR"
@@ -24,6 +25,8 @@ def downsample_images(input_dir, output_dir, scale_factor=2):
         output_dir (str): Path to output images directory
         scale_factor (int): Factor to downsample by (default: 2)
     """
+    import cv2
+
     input_path = Path(input_dir)
     output_path = Path(output_dir)
     
@@ -72,16 +75,36 @@ def downsample_images(input_dir, output_dir, scale_factor=2):
     
     print(f"Successfully processed {processed_count} images")
     print(f"Downsampled images saved to: {output_path}")
+    return processed_count
+
+def dataset_dir_of(input_dir) -> Path:
+    """The dataset directory above a <dataset>/_source/... input, else the config.py dataset."""
+    path = Path(input_dir).resolve()
+    for parent in path.parents:
+        if parent.name == "_source":
+            return parent.parent
+    import config
+    return config.DATASET_PATH
+
 
 if __name__ == "__main__":
-    
-    print(f"Input directory: {INPUT_DIRECTORY}")
-    print(f"Output directory: {OUTPUT_DIRECTORY}")
+    parser = argparse.ArgumentParser(description="Downsample all images of a directory")
+    parser.add_argument("--input", default=INPUT_DIRECTORY, help="Input images directory")
+    parser.add_argument("--output", default=OUTPUT_DIRECTORY, help="Output images directory")
+    parser.add_argument("--factor", type=int, default=2, help="Downsample factor (default: 2)")
+    args = parser.parse_args()
+
+    print(f"Input directory: {args.input}")
+    print(f"Output directory: {args.output}")
     
     # Check if input directory exists
-    if not Path(INPUT_DIRECTORY).exists():
-        print(f"Error: Input directory {INPUT_DIRECTORY} does not exist")
+    if not Path(args.input).exists():
+        print(f"Error: Input directory {args.input} does not exist")
         exit(1)
     
-    # Process images
-    downsample_images(INPUT_DIRECTORY, OUTPUT_DIRECTORY, scale_factor=2)
+    # Process images; timing and resources go to run_log.jsonl in the dataset directory
+    dataset_dir = dataset_dir_of(args.input)
+    log = RunLog("downsample_images", dataset_dir=dataset_dir, dataset=dataset_dir.name,
+                 input=args.input, output=args.output, scale_factor=args.factor)
+    with log.stage("downsample") as info:
+        info["images"] = downsample_images(args.input, args.output, scale_factor=args.factor)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Plateau-based early stopping for 3DGRUT training.
+
+The metrics parsed from the training output (metrics_store.LogParser) are fed
+to a PlateauDetector: the mean of the monitored metric over the last `window`
+steps is compared with the mean over the `window` steps before; when it
+improved by less than `tolerance` (relative), training has converged. The
+EarlyStopper then waits for the next checkpoint or PLY export line and for
+training to resume after it, so the save is complete, before the launcher
+stops the trainer. The convergence and stop steps are stored with the run.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+import re
+
+# Output lines announcing a checkpoint or export ("Saved checkpoint ...", "Exporting PLY ...").
+# Whole words only: "applying densification" or "multiply" must not count as a save.
+_SAVE_VERB = r"\b(?:sav(?:e|ed|ing)|export(?:s|ed|ing)?|writ(?:e|es|ing|ten)|wrote)\b"
+_SAVE_TARGET = r"(?:\bcheckpoints?\b|\bckpt\b|\.pt\b|\.ply\b|\bply\b)"
+CHECKPOINT_RE = re.compile(f"{_SAVE_VERB}.*{_SAVE_TARGET}|{_SAVE_TARGET}.*{_SAVE_VERB}", re.IGNORECASE)
+
+
+@dataclass
+class PlateauDetector:
+    """Detects when a metric stops improving over a window of steps."""
+    metric: str = "loss"
+    mode: str = "min"           # "min" for losses, "max" for PSNR/SSIM
+    window: int = 5000          # steps per comparison window
+    tolerance: float = 0.005    # minimum relative improvement between windows
+    min_step: int = 0           # never report a plateau before this step
+    steps: list[int] = field(default_factory=list)
+    values: list[float] = field(default_factory=list)
+    _sums: list[float] = field(default_factory=lambda: [0.0])
+    _last_check: int = 0
+
+    def __post_init__(self) -> None:
+        if self.mode not in ("min", "max"):
+            raise ValueError(f"mode must be 'min' or 'max', not {self.mode!r}")
+
+    def _mean(self, lo_step: int, hi_step: int) -> float | None:
+        lo, hi = bisect_left(self.steps, lo_step), bisect_left(self.steps, hi_step)
+        return (self._sums[hi] - self._sums[lo]) / (hi - lo) if hi > lo else None
+
+    def update(self, step: int, value: float) -> bool:
+        """Add a sample; True when the metric has plateaued at this step."""
+        if self.steps and step < self.steps[-1]:
+            return False  # out-of-order sample (e.g. a restarted progress bar)
+        self.steps.append(step)
+        self.values.append(value)
+        self._sums.append(self._sums[-1] + value)
+        # Compare at most ten times per window; a plateau needs two full windows.
+        if step < max(self.min_step, 2 * self.window) or step - self._last_check < self.window // 10:
+            return False
+        self._last_check = step
+        current = self._mean(step - self.window, step + 1)
+        previous = self._mean(step - 2 * self.window, step - self.window)
+        if current is None or previous is None:
+            return False
+        gain = previous - current if self.mode == "min" else current - previous
+        return gain < self.tolerance * max(abs(previous), 1e-12)
+
+
+@dataclass
+class EarlyStopper:
+    """Decides from the training output when the trainer can be stopped."""
+    detector: PlateauDetector
+    plateau_step: int | None = None
+    checkpoint_step: int | None = None
+    stop_step: int | None = None
+    step: int | None = None     # last step seen in the output
+
+    def observe(self, line: str, samples: list[tuple[int | None, str, float]]) -> bool:
+        """Feed one output line and its parsed samples. True once the trainer should be stopped."""
+        if self.stop_step is not None:
+            return False
+        for step, name, value in samples:
+            self.step = step if step is not None else self.step
+            if self.plateau_step is None and step is not None and name == self.detector.metric:
+                if self.detector.update(step, value):
+                    self.plateau_step = step
+                    print(f"\n[INFO] {self.detector.metric} plateaued at step {step} "
+                          f"(< {self.detector.tolerance:.2%} change over {self.detector.window} steps); "
+                          "stopping after the next checkpoint")
+        if self.plateau_step is None:
+            return False
+        if self.checkpoint_step is None:
+            if CHECKPOINT_RE.search(line):
+                self.checkpoint_step = self.step
+            return False
+        # Training output after the checkpoint line means the save has finished.
+        progress = [step for step, name, _ in samples if name == "it_s" and step is not None]
+        if progress:
+            self.stop_step = progress[-1]
+            return True
+        return False
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Local job queue for SfM and training sweeps.
+
+A sweep file (TOML) declares a parameter matrix and job templates:
+
+    [vars]
+    root = "/home/pc-04/Research/_datasets"
+
+    [matrix]
+    dataset = ["YJP-Lvl04_SonyA7Mk4_250828-00"]
+    variant = ["FullSet_QuarterRes"]
+    matcher = ["sequential", "exhaustive"]
+    iterations = [30000, 100000]
+
+    [jobs.sfm]
+    gpu = true
+    command = ["{python}", "colmap_sfm_pinhole.py"]
+    env = { IMAGE_DIR = "{root}/{dataset}/images/{variant}", MATCHER = "{matcher}",
+            RUN_DIR = "{root}/{dataset}/colmap_runs/{variant}_{matcher}" }
+
+    [jobs.train]
+    gpu = true
+    after = ["sfm"]
+    command = ["{python}", "run_3dgrut_train.py", "--iterations", "{iterations}",
+               "--run", "{root}/{dataset}/colmap_runs/{variant}_{matcher}"]
+
+Each template is expanded over the matrix axes it references (and those of
+the jobs it comes after): sfm runs once per dataset/variant/matcher, train
+once per sfm job and iteration count, after the sfm job with the same values.
+Jobs can also set `cpus` (default 1) and `cwd` (default: this directory);
+`{python}` and `{repo}` are always defined.
+
+The runner starts GPU jobs one at a time (--gpus) and CPU jobs in parallel
+within a core budget (--cpus, GPU jobs count too). The queue lives in a JSON
+state file (EXPERIMENT_QUEUE, default <dataset root>/experiment_queue.json),
+updated after every transition, so an interrupted runner resumes where it
+stopped: finished jobs are kept, interrupted ones run again. Job output goes to
+<state>_logs/<job>.log.
+
+    python experiment_queue.py add sweep.toml
+    python experiment_queue.py run --cpus 16
+    python experiment_queue.py status
+    python experiment_queue.py retry
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from string import Formatter
+from typing import IO, Iterator
+import argparse
+import fcntl
+import itertools
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import tomllib
+
+GPU_SLOTS: int = 1
+POLL_INTERVAL_S: float = 0.2
+STOP_TIMEOUT_S: float = 30.0
+STATUSES: tuple[str, ...] = ("pending", "running", "done", "failed", "skipped")
+
+
+@dataclass
+class Job:
+    id: str
+    template: str
+    params: dict[str, object]
+    command: list[str]
+    env: dict[str, str] = field(default_factory=dict)
+    cwd: str | None = None
+    gpu: bool = False
+    cpus: int = 1
+    after: list[str] = field(default_factory=list)
+    status: str = "pending"
+    returncode: int | None = None
+    started: str | None = None
+    finished: str | None = None
+    attempts: int = 0
+
+
+def _fields(value: object) -> set[str]:
+    """Placeholder names used in a string, or in the strings of a list/dict."""
+    if isinstance(value, str):
+        return {name.split(".")[0].split("[")[0] for _, name, _, _ in Formatter().parse(value) if name}
+    if isinstance(value, dict):
+        return set().union(*(_fields(v) for v in value.values()))
+    if isinstance(value, list):
+        return set().union(*(_fields(v) for v in value))
+    return set()
+
+
+def _expand(value: object, context: dict[str, object]) -> object:
+    if isinstance(value, str):
+        return value.format_map(context)
+    if isinstance(value, dict):
+        return {key: str(_expand(v, context)) for key, v in value.items()}
+    if isinstance(value, list):
+        return [str(_expand(v, context)) for v in value]
+    return value
+
+
+def _template_order(templates: dict[str, dict]) -> list[str]:
+    """Template names with every template after the ones it depends on."""
+    order: list[str] = []
+    visiting: set[str] = set()
+
+    def visit(name: str) -> None:
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through job '{name}'")
+        if name not in templates:
+            raise ValueError(f"Unknown job '{name}' in 'after'")
+        visiting.add(name)
+        for dep in templates[name].get("after", []):
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in templates:
+        visit(name)
+    return order
+
+
+def expand_sweep(spec: dict) -> list[Job]:
+    """Jobs of a parsed sweep file, dependencies first."""
+    matrix: dict[str, list] = spec.get("matrix", {})
+    variables = {"python": sys.executable, "repo": str(Path(__file__).resolve().parent), **spec.get("vars", {})}
+    templates: dict[str, dict] = spec.get("jobs", {})
+    if not templates:
+        raise ValueError("Sweep defines no [jobs.<name>] tables")
+
+    jobs: list[Job] = []
+    axes_of: dict[str, list[str]] = {}
+    by_template: dict[str, list[Job]] = {}
+    for name in _template_order(templates):
+        template = templates[name]
+        if "command" not in template:
+            raise ValueError(f"Job '{name}' has no command")
+        referenced = _fields([template["command"], template.get("env", {}), template.get("cwd", "")])
+        unknown = referenced - set(matrix) - set(variables)
+        if unknown:
+            raise ValueError(f"Job '{name}' uses undefined placeholders: {', '.join(sorted(unknown))}")
+        inherited = {axis for dep in template.get("after", []) for axis in axes_of[dep]}
+        axes = axes_of[name] = [axis for axis in matrix if axis in referenced or axis in inherited]
+
+        by_template[name] = []
+        for values in itertools.product(*(matrix[axis] for axis in axes)):
+            params = dict(zip(axes, values))
+            context = {**variables, **params}
+            job_id = name + ("[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]" if params else "")
+            after = [dep_job.id for dep in template.get("after", []) for dep_job in by_template[dep]
+                     if all(params[k] == v for k, v in dep_job.params.items())]
+            job = Job(
+                id=job_id,
+                template=name,
+                params=params,
+                command=_expand(template["command"], context),
+                env=_expand(template.get("env", {}), context),
+                cwd=_expand(template.get("cwd", "{repo}"), context),
+                gpu=bool(template.get("gpu", False)),
+                cpus=int(template.get("cpus", 1)),
+                after=after,
+            )
+            by_template[name].append(job)
+            jobs.append(job)
+    return jobs
+
+
+def load_sweep(path: Path) -> list[Job]:
+    with open(path, "rb") as f:
+        return expand_sweep(tomllib.load(f))
+
+
+def queue_state_path() -> Path:
+    """EXPERIMENT_QUEUE, or experiment_queue.json in the config.py dataset root."""
+    if os.environ.get("EXPERIMENT_QUEUE"):
+        return Path(os.environ["EXPERIMENT_QUEUE"]).expanduser()
+    import config
+    return Path(config.DATASET_ROOT) / "experiment_queue.json"
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class ExperimentQueue:
+    """Jobs persisted in a JSON state file, and the runner that works through them."""
+
+    def __init__(self, state_path: Path):
+        self.state_path = state_path
+        self.log_dir = state_path.with_name(state_path.stem + "_logs")
+        self._lock_path = state_path.with_name(state_path.name + ".lock")
+
+    def _load(self) -> dict[str, Job]:
+        if not self.state_path.is_file():
+            return {}
+        with open(self.state_path) as f:
+            return {record["id"]: Job(**record) for record in json.load(f)["jobs"]}
+
+    def _save(self, jobs: dict[str, Job]) -> None:
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"jobs": [asdict(job) for job in jobs.values()]}, f, indent=1)
+        os.replace(tmp, self.state_path)
+
+    @contextmanager
+    def _locked(self) -> Iterator[dict[str, Job]]:
+        """Jobs read under the state lock; written back when the block completes."""
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            jobs = self._load()
+            yield jobs
+            self._save(jobs)
+
+    def jobs(self) -> list[Job]:
+        with self._locked() as jobs:
+            return list(jobs.values())
+
+    def add(self, new_jobs: list[Job]) -> int:
+        """Queue jobs not queued yet (by id); returns how many were added."""
+        with self._locked() as jobs:
+            added = [job for job in new_jobs if job.id not in jobs]
+            jobs.update((job.id, job) for job in added)
+        return len(added)
+
+    def retry(self, statuses: tuple[str, ...] = ("failed", "skipped")) -> int:
+        with self._locked() as jobs:
+            retried = [job for job in jobs.values() if job.status in statuses]
+            for job in retried:
+                job.status, job.returncode = "pending", None
+        return len(retried)
+
+    def log_path(self, job: Job) -> Path:
+        return self.log_dir / (re.sub(r"[^\w.=,-]+", "_", job.id) + ".log")
+
+    def _start(self, job: Job) -> tuple[subprocess.Popen, IO] | None:
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        log = open(self.log_path(job), "a")
+        log.write(f"===== {_now()} attempt {job.attempts + 1}: {' '.join(job.command)}\n")
+        log.flush()
+        try:
+            process = subprocess.Popen(job.command, cwd=job.cwd, env={**os.environ, **job.env},
+                                       stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                       start_new_session=True)
+        except OSError as exc:
+            log.write(f"[ERROR] Could not start: {exc}\n")
+            log.close()
+            return None
+        return process, log
+
+    def run(self, cpus: int | None = None, gpus: int = GPU_SLOTS) -> dict[str, int]:
+        """Run queued jobs until none can start. Returns the number of jobs per status."""
+        cpus = cpus or os.cpu_count() or 1
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        runner_lock = open(self.state_path.with_name(self.state_path.name + ".runner"), "a")
+        try:
+            fcntl.flock(runner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            runner_lock.close()
+            raise RuntimeError(f"Another runner is working on {self.state_path}")
+
+        running: dict[str, tuple[subprocess.Popen, IO, float]] = {}
+        try:
+            with self._locked() as jobs:
+                for job in jobs.values():
+                    if job.status == "running":  # left behind by an interrupted runner
+                        job.status = "pending"
+            while True:
+                finished = {job_id: entry for job_id, entry in running.items() if entry[0].poll() is not None}
+                with self._locked() as jobs:
+                    for job_id, (process, log, started) in finished.items():
+                        log.close()
+                        del running[job_id]
+                        job = jobs[job_id]
+                        job.returncode, job.finished = process.returncode, _now()
+                        job.status = "done" if process.returncode == 0 else "failed"
+                        if job.status == "done":
+                            print(f"[INFO] Done {job_id} in {time.monotonic() - started:.1f} s")
+                        else:
+                            print(f"[WARN] {job_id} failed with exit code {process.returncode} "
+                                  f"(see {self.log_path(job)})")
+                    self._skip_blocked(jobs)
+
+                    free_cpus = cpus - sum(min(jobs[job_id].cpus, cpus) for job_id in running)
+                    free_gpus = gpus - sum(jobs[job_id].gpu for job_id in running)
+                    for job in jobs.values():
+                        if job.status != "pending" or any(jobs[dep].status != "done" for dep in job.after):
+                            continue
+                        need = min(job.cpus, cpus)
+                        if need > free_cpus or (job.gpu and free_gpus < 1):
+                            continue
+                        job.attempts += 1
+                        job.started, job.finished, job.returncode = _now(), None, None
+                        started = self._start(job)
+                        if started is None:
+                            job.status, job.returncode, job.finished = "failed", -1, _now()
+                            print(f"[WARN] {job.id} could not be started (see {self.log_path(job)})")
+                            continue
+                        job.status = "running"
+                        running[job.id] = (*started, time.monotonic())
+                        free_cpus -= need
+                        free_gpus -= job.gpu
+                        print(f"[INFO] Started {job.id} ({'GPU, ' if job.gpu else ''}{need} CPU)")
+                    self._skip_blocked(jobs)
+                    if not running:
+                        return {status: sum(job.status == status for job in jobs.values()) for status in STATUSES}
+                time.sleep(POLL_INTERVAL_S)
+        except KeyboardInterrupt:
+            print("\n[WARN] Interrupted; stopping running jobs (they run again on the next start)")
+            raise
+        finally:
+            for process, log, _ in running.values():
+                try:
+                    os.killpg(process.pid, signal.SIGINT)
+                    process.wait(timeout=STOP_TIMEOUT_S)
+                except ProcessLookupError:
+                    pass
+                except subprocess.TimeoutExpired:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    process.wait()
+                log.close()
+            if running:
+                with self._locked() as jobs:
+                    for job_id in running:
+                        jobs[job_id].status = "pending"
+            runner_lock.close()
+
+    @staticmethod
+    def _skip_blocked(jobs: dict[str, Job]) -> None:
+        """Mark pending jobs whose dependencies failed (or were skipped) as skipped."""
+        for job in jobs.values():  # dependencies come first, so one pass propagates
+            if job.status == "pending" and any(jobs[dep].status in ("failed", "skipped") for dep in job.after):
+                job.status = "skipped"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Queue and run SfM / training sweeps")
+    parser.add_argument("--state", type=Path,
+                        help="Queue state file (default: EXPERIMENT_QUEUE or <dataset root>/experiment_queue.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="Queue the jobs of a sweep file")
+    add.add_argument("sweep", type=Path, help="Sweep TOML file")
+    run = sub.add_parser("run", help="Run queued jobs")
+    run.add_argument("--cpus", type=int, help="Core budget for concurrent jobs (default: all cores)")
+    run.add_argument("--gpus", type=int, default=GPU_SLOTS, help=f"Concurrent GPU jobs (default: {GPU_SLOTS})")
+    sub.add_parser("status", help="Show queued jobs")
+    sub.add_parser("retry", help="Queue failed and skipped jobs again")
+    args = parser.parse_args()
+
+    queue = ExperimentQueue(args.state or queue_state_path())
+    if args.command == "add":
+        try:
+            jobs = load_sweep(args.sweep)
+        except (OSError, tomllib.TOMLDecodeError, ValueError, KeyError) as exc:
+            print(f"[ERROR] Invalid sweep {args.sweep}: {exc}", file=sys.stderr)
+            return 1
+        added = queue.add(jobs)
+        print(f"[INFO] Queued {added} new jobs ({len(jobs) - added} already queued) in {queue.state_path}")
+    elif args.command == "run":
+        try:
+            counts = queue.run(cpus=args.cpus, gpus=args.gpus)
+        except RuntimeError as exc:
+            print(f"[ERROR] {exc}", file=sys.stderr)
+            return 1
+        print("[INFO] " + ", ".join(f"{count} {status}" for status, count in counts.items() if count))
+        return 1 if counts["failed"] or counts["skipped"] else 0
+    elif args.command == "status":
+        for job in queue.jobs():
+            code = "" if job.returncode is None else f"  exit {job.returncode}"
+            print(f"{job.status:<8} {job.id}{code}")
+    else:
+        print(f"[INFO] {queue.retry()} jobs queued again")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
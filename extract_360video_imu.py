@@ -7,21 +7,22 @@ for analysis while using time-based frame extraction.
 """
 
 import argparse
+import asyncio
 import json
 import subprocess
 import sys
 import shutil
 import re
 from pathlib import Path
-from tqdm import tqdm
 import math
 from typing import List, Optional
 
-from config import DATASET_PATH
-from imu_extractor import IMUExtractor
+from async_runner import ProgressDisplay, run_process
+from config import DATASET_NAME, DATASET_PATH
+from telemetry import RunLog
 
-def _resolve_default_input() -> Path:
-    VIDEO_DIR = DATASET_PATH / "_source" / "original"
+def _resolve_default_input() -> Optional[Path]:
+    """First video of the dataset's _source/original, resolved when main() runs rather than at import."""
     # Pick the first .mp4 file in the directory as the default input
     # Prefer .mp4 files for frame extraction, .insv files for IMU data
     mp4_files = sorted(VIDEO_DIR.glob("*.mp4"))
@@ -32,16 +33,12 @@ def _resolve_default_input() -> Path:
     insv_files = sorted(VIDEO_DIR.glob("*.insv")) + sorted(VIDEO_DIR.glob("*.INSV"))
     if insv_files:
         return insv_files[0]
-    
-    print(f"Error: video not found. No .mp4 or .insv file in: {VIDEO_DIR}", file=sys.stderr)
-    sys.exit(1)
+    return None
 
 VIDEO_DIR: Path = DATASET_PATH / "_source" / "original"
 EXTRACTED_DIR: Path = DATASET_PATH / "_source" / "extracted"
 SYMLINK_DIR: Path = DATASET_PATH / "_source" / "colmap_images"
 
-DEFAULT_INPUT = _resolve_default_input()
-
 def label_for_track(track_index: int) -> str:
     if track_index == 0:
         return "front"
@@ -49,9 +46,6 @@ def label_for_track(track_index: int) -> str:
         return "back"
     return f"track{track_index}"
 
-def run_command(command: list[str]) -> subprocess.CompletedProcess:
-    return subprocess.run(command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
 def ensure_tools_exist() -> None:
     for tool in ("ffprobe", "ffmpeg", "exiftool"):
         if not shutil.which(tool):
@@ -69,9 +63,12 @@ def create_or_update_symlink(link_path: Path, target_path: Path) -> None:
     if link_path.exists():
         print(f"Warning: {link_path} exists and is not a symlink; skipping symlink creation", file=sys.stderr)
         return
-    link_path.symlink_to(target_path)
+    try:
+        link_path.symlink_to(target_path)
+    except FileExistsError:  # created by a concurrent extraction of another track
+        pass
 
-def probe_video_stream_indices(input_path: Path) -> list[int]:
+async def probe_video_stream_indices(input_path: Path) -> list[int]:
     cmd = [
         "ffprobe", "-v", "error",
         "-select_streams", "v",
@@ -79,19 +76,19 @@ def probe_video_stream_indices(input_path: Path) -> list[int]:
         "-of", "json",
         str(input_path),
     ]
-    result = run_command(cmd)
+    result = await run_process(cmd)
     data = json.loads(result.stdout or "{}")
     streams = data.get("streams", [])
     return [int(s["index"]) for s in streams]
 
-def probe_duration_seconds(input_path: Path) -> float:
+async def probe_duration_seconds(input_path: Path) -> float:
     # Use container duration; for separate tracks in the same file this is fine
     cmd = [
         "ffprobe", "-v", "error",
         "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1", str(input_path),
     ]
-    result = run_command(cmd)
+    result = await run_process(cmd)
     try:
         return float((result.stdout or "0").strip())
     except ValueError:
@@ -110,10 +107,14 @@ def create_both_folder_with_symlinks(extracted_dir: Path, every_seconds: int) ->
             for image_file in track_dir.glob("*.jpg"):
                 symlink_name = both_dir / image_file.name
                 if not symlink_name.exists():
-                    symlink_name.symlink_to(image_file)
+                    try:
+                        symlink_name.symlink_to(image_file)
+                    except FileExistsError:  # another track's extraction running concurrently
+                        pass
 
-def extract_frames_for_track_time_based(input_path: Path, track_index: int, output_dir: Path, every_seconds: int) -> None:
-    """Time-based frame extraction."""
+async def extract_frames_for_track_time_based(input_path: Path, track_index: int, output_dir: Path,
+                                             every_seconds: int, display: ProgressDisplay) -> None:
+    """Time-based frame extraction; ffmpeg's frame counter drives the track's progress bar."""
     output_dir.mkdir(parents=True, exist_ok=True)
     label = label_for_track(track_index)
     output_pattern = str(output_dir / f"frame_%06d_{label}.jpg")
@@ -125,37 +126,7 @@ def extract_frames_for_track_time_based(input_path: Path, track_index: int, outp
         "-q:v", "2",
         output_pattern,
     ]
-
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
-        universal_newlines=True,
-    )
-
-    # Estimate total frames given 1 frame every `every_seconds`
-    duration_s = probe_duration_seconds(input_path)
-    total_frames = int(math.ceil(duration_s / every_seconds)) if duration_s > 0 else None
-    progress_bar = tqdm(total=total_frames, unit="frame", desc=label_for_track(track_index), dynamic_ncols=True)
-    frame_regex = re.compile(r"frame=\s*(\d+)")
-    last_count = 0
-    try:
-        assert process.stderr is not None
-        for line in process.stderr:
-            match = frame_regex.search(line)
-            if match:
-                current = int(match.group(1))
-                delta = max(0, current - last_count)
-                if delta:
-                    progress_bar.update(delta)
-                    last_count = current
-        process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(process.returncode, cmd)
-    finally:
-        progress_bar.close()
+    await run_process(cmd, label=label, display=display, progress=re.compile(r"frame=\s*(\d+)"))
 
 def find_insv_file_for_mp4(mp4_path: Path) -> Optional[Path]:
     """Find the corresponding .insv file for a given .mp4 file."""
@@ -183,6 +154,7 @@ def extract_imu_data_for_analysis(input_path: Path) -> bool:
     # Try to find corresponding .insv file for IMU data
     insv_path = find_insv_file_for_mp4(input_path)
     
+    from imu_extractor import IMUExtractor  # pulls in numpy; only needed when IMU data is extracted
     if insv_path:
         print(f"Found corresponding .insv file: {insv_path}")
         print(f"Extracting IMU data from {insv_path} for analysis...")
@@ -218,59 +190,107 @@ def extract_imu_data_for_analysis(input_path: Path) -> bool:
     print(f"IMU analysis data saved to {imu_dir}")
     return True
 
+async def extract_all(input_path: Path, every_seconds: int, tracks: str, extract_imu: bool, info: dict) -> int:
+    """IMU extraction, stream probing and per-track frame extraction, overlapped."""
+    # IMUExtractor is synchronous (exiftool via subprocess.run); it runs in a worker thread
+    # and, sharing our process group, receives a terminal Ctrl-C directly.
+    imu_task = asyncio.create_task(asyncio.to_thread(extract_imu_data_for_analysis, input_path)) if extract_imu \
+        else None
+    if imu_task is None:
+        print("Skipping IMU data extraction")
+    try:
+        if tracks == "none":
+            print("Skipping frame extraction")
+            return 0
+        track_indices, duration_s = await asyncio.gather(probe_video_stream_indices(input_path),
+                                                         probe_duration_seconds(input_path))
+        if not track_indices:
+            print(f"No video streams found in: {input_path}", file=sys.stderr)
+            return 1
+        print(f"Found {len(track_indices)} video stream(s).")
+        if tracks != "all":
+            requested = [int(t) for t in tracks.split(",") if t.strip()]
+            missing = [t for t in requested if t not in track_indices]
+            if missing:
+                print(f"Error: no video track {missing[0]} in {input_path}", file=sys.stderr)
+                return 1
+            track_indices = requested
+        print(f"Using time-based extraction: 1 frame every {every_seconds}s")
+
+        # Estimate total frames given 1 frame every `every_seconds`
+        total_frames = int(math.ceil(duration_s / every_seconds)) if duration_s > 0 else None
+        every_dir = EXTRACTED_DIR / f"every_{every_seconds}"
+        with ProgressDisplay() as display:
+            # A TaskGroup cancels (and so stops) the other tracks' ffmpeg if one fails.
+            try:
+                async with asyncio.TaskGroup() as group:
+                    for idx in track_indices:
+                        label = label_for_track(idx)
+                        display.write(f"  -> Extracting 1 frame every {every_seconds}s to {every_dir / label}")
+                        display.add(label, total_frames, unit="frame")
+                        group.create_task(extract_frames_for_track_time_based(input_path, idx, every_dir / label,
+                                                                              every_seconds, display))
+            except ExceptionGroup as errors:
+                raise errors.exceptions[0] from None  # report the first failing track
+        info["tracks"] = [label_for_track(idx) for idx in track_indices]
+
+        # Create the 'both' folder with symlinks
+        create_both_folder_with_symlinks(EXTRACTED_DIR, every_seconds)
+        return 0
+    finally:
+        if imu_task is not None:
+            info["imu_extracted"] = await imu_task
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description="Extract frames for each video track using time-based sampling with optional IMU data analysis"
     )
-    parser.add_argument("input", nargs="?", type=Path, default=DEFAULT_INPUT, help="Path to input video")
+    parser.add_argument("input", nargs="?", type=Path,
+                        help="Path to input video (default: first .mp4/.insv in the dataset's _source/original)")
     
     # Extraction parameters
     parser.add_argument("--every-seconds", dest="every_seconds", type=int, default=5,
                        help="Extract one frame every N seconds (default: 5)")
     parser.add_argument("--extract-imu", action="store_true", default=True,
                        help="Extract IMU data for analysis (default: True)")
+    parser.add_argument("--no-imu", dest="extract_imu", action="store_false",
+                       help="Skip IMU data extraction")
+    parser.add_argument("--tracks", default="all",
+                       help="Comma-separated video track indices to extract, 'all' or 'none' (default: all)")
     
     args = parser.parse_args()
 
-    input_path: Path = args.input
+    input_path: Optional[Path] = args.input or _resolve_default_input()
+    if input_path is None:
+        print(f"Error: video not found. No .mp4 or .insv file in: {VIDEO_DIR}", file=sys.stderr)
+        return 1
     if not input_path.is_file():
         print(f"Error: input file not found: {input_path}", file=sys.stderr)
         return 1
 
     ensure_tools_exist()
-
-    # Extract IMU data for analysis if requested
-    if args.extract_imu:
-        print("Extracting IMU data for analysis...")
-        extract_imu_data_for_analysis(input_path)
-    else:
-        print("Skipping IMU data extraction")
+    # Wall/CPU time, peak RSS and I/O of the extraction go to run_log.jsonl (RUN_LOG)
+    log = RunLog("extract_360video_imu", dataset=DATASET_NAME, input=input_path, every_seconds=args.every_seconds)
 
     # Ensure output DIR exists and symlink is set to it
     EXTRACTED_DIR.mkdir(parents=True, exist_ok=True)
     create_or_update_symlink(SYMLINK_DIR, EXTRACTED_DIR)
 
-    track_indices = probe_video_stream_indices(input_path)
-    if not track_indices:
-        print(f"No video streams found in: {input_path}", file=sys.stderr)
+    # IMU, probing and all tracks run concurrently, so they share one stage record.
+    try:
+        with log.stage("extract", imu=args.extract_imu) as info:
+            returncode = asyncio.run(extract_all(input_path, args.every_seconds, args.tracks, args.extract_imu, info))
+            if returncode != 0:
+                info["status"] = "failed"
+    except KeyboardInterrupt:
+        print("Interrupted; all extraction processes were stopped", file=sys.stderr)
+        return 130
+    except subprocess.CalledProcessError as exc:
+        print(f"Error: {exc.cmd[0]} exited with code {exc.returncode}:\n{exc.stderr}", file=sys.stderr)
         return 1
-
-    print(f"Found {len(track_indices)} video stream(s).")
-    print(f"Using time-based extraction: 1 frame every {args.every_seconds}s")
-    
-    # Extract frames for each track
-    for idx in track_indices:
-        label = label_for_track(idx)
-        every_dir = EXTRACTED_DIR / f"every_{args.every_seconds}"
-        frames_dir = every_dir / label
-        print(f"  -> Extracting 1 frame every {args.every_seconds}s to {frames_dir}")
-        extract_frames_for_track_time_based(input_path, idx, frames_dir, args.every_seconds)
-
-    # Create the 'both' folder with symlinks
-    create_both_folder_with_symlinks(EXTRACTED_DIR, args.every_seconds)
-
-    print(f"Done. Output files are in: {EXTRACTED_DIR}")
-    return 0
+    if returncode == 0:
+        print(f"Done. Output files are in: {EXTRACTED_DIR}")
+    return returncode
 
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of COLMAP SIFT features, shared across runs.
+
+Subset, matcher, mask and oddset/fullset experiments re-run SfM on the same
+images, and every run used to extract the same features again. Cache entries
+are keyed by a hash of the image bytes (and of its mask), the
+feature_extractor options that change the features, and the COLMAP version.
+Cached images are inserted straight into a run's database.db (camera, image,
+keypoints and descriptors rows); feature_extractor only runs for the misses,
+whose rows are then added to the cache.
+
+File hashes are memoised by (device, inode, size, mtime), so hardlinked
+staged images are hashed once for all runs.
+
+The cache is capped at FEATURE_CACHE_MAX_GB (default 20 GB of features):
+each store evicts the least recently used entries beyond the cap. Deleting
+the cache directory clears it.
+
+    python feature_cache.py                      # entries and size
+    python feature_cache.py --max-age-days 90    # drop entries unused for 90 days
+    python feature_cache.py --max-gb 5           # evict least recently used entries beyond 5 GB
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from colmap_database import add_camera_frame, list_tables, table_columns
+
+DEFAULT_CACHE_DIR: Path = Path.home() / ".cache" / "colmap_features"
+DEFAULT_MAX_GB: float = 20.0
+# feature_extractor flags that do not change the features (masks are hashed by content instead).
+NON_FEATURE_OPTIONS: frozenset[str] = frozenset({
+    "--database_path", "--image_path", "--image_list_path",
+    "--ImageReader.mask_path", "--ImageReader.single_camera", "--ImageReader.single_camera_per_folder",
+    "--ImageReader.existing_camera_id", "--SiftExtraction.gpu_index", "--SiftExtraction.num_threads",
+})
+HASH_WORKERS: int = min(16, os.cpu_count() or 1)
+_HASH_CHUNK_BYTES: int = 1 << 20
+_LOOKUP_BATCH: int = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_digests (
+    dev INTEGER NOT NULL, ino INTEGER NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL, PRIMARY KEY (dev, ino));
+CREATE TABLE IF NOT EXISTS features (
+    key TEXT PRIMARY KEY NOT NULL, camera TEXT NOT NULL, image TEXT NOT NULL,
+    keypoints_rows INTEGER NOT NULL, keypoints_cols INTEGER NOT NULL, keypoints BLOB,
+    descriptors_rows INTEGER NOT NULL, descriptors_cols INTEGER NOT NULL, descriptors BLOB,
+    used REAL NOT NULL);
+"""
+
+
+def colmap_version(colmap: str = "colmap") -> str:
+    """First line of `colmap help` (version and commit), or "unknown"."""
+    try:
+        out = subprocess.run([colmap, "help"], capture_output=True, text=True, timeout=60).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+    lines = [line.strip() for line in out.splitlines() if line.strip()]
+    return lines[0] if lines else "unknown"
+
+
+def option_value(options: list[str], flag: str) -> str | None:
+    return options[options.index(flag) + 1] if flag in options[:-1] else None
+
+
+def feature_options(extractor_options: list[str]) -> list[tuple[str, str]]:
+    """The (flag, value) pairs of extractor_options that affect the extracted features."""
+    pairs = zip(extractor_options[::2], extractor_options[1::2])
+    return sorted((flag, value) for flag, value in pairs if flag not in NON_FEATURE_OPTIONS)
+
+
+def camera_group(name: str, extractor_options: list[str]) -> str | None:
+    """Images of one group share a camera: all with single_camera, per folder with
+    single_camera_per_folder. None means the image gets its own camera."""
+    if option_value(extractor_options, "--ImageReader.single_camera") == "1":
+        return ""
+    if option_value(extractor_options, "--ImageReader.single_camera_per_folder") == "1":
+        return str(Path(name).parent)
+    return None
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_row(row: dict) -> str:
+    return json.dumps({k: {"b64": base64.b64encode(v).decode()} if isinstance(v, bytes) else v
+                       for k, v in row.items()})
+
+
+def _decode_row(text: str) -> dict:
+    return {k: base64.b64decode(v["b64"]) if isinstance(v, dict) else v for k, v in json.loads(text).items()}
+
+
+class FeatureCache:
+    """SQLite store of per-image feature rows under cache_dir/features.db."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, colmap: str = "colmap", max_bytes: int | None = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(cache_dir / "features.db", timeout=120)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # concurrent runs read while one writes
+        self.conn.executescript(_SCHEMA)
+        self.version = colmap_version(colmap)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def digests(self, paths: list[Path]) -> list[str]:
+        """Content hashes of files, reusing memoised hashes of unchanged files."""
+        stats = [p.stat() for p in paths]
+        result: list[str | None] = []
+        for st in stats:
+            row = self.conn.execute("SELECT size, mtime_ns, digest FROM file_digests WHERE dev = ? AND ino = ?",
+                                    (st.st_dev, st.st_ino)).fetchone()
+            result.append(row[2] if row and row[:2] == (st.st_size, st.st_mtime_ns) else None)
+        todo = [i for i, digest in enumerate(result) if digest is None]
+        if todo:
+            with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+                hashed = list(pool.map(hash_file, [paths[i] for i in todo]))
+            with self.conn:
+                for i, digest in zip(todo, hashed):
+                    st = stats[i]
+                    self.conn.execute("INSERT OR REPLACE INTO file_digests VALUES (?, ?, ?, ?, ?)",
+                                      (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, digest))
+                    result[i] = digest
+        return result  # type: ignore[return-value]
+
+    def keys(self, image_path: Path, names: list[str], extractor_options: list[str]) -> dict[str, str]:
+        """Cache key of every image: image and mask content, feature options, COLMAP version."""
+        mask_dir = option_value(extractor_options, "--ImageReader.mask_path")
+        masks = [Path(mask_dir) / f"{name}.png" if mask_dir else None for name in names]
+        masks = [m if m is not None and m.is_file() else None for m in masks]
+        image_digests = self.digests([image_path / name for name in names])
+        mask_paths = [m for m in masks if m is not None]
+        mask_digests = iter(self.digests(mask_paths))
+        settings = json.dumps([self.version, feature_options(extractor_options)])
+        keys = {}
+        for name, image_digest, mask in zip(names, image_digests, masks):
+            mask_digest = next(mask_digests) if mask is not None else ""
+            keys[name] = hashlib.sha256(f"{settings}\n{image_digest}\n{mask_digest}".encode()).hexdigest()
+        return keys
+
+    def cached(self, keys: list[str]) -> set[str]:
+        """The subset of keys with a cache entry."""
+        found: set[str] = set()
+        for start in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[start:start + _LOOKUP_BATCH]
+            placeholders = ", ".join("?" for _ in batch)
+            found.update(row[0] for row in
+                         self.conn.execute(f"SELECT key FROM features WHERE key IN ({placeholders})", batch))
+        return found
+
+    def store(self, db_path: Path, keys: dict[str, str]) -> int:
+        """Add the features of the named images found in a run database. Returns the number stored."""
+        src = sqlite3.connect(db_path)
+        try:
+            camera_cols = [c for c in table_columns(src, "cameras") if c != "camera_id"]
+            image_cols = [c for c in table_columns(src, "images") if c not in ("image_id", "camera_id")]
+            cameras = {row[0]: dict(zip(camera_cols, row[1:])) for row in
+                       src.execute(f"SELECT camera_id, {', '.join(camera_cols)} FROM cameras")}
+            entries = []
+            for row in src.execute(f"SELECT image_id, camera_id, {', '.join(image_cols)} FROM images"):
+                image = dict(zip(image_cols, row[2:]))
+                key = keys.get(image["name"])
+                if key is None:
+                    continue
+                image.pop("name")
+                kp = src.execute("SELECT rows, cols, data FROM keypoints WHERE image_id = ?", (row[0],)).fetchone()
+                desc = src.execute("SELECT rows, cols, data FROM descriptors WHERE image_id = ?",
+                                   (row[0],)).fetchone()
+                if kp is None or desc is None:
+                    continue
+                entries.append((key, _encode_row(cameras[row[1]]), _encode_row(image), *kp, *desc, time.time()))
+        finally:
+            src.close()
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", entries)
+        if self.max_bytes is not None:
+            evicted = self.evict(self.max_bytes)
+            if evicted:
+                print(f"[INFO] Evicted {evicted} least recently used feature cache entries "
+                      f"(cap {self.max_bytes / 1e9:g} GB)")
+        return len(entries)
+
+    def restore(self, db_path: Path, names: list[str], keys: dict[str, str], extractor_options: list[str]) -> int:
+        """Insert cached features of the named images into a run database. Returns the number inserted.
+
+        Cameras are shared the way feature_extractor shares them (see camera_group), or all
+        images go to --ImageReader.existing_camera_id when that is given. On the COLMAP >= 3.12
+        schema every image also gets its single-camera rig and frame, or the mapper skips it.
+        """
+        conn = sqlite3.connect(db_path)
+        try:
+            camera_cols = set(table_columns(conn, "cameras")) - {"camera_id"}
+            image_cols = set(table_columns(conn, "images")) - {"image_id", "camera_id", "name"}
+            existing = dict(conn.execute("SELECT name, camera_id FROM images"))
+            has_frames = "frames" in list_tables(conn)
+            shared: dict[str, int] = {}
+            fixed_camera = option_value(extractor_options, "--ImageReader.existing_camera_id")
+            for name, camera_id in existing.items():
+                group = camera_group(name, extractor_options)
+                if group is not None:
+                    shared.setdefault(group, camera_id)
+
+            inserted = 0
+            with conn:
+                for name in names:
+                    if name in existing:
+                        continue
+                    row = self.conn.execute(
+                        "SELECT camera, image, keypoints_rows, keypoints_cols, keypoints, "
+                        "descriptors_rows, descriptors_cols, descriptors FROM features WHERE key = ?",
+                        (keys[name],)).fetchone()
+                    if row is None:
+                        continue
+                    group = camera_group(name, extractor_options)
+                    camera_id = shared.get(group) if group is not None else None
+                    if fixed_camera is not None:
+                        camera_id = int(fixed_camera)
+                    if camera_id is None:
+                        camera = {k: v for k, v in _decode_row(row[0]).items() if k in camera_cols}
+                        camera_id = conn.execute(
+                            f"INSERT INTO cameras ({', '.join(camera)}) VALUES ({', '.join('?' for _ in camera)})",
+                            list(camera.values())).lastrowid
+                        if group is not None:
+                            shared[group] = camera_id
+                    image = {"name": name, "camera_id": camera_id,
+                             **{k: v for k, v in _decode_row(row[1]).items() if k in image_cols}}
+                    image_id = conn.execute(
+                        f"INSERT INTO images ({', '.join(image)}) VALUES ({', '.join('?' for _ in image)})",
+                        list(image.values())).lastrowid
+                    conn.execute("INSERT INTO keypoints (image_id, rows, cols, data) VALUES (?, ?, ?, ?)",
+                                 (image_id, *row[2:5]))
+                    conn.execute("INSERT INTO descriptors (image_id, rows, cols, data) VALUES (?, ?, ?, ?)",
+                                 (image_id, *row[5:8]))
+                    if has_frames:
+                        add_camera_frame(conn, image_id, camera_id)
+                    inserted += 1
+        finally:
+            conn.close()
+        with self.conn:
+            self.conn.executemany("UPDATE features SET used = ? WHERE key = ?",
+                                  [(time.time(), keys[name]) for name in names])
+        return inserted
+
+    def size(self) -> int:
+        """Bytes of keypoints and descriptors held in the cache."""
+        total = self.conn.execute("SELECT SUM(LENGTH(keypoints) + LENGTH(descriptors)) FROM features").fetchone()[0]
+        return int(total or 0)
+
+    def evict(self, max_bytes: int) -> int:
+        """Drop the least recently used entries until the features fit in max_bytes. Returns the number dropped.
+
+        Freed pages are reused by later stores, so the file stops growing at
+        about the cap; prune() and `--max-gb` also VACUUM to shrink it.
+        """
+        total = 0
+        evict: list[str] = []
+        rows = self.conn.execute("SELECT key, LENGTH(keypoints) + LENGTH(descriptors) FROM features "
+                                 "ORDER BY used DESC")
+        for key, size in rows:
+            total += size or 0
+            if total > max_bytes:
+                evict.append(key)
+        with self.conn:
+            for start in range(0, len(evict), _LOOKUP_BATCH):
+                batch = evict[start:start + _LOOKUP_BATCH]
+                self.conn.execute(f"DELETE FROM features WHERE key IN ({', '.join('?' for _ in batch)})", batch)
+        return len(evict)
+
+    def prune(self, max_age_days: float) -> int:
+        """Drop entries not used for max_age_days. Returns the number dropped."""
+        with self.conn:
+            removed = self.conn.execute("DELETE FROM features WHERE used < ?",
+                                        (time.time() - max_age_days * 86400,)).rowcount
+        self.conn.execute("VACUUM")
+        return removed
+
+
+def cache_from_env() -> FeatureCache | None:
+    """The cache at FEATURE_CACHE (default DEFAULT_CACHE_DIR), or None with FEATURE_CACHE=0.
+
+    FEATURE_CACHE_MAX_GB caps its size (default DEFAULT_MAX_GB, 0 for no cap).
+    """
+    location = os.environ.get("FEATURE_CACHE", "")
+    if location == "0":
+        return None
+    max_gb = float(os.environ.get("FEATURE_CACHE_MAX_GB", DEFAULT_MAX_GB))
+    return FeatureCache(Path(location).expanduser() if location else DEFAULT_CACHE_DIR,
+                        max_bytes=int(max_gb * 1e9) if max_gb > 0 else None)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect or prune the COLMAP feature cache")
+    parser.add_argument("--cache-dir", help="Cache directory (default: FEATURE_CACHE or ~/.cache/colmap_features)")
+    parser.add_argument("--max-age-days", type=float, help="Drop entries not used for this many days")
+    parser.add_argument("--max-gb", type=float, help="Drop least recently used entries beyond this many GB")
+    args = parser.parse_args()
+
+    cache_dir = Path(args.cache_dir or os.environ.get("FEATURE_CACHE") or DEFAULT_CACHE_DIR).expanduser()
+    if not (cache_dir / "features.db").is_file():
+        print(f"[ERROR] No feature cache in {cache_dir}", file=sys.stderr)
+        return 1
+    cache = FeatureCache(cache_dir)
+    try:
+        if args.max_age_days is not None:
+            print(f"[INFO] Removed {cache.prune(args.max_age_days)} entries unused for {args.max_age_days:g} days")
+        if args.max_gb is not None:
+            removed = cache.evict(int(args.max_gb * 1e9))
+            cache.conn.execute("VACUUM")
+            print(f"[INFO] Removed {removed} least recently used entries beyond {args.max_gb:g} GB")
+        features_mb = cache.size() / 1e6
+        count = cache.conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    finally:
+        cache.close()
+    size_mb = (cache_dir / "features.db").stat().st_size / 1e6
+    print(f"[INFO] {cache_dir}: {count} images, {features_mb:.1f} MB of features, {size_mb:.1f} MB on disk")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
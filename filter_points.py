@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Clean and thin the sparse point cloud before 3DGRUT training.
+
+3DGRUT initialises one Gaussian per point of points3D.bin, so stray points
+and very dense clouds cost early training time and memory. This removes
+statistical outliers (mean distance to the k nearest neighbours more than
+--std-ratio standard deviations above average) and then voxel-downsamples
+to at most --target-points points, keeping in each voxel the point with the
+longest track. Nearest neighbours are searched exactly on a hashed voxel
+grid, in vectorised chunks (coarser grids only for points in sparse regions).
+
+The result is written as a sibling run, <run>__filtered, with hardlinked
+images, for run_3dgrut_train.py --run.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import argparse
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from colmap_model import read_model, select_points, write_model
+from image_staging import stage_images
+
+DEFAULT_NEIGHBOURS: int = 16
+DEFAULT_STD_RATIO: float = 2.0
+DEFAULT_TARGET_POINTS: int = 500_000
+# Candidate pairs evaluated per chunk of the kNN search (bounds memory).
+KNN_CHUNK_PAIRS: int = 4_000_000
+# Grid cells per axis are capped so packed cell keys fit in int64.
+_MAX_CELLS: int = 2**20
+_OFFSETS = np.array([(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)])
+
+
+class _Grid:
+    """Points hashed into cubic cells, sorted by cell for range lookups."""
+
+    def __init__(self, xyz: np.ndarray, cell: float):
+        cells = np.minimum(np.floor((xyz - xyz.min(axis=0)) / cell), _MAX_CELLS - 3).astype(np.int64) + 1
+        self.cell = cell
+        self.dims = cells.max(axis=0) + 2   # cells are >= 1, so every neighbour offset stays in range
+        self.keys = self.pack(cells)
+        self.order = np.argsort(self.keys, kind="stable")
+        self.cell_keys, self.starts, self.counts = np.unique(self.keys[self.order], return_index=True,
+                                                             return_counts=True)
+        self.deltas = self.pack(_OFFSETS) - self.pack(np.zeros((1, 3), dtype=np.int64))
+        self.rank = np.empty_like(self.order)
+        self.rank[self.order] = np.arange(len(self.order))
+        # Points in cell order: a cell's points are one contiguous, cache-friendly slice.
+        self.xyz = xyz[self.order].astype(np.float32)
+
+    def pack(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def occupancy(self, points: np.ndarray) -> np.ndarray:
+        """Number of points in the cell of each of the given points."""
+        return self.counts[np.searchsorted(self.cell_keys, self.keys[points])]
+
+
+def _cell_size(xyz: np.ndarray, k: int, sample: np.ndarray) -> float:
+    """Cell size putting about k/2 points in a point's cell.
+
+    SfM points lie on surfaces, where the k-th neighbour is then about 0.8
+    cells away, so the 27 cells around a point usually hold its k nearest.
+    """
+    target = max(2.0, k / 2)
+    extent = xyz.max(axis=0) - xyz.min(axis=0)
+    cell = float(np.linalg.norm(extent)) / np.sqrt(len(xyz) / target) or 1.0
+    for _ in range(8):
+        occupancy = float(np.median(_Grid(xyz, cell).occupancy(sample)))
+        if 0.7 * target <= occupancy <= 1.5 * target:
+            break
+        # Occupancy grows roughly with cell area on surfaces.
+        cell *= float(np.clip(np.sqrt(target / occupancy), 0.25, 4.0))
+    return cell
+
+
+def _knn_block(xyz: np.ndarray, grid: _Grid, query: np.ndarray, k: int) -> np.ndarray:
+    """Distances to the k nearest points in the 27 cells around each query, (m, k), inf-padded."""
+    slots, counts = [], []
+    for delta in grid.deltas:
+        neighbour = grid.keys[query] + delta
+        slot = np.minimum(np.searchsorted(grid.cell_keys, neighbour), len(grid.cell_keys) - 1)
+        slots.append(slot)
+        counts.append(np.where(grid.cell_keys[slot] == neighbour, grid.counts[slot], 0))
+    counts_arr = np.stack(counts, axis=1)
+    begins = np.cumsum(counts_arr, axis=1) - counts_arr
+    width = max(k + 1, int(counts_arr.sum(axis=1).max()))
+
+    # Candidates of query i go to row i of a padded matrix; no sorting needed.
+    dense = np.full((len(query), width), np.inf, dtype=np.float32)
+    rows_all = np.arange(len(query))
+    query_pos = grid.rank[query]
+    query_xyz = grid.xyz[query_pos]
+    for j, slot in enumerate(slots):
+        c = counts_arr[:, j]
+        if not c.any():
+            continue
+        within = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        cand = np.repeat(grid.starts[slot], c) + within
+        diff = grid.xyz[cand] - np.repeat(query_xyz, c, axis=0)
+        dist = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+        dist[cand == np.repeat(query_pos, c)] = np.inf
+        dense[np.repeat(rows_all, c), np.repeat(begins[:, j], c) + within] = dist
+    return np.partition(dense, k - 1, axis=1)[:, :k].astype(np.float64)
+
+
+def knn_mean_distance(xyz: np.ndarray, k: int = DEFAULT_NEIGHBOURS, max_levels: int = 4) -> np.ndarray:
+    """Mean distance of every point to its k nearest neighbours.
+
+    Each point is searched in the 27 grid cells around it, which is exact
+    whenever the k-th distance found is at most one cell. Points where it is
+    not (sparse regions, isolated points) are searched again on a grid 4x
+    coarser, up to max_levels grids.
+    """
+    n = len(xyz)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n, size=min(n, 50_000), replace=False)
+    cell = _cell_size(xyz, k, sample)
+    mean_dist = np.full(n, np.inf)
+    pending = np.arange(n)
+    for level in range(max_levels):
+        grid = _Grid(xyz, cell)
+        pending = pending[np.argsort(grid.rank[pending])]  # neighbouring queries share candidate cells
+        block = float(np.mean(grid.occupancy(pending[::max(1, len(pending) // 50_000)]))) * len(_OFFSETS)
+        chunk = int(max(256, KNN_CHUNK_PAIRS // max(1.0, block)))
+        unresolved = []
+        for start in range(0, len(pending), chunk):
+            query = pending[start:start + chunk]
+            nearest = _knn_block(xyz, grid, query, k)
+            kth = nearest.max(axis=1)
+            exact = kth <= cell
+            done = exact | (level == max_levels - 1)
+            finite = np.where(np.isfinite(nearest), nearest, 0.0)
+            found = np.isfinite(nearest).sum(axis=1)
+            mean_dist[query[done]] = (finite.sum(axis=1) / np.maximum(found, 1))[done]
+            unresolved.append(query[~done])
+        pending = np.concatenate(unresolved)
+        if not len(pending):
+            break
+        cell *= 4
+    return mean_dist
+
+
+def statistical_outliers(xyz: np.ndarray, k: int = DEFAULT_NEIGHBOURS,
+                         std_ratio: float = DEFAULT_STD_RATIO) -> np.ndarray:
+    """Boolean mask of points whose mean kNN distance is above mean + std_ratio * std."""
+    if len(xyz) <= k:
+        return np.zeros(len(xyz), dtype=bool)
+    mean_dist = knn_mean_distance(xyz, k)
+    return mean_dist > mean_dist.mean() + std_ratio * mean_dist.std()
+
+
+def _voxel_keys(xyz: np.ndarray, voxel: float) -> np.ndarray:
+    cells = np.floor((xyz - xyz.min(axis=0)) / voxel).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+    return (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+
+def voxel_representatives(xyz: np.ndarray, voxel: float, priority: np.ndarray) -> np.ndarray:
+    """Index of the highest-priority point in every occupied voxel."""
+    keys = _voxel_keys(xyz, voxel)
+    order = np.lexsort((-priority, keys))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = keys[order][1:] != keys[order][:-1]
+    return order[first]
+
+
+def voxel_downsample(xyz: np.ndarray, target: int, priority: np.ndarray) -> np.ndarray:
+    """Indices of at most `target` points: one per voxel, voxel size found by bisection."""
+    if len(xyz) <= target:
+        return np.arange(len(xyz))
+    extent = float(np.max(xyz.max(axis=0) - xyz.min(axis=0))) or 1.0
+    lo, hi = extent / 1e6, extent  # hi gives a single voxel
+    while hi / lo > 1.01:
+        mid = np.sqrt(lo * hi)
+        keys = np.sort(_voxel_keys(xyz, mid))
+        if 1 + np.count_nonzero(keys[1:] != keys[:-1]) <= target:
+            hi = mid
+        else:
+            lo = mid
+    return np.sort(voxel_representatives(xyz, hi, priority))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Remove outliers and voxel-downsample sparse/0 points")
+    parser.add_argument("--run-dir", help="COLMAP run directory (default: the config.py data variant)")
+    parser.add_argument("--neighbours", type=int, default=DEFAULT_NEIGHBOURS, help="k for the outlier test")
+    parser.add_argument("--std-ratio", type=float, default=DEFAULT_STD_RATIO,
+                        help="Outlier threshold in standard deviations of the mean kNN distance")
+    parser.add_argument("--target-points", type=int, default=DEFAULT_TARGET_POINTS,
+                        help="Maximum number of points after voxel downsampling")
+    parser.add_argument("--suffix", default="filtered", help="Output run is <run>__<suffix>")
+    args = parser.parse_args()
+
+    if args.run_dir:
+        run_dir = Path(args.run_dir).expanduser()
+    else:
+        import config
+        run_dir = config.DATASET_PATH / "colmap_runs" / config.DATA_VARIANT
+    model_dir = run_dir / "sparse" / "0"
+    if not (model_dir / "points3D.bin").is_file():
+        print(f"[ERROR] No sparse model in {model_dir}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    model = read_model(model_dir)
+    points = model.points3D
+    print(f"[INFO] Read {len(points):,} points in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    outliers = statistical_outliers(points.xyz, args.neighbours, args.std_ratio)
+    inliers = np.flatnonzero(~outliers)
+    print(f"[INFO] Outlier removal: {len(points):,} -> {len(inliers):,} points "
+          f"({outliers.sum():,} removed) in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    # Prefer well-observed, low-error points as voxel representatives.
+    priority = points.track_lengths[inliers] - points.errors[inliers] / (points.errors.max() + 1)
+    kept = inliers[voxel_downsample(points.xyz[inliers], args.target_points, priority)]
+    print(f"[INFO] Voxel downsampling: {len(inliers):,} -> {len(kept):,} points "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[kept] = True
+    out_run = run_dir.with_name(f"{run_dir.name}__{args.suffix}")
+    out_model = out_run / "sparse" / "0"
+    if out_model.exists():
+        shutil.rmtree(out_model)
+    write_model(select_points(model, keep), out_model)
+    stage_images(run_dir / "images", out_run / "images", names=model.images.names)
+    print(f"[INFO] Points: {len(points):,} -> {len(kept):,}. Wrote {out_model}")
+    print(f"[INFO] Train with: python run_3dgrut_train.py --run {out_run}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
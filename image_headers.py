@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Image dimensions from file headers, without decoding pixels.
+
+Reads only the first bytes of a PNG (IHDR) or scans JPEG markers up to the
+start-of-frame segment, so checking thousands of images costs a few small
+reads each instead of a full decode.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+import struct
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers (SOF0..SOF15 except DHT, JPG and DAC).
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def image_size(path: Path) -> tuple[int, int]:
+    """(width, height) of a JPEG or PNG file. Raises ValueError for other or corrupt files."""
+    with open(path, "rb") as f:
+        head = f.read(26)
+        if head.startswith(_PNG_SIGNATURE):
+            if head[12:16] != b"IHDR":
+                raise ValueError(f"Corrupt PNG header: {path}")
+            width, height = struct.unpack(">II", head[16:24])
+            return width, height
+        if not head.startswith(b"\xff\xd8"):
+            raise ValueError(f"Not a JPEG or PNG file: {path}")
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            while len(marker) == 2 and marker[0] == 0xFF and marker[1] == 0xFF:
+                marker = marker[1:] + f.read(1)  # fill bytes
+            if len(marker) < 2 or marker[0] != 0xFF:
+                raise ValueError(f"No JPEG frame header found: {path}")
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                raise ValueError(f"Truncated JPEG: {path}")
+            (length,) = struct.unpack(">H", length_bytes)
+            if marker[1] in _JPEG_SOF:
+                data = f.read(5)
+                if len(data) < 5:
+                    raise ValueError(f"Truncated JPEG: {path}")
+                height, width = struct.unpack(">HH", data[1:5])
+                return width, height
+            f.seek(length - 2, 1)
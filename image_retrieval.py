@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Global-descriptor image retrieval for pruning COLMAP match pairs.
+
+Each image is reduced to a small thumbnail and described by a colour
+histogram plus a spatial gradient-orientation histogram. Descriptors are
+rows of one NumPy matrix, so nearest neighbours come from batched matrix
+products instead of pairwise feature matching.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+
+import numpy as np
+
+THUMB_SIZE: int = 64
+# HSV colour histogram bins (hue, saturation, value).
+COLOR_BINS: tuple[int, int, int] = (8, 4, 4)
+# Gradient histogram: GRID x GRID cells, ORIENTATIONS bins each.
+GRID: int = 4
+ORIENTATIONS: int = 8
+CHUNK_SIZE: int = 2048
+DESCRIPTOR_DIM: int = int(np.prod(COLOR_BINS)) + GRID * GRID * ORIENTATIONS
+
+
+def load_thumbnail(path: Path) -> np.ndarray | None:
+    """Decode an image at reduced size and resize it to THUMB_SIZE x THUMB_SIZE."""
+    import cv2
+    # IMREAD_REDUCED_* lets libjpeg decode at 1/8 scale, skipping most of the work.
+    img = cv2.imread(str(path), cv2.IMREAD_REDUCED_COLOR_8)
+    if img is None:
+        img = cv2.imread(str(path), cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    return cv2.resize(img, (THUMB_SIZE, THUMB_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def describe_thumbnails(thumbs: np.ndarray) -> np.ndarray:
+    """Raw (unnormalised) histograms for a (n, THUMB_SIZE, THUMB_SIZE, 3) BGR batch."""
+    import cv2
+    n = thumbs.shape[0]
+    s = THUMB_SIZE
+    # One cvtColor call over the whole batch stacked as a tall image.
+    hsv = cv2.cvtColor(thumbs.reshape(n * s, s, 3), cv2.COLOR_BGR2HSV).reshape(n, s, s, 3)
+    h = np.minimum(hsv[..., 0].astype(np.int64) * COLOR_BINS[0] // 180, COLOR_BINS[0] - 1)
+    sat = hsv[..., 1].astype(np.int64) * COLOR_BINS[1] // 256
+    val = hsv[..., 2].astype(np.int64) * COLOR_BINS[2] // 256
+    color_bin = (h * COLOR_BINS[1] + sat) * COLOR_BINS[2] + val
+    num_color = int(np.prod(COLOR_BINS))
+    offsets = (np.arange(n) * num_color)[:, None, None]
+    color = np.bincount((color_bin + offsets).ravel(), minlength=n * num_color).reshape(n, num_color)
+
+    gray = thumbs.astype(np.float32) @ np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    gx = np.zeros_like(gray)
+    gy = np.zeros_like(gray)
+    gx[:, :, 1:-1] = gray[:, :, 2:] - gray[:, :, :-2]
+    gy[:, 1:-1, :] = gray[:, 2:, :] - gray[:, :-2, :]
+    mag = np.hypot(gx, gy)
+    ang = np.arctan2(gy, gx) % (2 * np.pi)
+    orient = np.minimum((ang * ORIENTATIONS / (2 * np.pi)).astype(np.int64), ORIENTATIONS - 1)
+    cell_idx = (np.arange(s) * GRID // s)
+    cell = cell_idx[:, None] * GRID + cell_idx[None, :]
+    num_grad = GRID * GRID * ORIENTATIONS
+    grad_bin = cell[None] * ORIENTATIONS + orient + (np.arange(n) * num_grad)[:, None, None]
+    grad = np.bincount(grad_bin.ravel(), weights=mag.ravel(), minlength=n * num_grad).reshape(n, num_grad)
+
+    color = color / np.maximum(color.sum(axis=1, keepdims=True), 1e-12)
+    grad = grad / np.maximum(grad.sum(axis=1, keepdims=True), 1e-12)
+    return np.hstack([color, grad]).astype(np.float32)
+
+
+def normalize_descriptors(raw: np.ndarray) -> np.ndarray:
+    """Hellinger-map, centre and L2-normalise raw histograms so dot products rank neighbours."""
+    desc = np.sqrt(raw)
+    desc -= desc.mean(axis=0, keepdims=True)
+    desc /= np.maximum(np.linalg.norm(desc, axis=1, keepdims=True), 1e-12)
+    return desc.astype(np.float32)
+
+
+def compute_raw_descriptors(paths: list[Path], workers: int | None = None) -> np.ndarray:
+    """Raw descriptor matrix (len(paths), DESCRIPTOR_DIM); unreadable images get zero rows."""
+    raw = np.zeros((len(paths), DESCRIPTOR_DIM), dtype=np.float32)
+    workers = workers or min(32, (os.cpu_count() or 1) * 2)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(paths), CHUNK_SIZE):
+            chunk = paths[start:start + CHUNK_SIZE]
+            thumbs = np.zeros((len(chunk), THUMB_SIZE, THUMB_SIZE, 3), dtype=np.uint8)
+            for i, thumb in enumerate(pool.map(load_thumbnail, chunk)):
+                if thumb is None:
+                    print(f"[WARN] Could not read {chunk[i]} for retrieval")
+                    continue
+                thumbs[i] = thumb
+            raw[start:start + len(chunk)] = describe_thumbnails(thumbs)
+    return raw
+
+
+def _file_stamp(path: Path) -> tuple[int, int]:
+    """(size, mtime_ns) of a file, or (-1, -1) when it cannot be read."""
+    try:
+        st = path.stat()
+    except OSError:
+        return -1, -1
+    return st.st_size, st.st_mtime_ns
+
+
+def load_raw_descriptors(image_dir: Path, names: list[str], cache_path: Path | None = None) -> np.ndarray:
+    """Raw descriptors for names, reusing rows cached in cache_path (.npz) when present.
+
+    Cached rows are keyed by (name, size, mtime), so an image replaced under
+    the same name is described again.
+    """
+    stamps = {name: _file_stamp(image_dir / name) for name in names}
+    cached: dict[tuple[str, int, int], np.ndarray] = {}
+    if cache_path is not None and cache_path.is_file():
+        with np.load(cache_path) as data:
+            if data["raw"].shape[1:] == (DESCRIPTOR_DIM,) and "stamps" in data:
+                keys = zip(data["names"].tolist(), data["stamps"].tolist())
+                cached = {(name, size, mtime): row for (name, (size, mtime)), row in zip(keys, data["raw"])}
+
+    keys = [(name, *stamps[name]) for name in names]
+    missing = [key for key in keys if key not in cached]
+    if missing:
+        print(f"[INFO] Computing retrieval descriptors for {len(missing)} images "
+              f"({len(names) - len(missing)} cached)")
+        for key, row in zip(missing, compute_raw_descriptors([image_dir / key[0] for key in missing])):
+            cached[key] = row
+
+    raw = np.stack([cached[key] for key in keys]) if names else np.zeros((0, DESCRIPTOR_DIM), np.float32)
+    if cache_path is not None and missing:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Keep only the current version of each image.
+        current = {key[0]: key for key in cached}
+        current.update({key[0]: key for key in keys})
+        all_keys = list(current.values())
+        np.savez(cache_path, names=np.array([key[0] for key in all_keys]),
+                 stamps=np.array([key[1:] for key in all_keys], dtype=np.int64).reshape(-1, 2),
+                 raw=np.stack([cached[key] for key in all_keys]))
+    return raw
+
+
+def top_k_neighbours(desc: np.ndarray, k: int, batch_size: int = 1024,
+                     queries: np.ndarray | None = None) -> np.ndarray:
+    """Indices of the k most similar rows of desc for each query row (self excluded).
+
+    Similarities are computed one block of queries at a time, so memory stays at
+    batch_size x len(desc) regardless of the set size.
+    """
+    n = desc.shape[0]
+    query_idx = np.arange(n) if queries is None else np.asarray(queries, dtype=np.int64)
+    k = min(k, n - 1)
+    if k <= 0 or len(query_idx) == 0:
+        return np.empty((len(query_idx), 0), dtype=np.int64)
+
+    neighbours = np.empty((len(query_idx), k), dtype=np.int64)
+    for start in range(0, len(query_idx), batch_size):
+        block = query_idx[start:start + batch_size]
+        sims = desc[block] @ desc.T
+        sims[np.arange(len(block)), block] = -np.inf
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1)
+        neighbours[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+    return neighbours
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Zero-copy staging of image trees for COLMAP runs.
+
+Builds a run's images/ (and masks/) directory from per-file hardlinks,
+reflinks (copy-on-write clones, where the filesystem supports them) or
+symlinks instead of copying pixels, optionally for a subset of the images.
+Staging is idempotent: files already linked to the right source are left
+alone, and files an earlier staging created that are no longer in the
+staged set are removed. Those are listed in a manifest next to the staged
+directory (.images.staged for images/), so files that other tools put
+there are never touched.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+
+from colmap_matching import IMAGE_EXTENSIONS, list_images
+
+STAGE_MODES = ("auto", "hardlink", "reflink", "symlink", "copy")
+# Linux FICLONE ioctl: clone src's extents into dst (btrfs, XFS with reflink, ...).
+_FICLONE = 0x40049409
+
+
+@dataclass
+class StageReport:
+    methods: Counter = field(default_factory=Counter)
+    unchanged: int = 0
+    removed: int = 0
+    missing_masks: int = 0
+    bytes_copied: int = 0
+
+    def describe(self) -> str:
+        methods = ", ".join(f"{name} {count}" for name, count in self.methods.items()) or "none"
+        return (f"new: {methods}; unchanged {self.unchanged}; removed {self.removed}; "
+                f"{self.bytes_copied:,} bytes copied")
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported on this platform")
+    import fcntl
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            dst.unlink(missing_ok=True)
+            raise
+
+
+def is_staged(src: Path, dst: Path) -> bool:
+    """True if dst already links to (or is a copy of) src."""
+    if dst.is_symlink():
+        return Path(os.readlink(dst)) == src
+    if not dst.exists():
+        return False
+    s, d = src.stat(), dst.stat()
+    # Hardlink (same inode), or a reflink/copy made from this source earlier.
+    return (s.st_ino, s.st_dev) == (d.st_ino, d.st_dev) or \
+        (s.st_size == d.st_size and int(s.st_mtime) == int(d.st_mtime))
+
+
+class Linker:
+    """Links files with the cheapest method that works, remembering failures.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, mode: str):
+        if mode not in STAGE_MODES:
+            raise ValueError(f"Unknown stage mode {mode!r}; expected one of {STAGE_MODES}")
+        self.methods = ["hardlink", "reflink", "symlink"] if mode == "auto" else [mode]
+        self._lock = threading.Lock()
+
+    def link(self, src: Path, dst: Path) -> str:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if dst.exists() or dst.is_symlink():
+            dst.unlink()
+        for method in list(self.methods):
+            try:
+                if method == "hardlink":
+                    os.link(src, dst)
+                elif method == "reflink":
+                    _reflink(src, dst)
+                    shutil.copystat(src, dst)
+                elif method == "symlink":
+                    dst.symlink_to(src)
+                else:
+                    shutil.copy2(src, dst)
+                return method
+            except OSError as e:
+                if len(self.methods) == 1:
+                    raise
+                # Cross-device or unsupported: the same will hold for the other files.
+                with self._lock:
+                    if method in self.methods:
+                        print(f"[INFO] {method} not available ({e.strerror}); trying next method")
+                        self.methods.remove(method)
+        raise OSError(f"Could not stage {src} -> {dst}")
+
+
+def manifest_path(root: Path) -> Path:
+    """Manifest of the files staged into root, relative to it, one per line."""
+    return root.parent / f".{root.name}.staged"
+
+
+def _previously_staged(root: Path) -> set[Path]:
+    """Files an earlier stage_images() created under root. Directories staged before the
+    manifest existed fall back to their image files (what COLMAP would read)."""
+    manifest = manifest_path(root)
+    if manifest.is_file():
+        return {root / line for line in manifest.read_text().splitlines() if line}
+    return {path for path in root.rglob("*")
+            if path.suffix.lower() in IMAGE_EXTENSIONS and (path.is_file() or path.is_symlink())}
+
+
+def stage_images(
+    src_dir: Path,
+    dst_dir: Path,
+    names: list[str] | None = None,
+    mask_dir: Path | None = None,
+    mask_dst: Path | None = None,
+    mode: str = "auto",
+    sources: dict[str, Path] | None = None,
+) -> StageReport:
+    """Stage images (all in src_dir, or just `names`) into dst_dir without copying data.
+
+    sources maps staged names to files outside src_dir (e.g. derived images).
+    Masks follow COLMAP's --ImageReader.mask_path layout (mask of a/b.jpg is
+    a/b.jpg.png) and are staged from mask_dir into mask_dst when given.
+    """
+    start = time.perf_counter()
+    src_dir = src_dir.resolve()
+    sources = sources or {}
+    names = list_images(src_dir) if names is None else list(names)
+    jobs = [(sources[name].resolve() if name in sources else src_dir / name, dst_dir / name) for name in names]
+    if mask_dir is not None and mask_dst is not None:
+        mask_dir = mask_dir.resolve()
+        mask_jobs = [(mask_dir / f"{name}.png", mask_dst / f"{name}.png") for name in names]
+    else:
+        mask_jobs = []
+
+    # A directory symlink left by an older run would make us link into (and prune) the source.
+    for root in (dst_dir, mask_dst):
+        if root is not None and root.is_symlink():
+            root.unlink()
+
+    report = StageReport()
+    linker = Linker(mode)
+    for i, (src, dst) in enumerate(jobs + mask_jobs):
+        if not src.exists():
+            if i >= len(jobs):
+                report.missing_masks += 1
+                continue
+            raise FileNotFoundError(f"Image to stage not found: {src}")
+        if is_staged(src, dst):
+            report.unchanged += 1
+            continue
+        method = linker.link(src, dst)
+        report.methods[method] += 1
+        if method == "copy":
+            report.bytes_copied += src.stat().st_size
+
+    # Drop files left over from a previous (larger or different) staging, but only our own.
+    for root, keep in ((dst_dir, {d for _, d in jobs}), (mask_dst, {d for _, d in mask_jobs if d.exists()})):
+        if root is None or not root.exists():
+            continue
+        for path in _previously_staged(root) - keep:
+            if path.is_file() or path.is_symlink():
+                path.unlink()
+                report.removed += 1
+        manifest_path(root).write_text("".join(f"{path.relative_to(root).as_posix()}\n" for path in sorted(keep)))
+
+    elapsed = time.perf_counter() - start
+    staged = f"{len(jobs)} images"
+    if mask_jobs:
+        staged += f" and {len(mask_jobs) - report.missing_masks} masks"
+    print(f"[INFO] Staged {staged} into {dst_dir} in {elapsed:.2f}s ({report.describe()})")
+    if report.missing_masks:
+        print(f"[WARN] {report.missing_masks} images have no mask in {mask_dir}")
+    return report
+
+
+def read_image_list(path: Path) -> list[str]:
+    """Read a COLMAP --image_list_path file (one image name per line)."""
+    return [line.strip() for line in path.read_text().splitlines() if line.strip()]
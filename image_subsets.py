@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Image subsets defined by an image list instead of a copy of the images.
+
+A subset is a directory holding image_list.txt (COLMAP --image_list_path
+format, names relative to the source image directory) and manifest.json
+(how it was selected, from what). Subsets are selected by every-k frames,
+a time window, an explicit name list, or any combination of these.
+
+The colmap_sfm_*.py scripts take a subset through IMAGE_LIST, and
+run_3dgrut_train.py through --subset: it builds a run variant whose images
+are hardlinked and whose sparse/0 is the full run's model restricted to the
+subset, so no pixels are copied and no SfM is rerun.
+
+Example (the "oddset"):
+    python image_subsets.py <image dir> <subsets dir>/oddset --every 2
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import sys
+
+from colmap_matching import list_images, parse_frame_name
+from colmap_model import filter_model, read_model, write_model
+from image_staging import read_image_list, stage_images
+
+SUBSET_LIST: str = "image_list.txt"
+SUBSET_MANIFEST: str = "manifest.json"
+
+
+@dataclass
+class SubsetSpec:
+    every: int = 1                  # keep every k-th frame of each stream ...
+    offset: int = 0                 # ... starting at this one
+    start_s: float | None = None    # time window, seconds from the first frame
+    end_s: float | None = None
+    list_path: str | None = None    # explicit list of names to keep
+    frame_interval_s: float = 1.0   # seconds between consecutive frame numbers
+
+
+@dataclass
+class Subset:
+    name: str
+    names: list[str]
+    manifest: dict
+
+
+def frame_positions(names: list[str], frame_interval_s: float = 1.0) -> tuple[list[int], list[float]]:
+    """Position within its stream and capture time (s) of every image.
+
+    Frames with a number (frame_000012_front.jpg) are timed from the first
+    frame of their stream, so front/back images of one instant share a
+    position and a time. Other names are taken in sorted order as one stream.
+    """
+    parsed = [parse_frame_name(name) for name in names]
+    if any(p is None for p in parsed):
+        order = sorted(range(len(names)), key=lambda i: names[i])
+        positions = [0] * len(names)
+        for rank, i in enumerate(order):
+            positions[i] = rank
+        return positions, [p * frame_interval_s for p in positions]
+
+    streams: dict[str, list[int]] = {}
+    for key, number in parsed:
+        streams.setdefault(key, []).append(number)
+    ranks = {key: {n: r for r, n in enumerate(sorted(set(numbers)))} for key, numbers in streams.items()}
+    first = {key: min(numbers) for key, numbers in streams.items()}
+    positions = [ranks[key][number] for key, number in parsed]
+    times = [(number - first[key]) * frame_interval_s for key, number in parsed]
+    return positions, times
+
+
+def select_subset(names: list[str], spec: SubsetSpec) -> list[str]:
+    """Names (in input order) kept by spec."""
+    if spec.every < 1:
+        raise ValueError("every must be >= 1")
+    positions, times = frame_positions(names, spec.frame_interval_s)
+    allowed = set(read_image_list(Path(spec.list_path))) if spec.list_path else None
+    selected = []
+    for name, position, time_s in zip(names, positions, times):
+        if position % spec.every != spec.offset % spec.every:
+            continue
+        if spec.start_s is not None and time_s < spec.start_s:
+            continue
+        if spec.end_s is not None and time_s > spec.end_s:
+            continue
+        if allowed is not None and name not in allowed:
+            continue
+        selected.append(name)
+    return selected
+
+
+def write_subset(out_dir: Path, names: list[str], source_dir: Path, selection: dict,
+                 num_source_images: int | None = None, name: str | None = None) -> Path:
+    """Write image_list.txt and manifest.json into out_dir; returns out_dir.
+
+    The subset is named after out_dir unless name is given.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / SUBSET_LIST).write_text("\n".join(names) + "\n")
+    manifest = {
+        "name": name or out_dir.name,
+        "source_dir": str(source_dir.resolve()),
+        "num_images": len(names),
+        "num_source_images": num_source_images,
+        "selection": selection,
+        "created": datetime.now().isoformat(timespec="seconds"),
+    }
+    (out_dir / SUBSET_MANIFEST).write_text(json.dumps(manifest, indent=2) + "\n")
+    return out_dir
+
+
+def load_subset(path: Path) -> Subset:
+    """Load a subset from its directory, its manifest.json, or a plain image list file."""
+    if path.is_dir():
+        path = path / SUBSET_MANIFEST
+    if path.suffix == ".json":
+        manifest = json.loads(path.read_text())
+        names = read_image_list(path.parent / SUBSET_LIST)
+        return Subset(name=manifest.get("name", path.parent.name), names=names, manifest=manifest)
+    names = read_image_list(path)
+    return Subset(name=path.stem, names=names, manifest={"name": path.stem, "image_list": str(path)})
+
+
+def subset_run_dir(run_dir: Path, subset: Subset) -> Path:
+    """Run directory of a subset variant, next to the full run: <run>__<subset>."""
+    return run_dir.with_name(f"{run_dir.name}__{subset.name}")
+
+
+def make_subset_run(run_dir: Path, subset: Subset, out_dir: Path | None = None) -> Path:
+    """Build a training-ready run for a subset from a finished full run.
+
+    images/ is hardlinked (see image_staging) and sparse/0 is the full model
+    restricted to the subset's images; subset images the model did not
+    register are skipped. Returns the subset run directory.
+    """
+    out_dir = subset_run_dir(run_dir, subset) if out_dir is None else out_dir
+    model = read_model(run_dir / "sparse" / "0")
+    registered = set(model.images.names)
+    names = [name for name in subset.names if name in registered]
+    if len(names) < len(subset.names):
+        print(f"[WARN] {len(subset.names) - len(names)} subset images are not registered in {run_dir}; skipping them")
+
+    stage_images(run_dir / "images", out_dir / "images", names=names)
+    subset_model = filter_model(model, names)
+    write_model(subset_model, out_dir / "sparse" / "0")
+    (out_dir / SUBSET_MANIFEST).write_text(json.dumps({**subset.manifest, "run_dir": str(run_dir)}, indent=2) + "\n")
+    print(f"[INFO] Subset run {out_dir}: {subset_model.stats(out_dir).describe()}")
+    return out_dir
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Define an image subset as an image list + manifest (no copies)")
+    parser.add_argument("source_dir", help="Image directory the subset is taken from")
+    parser.add_argument("out_dir", help="Subset directory to write (its name is the subset name)")
+    parser.add_argument("--every", type=int, default=1, help="Keep every k-th frame of each stream")
+    parser.add_argument("--offset", type=int, default=0, help="First kept frame for --every (0 = first frame)")
+    parser.add_argument("--start-s", type=float, help="Start of the time window, seconds from the first frame")
+    parser.add_argument("--end-s", type=float, help="End of the time window, seconds from the first frame")
+    parser.add_argument("--list", dest="list_path", help="Explicit list of image names to keep")
+    parser.add_argument("--frame-interval-s", type=float, default=1.0,
+                        help="Seconds between consecutive frame numbers (config.EVERY_SECONDS)")
+    args = parser.parse_args()
+
+    source_dir = Path(args.source_dir).expanduser()
+    if not source_dir.is_dir():
+        print(f"[ERROR] Source directory not found: {source_dir}", file=sys.stderr)
+        return 1
+    spec = SubsetSpec(every=args.every, offset=args.offset, start_s=args.start_s, end_s=args.end_s,
+                      list_path=str(Path(args.list_path).resolve()) if args.list_path else None,
+                      frame_interval_s=args.frame_interval_s)
+    names = list_images(source_dir)
+    selected = select_subset(names, spec)
+    out_dir = write_subset(Path(args.out_dir).expanduser(), selected, source_dir, asdict(spec),
+                           num_source_images=len(names))
+    print(f"[INFO] Subset {out_dir.name}: {len(selected)} of {len(names)} images -> {out_dir / SUBSET_LIST}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
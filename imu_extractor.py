@@ -520,6 +520,22 @@ class IMUExtractor:
             'heading_samples': len(headings)
         }
 
+def load_heading_data_csv(csv_path: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Load a heading_data.csv written by IMUExtractor.save_heading_data_csv.
+
+    Returns:
+        (timestamps_seconds, headings_degrees) with timestamps relative to the
+        first reading and headings unwrapped so they can be interpolated.
+    """
+    data = np.loadtxt(csv_path, delimiter=',', skiprows=1, ndmin=2)
+    if data.size == 0:
+        return np.empty(0), np.empty(0)
+    data = data[np.argsort(data[:, 0], kind='stable')]
+    timestamps = data[:, 0] - data[0, 0]
+    headings = np.degrees(np.unwrap(np.radians(data[:, 1])))
+    return timestamps, headings
+
 def main():
     """Test the IMU extractor with a sample video file."""
     import argparse
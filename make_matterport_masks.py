@@ -1,67 +1,116 @@
-import config
-import shutil
+"""
+Masks for Matterport skybox faces.
+
+Every skybox image of IMAGE_DIR gets a mask in OUT_DIR, linked (hardlink,
+else reflink or symlink) to one of three canonical masks: top for _skybox0,
+bottom for _skybox5, other for the side faces. Masks follow COLMAP's
+--ImageReader.mask_path layout (mask of a.jpg is a.jpg.png), so OUT_DIR is
+used as MASK_DIR of colmap_sfm_skybox.py, which stages it into the run's
+masks/. Image sizes are read from the file headers and checked against the
+mask; re-runs only link new images and remove masks whose image is gone.
+
+    python make_matterport_masks.py
+    MASK_DIR=$DATASET/_source/masks/FullSet_FullRes python colmap_sfm_skybox.py
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os
+import time
+
+import config
+from image_headers import image_size
+from image_staging import Linker, is_staged
 
 # ===== User-configurable parameters =====
 MASK_DIR: Path = Path(__file__).parent / "masks" / "matterport"
-OUT_DIR: Path = config.DATASET_PATH / "colmap_runs" / config.DATA_VARIANT / "images"
-
-def create_matterport_masks():
-    """Create mask files for skybox images based on skybox number."""
-    
-    # Ensure MASK_DIR exists
-    if not MASK_DIR.exists():
-        print(f"Error: MASK_DIR does not exist: {MASK_DIR}")
+IMAGE_DIR: Path = config.DATASET_PATH / "_source" / "colmap_images" / config.DATA_VARIANT
+OUT_DIR: Path = config.DATASET_PATH / "_source" / "masks" / config.DATA_VARIANT
+# Link method: auto (hardlink -> reflink -> symlink), hardlink, reflink, symlink or copy
+LINK_MODE: str = os.environ.get("MASK_LINK_MODE", "auto")
+WORKERS: int = min(32, (os.cpu_count() or 1) * 4)
+# =======================================
+
+
+def canonical_mask(image_name: str) -> str:
+    """Canonical mask file for a skybox image stem."""
+    if image_name.endswith("_skybox5"):
+        return "bottom_mask.png"
+    if image_name.endswith("_skybox0"):
+        return "top_mask.png"
+    return "other_mask.png"
+
+
+def create_matterport_masks(mask_dir: Path = MASK_DIR, image_dir: Path = IMAGE_DIR, out_dir: Path = OUT_DIR,
+                            mode: str = LINK_MODE) -> None:
+    """Create mask files (<image name>.png in out_dir) for skybox images based on skybox number."""
+    start = time.perf_counter()
+    if not mask_dir.exists():
+        print(f"Error: MASK_DIR does not exist: {mask_dir}")
         return
-    
-    # Ensure OUT_DIR exists
-    if not OUT_DIR.exists():
-        print(f"Error: OUT_DIR does not exist: {OUT_DIR}")
+    if not image_dir.exists():
+        print(f"Error: IMAGE_DIR does not exist: {image_dir}")
         return
-    
-    # Get all skybox images
-    skybox_images = list(OUT_DIR.glob("*_skybox*.jpg"))
-    
+
+    skybox_images = sorted(image_dir.glob("*_skybox*.jpg"))
     if not skybox_images:
-        print(f"No skybox images found in {OUT_DIR}")
+        print(f"No skybox images found in {image_dir}")
         return
-    
+    out_dir.mkdir(parents=True, exist_ok=True)
     print(f"Found {len(skybox_images)} skybox images")
-    
-    # Process each skybox image
-    for image_path in skybox_images:
-        image_name = image_path.stem  # Get filename without extension
-        
-        # Determine which mask to use based on skybox number
-        if image_name.endswith("_skybox5"):
-            # Use bottom_mask.png for skybox5
-            source_mask = MASK_DIR / "bottom_mask.png"
-            mask_name = f"{image_name}_mask.png"
-        elif image_name.endswith("_skybox0"):
-            # Use top_mask.png for skybox0
-            source_mask = MASK_DIR / "top_mask.png"
-            mask_name = f"{image_name}_mask.png"
+
+    # Canonical masks and their sizes, read once
+    mask_sizes: dict[str, tuple[int, int]] = {}
+    for name in ("top_mask.png", "bottom_mask.png", "other_mask.png"):
+        source_mask = mask_dir / name
+        if source_mask.exists():
+            mask_sizes[name] = image_size(source_mask)
         else:
-            # Use other_mask.png for other skybox numbers
-            source_mask = MASK_DIR / "other_mask.png"
-            mask_name = f"{image_name}_mask.png"
-            
-        
-        # Check if source mask exists
-        if not source_mask.exists():
             print(f"Warning: Source mask not found: {source_mask}")
-            continue
-        
-        # Create destination path
-        dest_mask = OUT_DIR / mask_name
-        
-        # Copy the mask file
+
+    linker = Linker(mode)
+
+    def make_mask(image_path: Path) -> str:
+        mask_name = canonical_mask(image_path.stem)
+        dest_mask = out_dir / f"{image_path.name}.png"
+        if mask_name not in mask_sizes:
+            return "no source mask"
         try:
-            shutil.copy2(source_mask, dest_mask)
-            print(f"Created: {mask_name}")
-        except Exception as e:
-            print(f"Error copying {source_mask} to {dest_mask}: {e}")
+            size = image_size(image_path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read image header of {image_path.name}: {e}")
+            return "unreadable image"
+        if size != mask_sizes[mask_name]:
+            print(f"Warning: {image_path.name} is {size[0]}x{size[1]} but {mask_name} is "
+                  f"{mask_sizes[mask_name][0]}x{mask_sizes[mask_name][1]}; skipping")
+            dest_mask.unlink(missing_ok=True)
+            return "size mismatch"
+        source_mask = mask_dir / mask_name
+        if is_staged(source_mask, dest_mask):
+            return "unchanged"
+        return linker.link(source_mask, dest_mask)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(make_mask, skybox_images))
+
+    # Drop masks left from images that are no longer there
+    image_names = {p.name for p in skybox_images}
+    removed = 0
+    for mask_path in out_dir.glob("*_skybox*.jpg.png"):
+        if mask_path.stem not in image_names:
+            mask_path.unlink()
+            removed += 1
+
+    counts: dict[str, int] = {}
+    for result in results:
+        counts[result] = counts.get(result, 0) + 1
+    summary = ", ".join(f"{name} {count}" for name, count in sorted(counts.items()))
+    print(f"Masks for {len(skybox_images)} images in {time.perf_counter() - start:.2f}s: {summary}"
+          f"{f', removed {removed} stale' if removed else ''}")
+    print(f"Use them with: MASK_DIR={out_dir} python colmap_sfm_skybox.py")
+
 
 if __name__ == "__main__":
     create_matterport_masks()
-
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+3DGRUT training and evaluation metrics, parsed live into a SQLite store.
+
+The launchers run train.py / render.py on a pseudo-terminal (so progress bars
+render as usual), echo the output, and parse it line by line: it/s and step
+from progress bars, loss/PSNR-style `name: value` pairs, `Mean PSNR : x`
+summaries and box-drawn tables such as the final training statistics. Values
+are appended to METRICS_DB (default <dataset root>/3dgrut_metrics.db), per run,
+keyed by experiment name and launcher config.
+
+    python metrics_store.py list                          # runs, config hashes and exit codes
+    python metrics_store.py compare FullSet_QuarterRes FullSet_QuarterRes__filtered
+    python metrics_store.py compare --metrics it_s,mean_psnr,mean_lpips %QuarterRes%
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+import argparse
+import hashlib
+import json
+import os
+import pty
+import re
+import select
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+if TYPE_CHECKING:
+    from early_stopping import EarlyStopper
+
+# Metrics summarised by their median over the run instead of the last value.
+RATE_METRICS: frozenset[str] = frozenset({"it_s"})
+DEFAULT_COMPARE_METRICS: tuple[str, ...] = ("it_s", "n_steps", "training_time", "loss", "mean_psnr",
+                                            "mean_ssim", "mean_lpips", "std_psnr")
+FLUSH_INTERVAL_S: float = 2.0
+# Grace period after an early-stop SIGINT before escalating.
+STOP_TIMEOUT_S: float = 300.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, experiment TEXT NOT NULL,
+    config TEXT NOT NULL, config_hash TEXT NOT NULL, started TEXT NOT NULL, finished TEXT,
+    returncode INTEGER);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL, step INTEGER, name TEXT NOT NULL, value REAL NOT NULL, elapsed_s REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS metrics_run ON metrics (run_id, name);
+CREATE INDEX IF NOT EXISTS runs_experiment ON runs (experiment);
+"""
+
+_ANSI_RE = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07]*\x07")
+_NUMBER = r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?"
+_RATE_RE = re.compile(rf"({_NUMBER})\s*it/s")
+_PROGRESS_RE = re.compile(r"(\d+)\s*/\s*(\d+)")
+_STEP_RE = re.compile(r"\bstep\s*[=:]?\s*(\d+)", re.IGNORECASE)
+_SUMMARY_RE = re.compile(rf"\b((?:mean|std)\s*(?:psnr|ssim|lpips))\s*[:=]?\s*({_NUMBER})", re.IGNORECASE)
+_PAIR_RE = re.compile(rf"\b(loss|psnr|ssim|lpips|l1|n_gaussians|num_gaussians)\s*[=:]\s*({_NUMBER})",
+                      re.IGNORECASE)
+_TABLE_SEPARATORS = re.compile(r"[│┃|]")
+_CELL_VALUE_RE = re.compile(rf"^({_NUMBER})\s*[a-zA-Z/%]*$")
+
+
+def metric_name(label: str) -> str:
+    """Normalised metric name: 'Mean PSNR' -> mean_psnr, 'it/s' -> it_s."""
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+
+
+class LogParser:
+    """Turns output lines into (step, name, value) samples, keeping the current step and table header."""
+
+    def __init__(self) -> None:
+        self.step: int | None = None
+        self._header: list[str] | None = None
+
+    def feed(self, line: str) -> list[tuple[int | None, str, float]]:
+        line = _ANSI_RE.sub("", line).strip()
+        if not line:
+            return []
+        rate = _RATE_RE.search(line)
+        progress = _PROGRESS_RE.search(line) if rate else None
+        if _TABLE_SEPARATORS.search(line) and not progress:  # tqdm bars use | too
+            return self._table_row(line)
+
+        samples: list[tuple[int | None, str, float]] = []
+        if progress:
+            self.step = int(progress.group(1))
+        step = _STEP_RE.search(line)
+        if step:
+            self.step = int(step.group(1))
+        if rate:
+            samples.append((self.step, "it_s", float(rate.group(1))))
+        for match in _SUMMARY_RE.finditer(line):
+            samples.append((self.step, metric_name(match.group(1)), float(match.group(2))))
+        for match in _PAIR_RE.finditer(_SUMMARY_RE.sub("", line)):
+            samples.append((self.step, metric_name(match.group(1)), float(match.group(2))))
+        return samples
+
+    def _table_row(self, line: str) -> list[tuple[int | None, str, float]]:
+        cells = [cell.strip() for cell in _TABLE_SEPARATORS.split(line)]
+        cells = [cell for cell in cells if cell]
+        if not cells:
+            return []
+        values = [_CELL_VALUE_RE.match(cell) for cell in cells]
+        if all(value is None for value in values):
+            # Two-column "name | value" rows are caught below; other all-text rows are headers.
+            self._header = [metric_name(cell) for cell in cells]
+            return []
+        if len(cells) == 2 and values[0] is None and values[1] is not None:
+            return [(self.step, metric_name(cells[0]), float(values[1].group(1)))]
+        if self._header is not None and len(self._header) == len(cells):
+            return [(self.step, name, float(value.group(1)))
+                    for name, value in zip(self._header, values) if value is not None]
+        return []
+
+
+class MetricsStore:
+    """Runs and their metric samples in one SQLite file."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def start_run(self, kind: str, experiment: str, config: dict) -> int:
+        config_json = json.dumps(config, sort_keys=True, default=str)
+        config_hash = hashlib.sha1(config_json.encode()).hexdigest()[:12]
+        with self.conn:
+            return self.conn.execute(
+                "INSERT INTO runs (kind, experiment, config, config_hash, started) VALUES (?, ?, ?, ?, ?)",
+                (kind, experiment, config_json, config_hash, datetime.now().isoformat(timespec="seconds")),
+            ).lastrowid
+
+    def add(self, run_id: int, samples: Iterable[tuple[int | None, str, float, float]]) -> None:
+        with self.conn:
+            self.conn.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?, ?)",
+                                  [(run_id, step, name, value, elapsed) for step, name, value, elapsed in samples])
+
+    def finish_run(self, run_id: int, returncode: int) -> None:
+        with self.conn:
+            self.conn.execute("UPDATE runs SET finished = ?, returncode = ? WHERE run_id = ?",
+                              (datetime.now().isoformat(timespec="seconds"), returncode, run_id))
+
+    def runs(self, patterns: list[str] | None = None) -> list[dict]:
+        """Runs whose experiment matches any SQL LIKE pattern (or run id), oldest first."""
+        query, params = "SELECT * FROM runs", []
+        if patterns:
+            query += " WHERE " + " OR ".join("experiment LIKE ? OR CAST(run_id AS TEXT) = ?" for _ in patterns)
+            params = [value for pattern in patterns for value in (pattern, pattern)]
+        cursor = self.conn.execute(query + " ORDER BY run_id", params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def summary(self, run_id: int) -> dict[str, float]:
+        """Final value of every metric of a run (median for RATE_METRICS)."""
+        result: dict[str, float] = {}
+        rows = self.conn.execute("SELECT name, value FROM metrics WHERE run_id = ? ORDER BY rowid", (run_id,))
+        series: dict[str, list[float]] = {}
+        for name, value in rows:
+            series.setdefault(name, []).append(value)
+        for name, values in series.items():
+            result[name] = sorted(values)[len(values) // 2] if name in RATE_METRICS else values[-1]
+        return result
+
+
+def metrics_db_path() -> Path:
+    """METRICS_DB, or 3dgrut_metrics.db in the config.py dataset root."""
+    if os.environ.get("METRICS_DB"):
+        return Path(os.environ["METRICS_DB"]).expanduser()
+    import config
+    return Path(config.DATASET_ROOT) / "3dgrut_metrics.db"
+
+
+def _signal_group(process: subprocess.Popen, sig: int) -> None:
+    """Send sig to the child's process group (bash and the trainer it starts)."""
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def run_and_record(cmd: list[str], cwd: Path, kind: str, experiment: str, config: dict,
+                   store_path: Path | None = None, stopper: EarlyStopper | None = None) -> tuple[int, int]:
+    """Run cmd on a pseudo-terminal, echo its output and store parsed metrics. Returns (returncode, run id).
+
+    With a stopper (early_stopping.py), the process is interrupted (SIGINT, then SIGTERM after
+    STOP_TIMEOUT_S) once it reports convergence, and plateau_step / early_stop_step are stored.
+    """
+    store = MetricsStore(store_path or metrics_db_path())
+    run_id = store.start_run(kind, experiment, config)
+    parser = LogParser()
+    pending: list[tuple[int | None, str, float, float]] = []
+    start = last_flush = time.monotonic()
+    stop_sent: float | None = None
+    escalated = False
+
+    master, slave = pty.openpty()
+    try:
+        # A session of its own so the stop signal reaches the trainer behind bash.
+        process = subprocess.Popen(cmd, cwd=cwd, stdin=subprocess.DEVNULL, stdout=slave, stderr=slave,
+                                   start_new_session=True)
+    except BaseException:
+        os.close(master)
+        os.close(slave)
+        store.finish_run(run_id, -1)
+        store.close()
+        raise
+    os.close(slave)
+    returncode = -1
+    try:
+        partial = ""
+        while True:
+            if stop_sent is not None and not escalated and time.monotonic() - stop_sent > STOP_TIMEOUT_S:
+                print(f"\n[WARN] Still running {STOP_TIMEOUT_S:.0f} s after SIGINT; sending SIGTERM")
+                _signal_group(process, signal.SIGTERM)
+                escalated = True
+            ready, _, _ = select.select([master], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                chunk = os.read(master, 65536)
+            except OSError:  # EIO once the child side is closed
+                break
+            if not chunk:
+                break
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
+            # Progress bars redraw with \r; every redraw is a line for the parser.
+            lines = re.split(r"[\r\n]", partial + chunk.decode(errors="replace"))
+            partial = lines.pop()
+            now = time.monotonic()
+            for line in lines:
+                samples = parser.feed(line)
+                pending.extend((step, name, value, now - start) for step, name, value in samples)
+                if stopper is not None and stop_sent is None and stopper.observe(line, samples):
+                    print(f"\n[INFO] Checkpoint written; stopping training at step {stopper.stop_step}")
+                    _signal_group(process, signal.SIGINT)
+                    stop_sent = now
+            if pending and now - last_flush > FLUSH_INTERVAL_S:
+                store.add(run_id, pending)
+                pending, last_flush = [], now
+        pending.extend((step, name, value, time.monotonic() - start) for step, name, value in parser.feed(partial))
+        returncode = process.wait()
+    finally:
+        os.close(master)
+        if process.poll() is None:
+            _signal_group(process, signal.SIGINT)
+            try:
+                returncode = process.wait(timeout=STOP_TIMEOUT_S)
+            except subprocess.TimeoutExpired:
+                _signal_group(process, signal.SIGKILL)
+                returncode = process.wait()
+        if stopper is not None:
+            elapsed = time.monotonic() - start
+            for name, step in (("plateau_step", stopper.plateau_step), ("early_stop_step", stopper.stop_step)):
+                if step is not None:
+                    pending.append((step, name, float(step), elapsed))
+        store.add(run_id, pending)
+        store.finish_run(run_id, returncode)
+        store.close()
+    return returncode, run_id
+
+
+def _format(value: float | None) -> str:
+    if value is None:
+        return ""
+    return f"{value:.0f}" if value == int(value) and abs(value) >= 100 else f"{value:.5g}"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Query and compare 3DGRUT metrics")
+    parser.add_argument("--db", type=Path, help="Metrics database (default: METRICS_DB or <dataset root>/3dgrut_metrics.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="Runs with config hash and status")
+    list_parser.add_argument("experiments", nargs="*", help="Experiment names (SQL LIKE patterns) or run ids")
+    compare = sub.add_parser("compare", help="Final metrics of runs side by side")
+    compare.add_argument("experiments", nargs="*", help="Experiment names (SQL LIKE patterns) or run ids")
+    compare.add_argument("--metrics", help=f"Comma-separated metrics (default: {','.join(DEFAULT_COMPARE_METRICS)})")
+    args = parser.parse_args()
+
+    db_path = args.db or metrics_db_path()
+    if not db_path.is_file():
+        print(f"[ERROR] No metrics database at {db_path}", file=sys.stderr)
+        return 1
+    store = MetricsStore(db_path)
+    try:
+        runs = store.runs(args.experiments)
+        if args.command == "list":
+            for run in runs:
+                status = "running" if run["finished"] is None else f"exit {run['returncode']}"
+                print(f"{run['run_id']:>5}  {run['started']}  {run['kind']:<5}  {run['experiment']}  "
+                      f"[config {run['config_hash']}]  {status}")
+            return 0
+        metrics = args.metrics.split(",") if args.metrics else list(DEFAULT_COMPARE_METRICS)
+        header = ["run", "kind", "experiment", "config", *metrics]
+        print("| " + " | ".join(header) + " |")
+        print("|" + "---|" * len(header))
+        for run in runs:
+            summary = store.summary(run["run_id"])
+            row = [str(run["run_id"]), run["kind"], run["experiment"], run["config_hash"],
+                   *(_format(summary.get(name)) for name in metrics)]
+            print("| " + " | ".join(row) + " |")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Dependency-aware pipeline runner with content-hash skipping.
+
+The README workflow (extract -> downsample -> colmap_sfm -> 3dgrut train) as
+a DAG of stages. Every stage declares the files or directories it reads and
+writes; a stage depends on the stages whose outputs it reads. Before a stage
+runs, its command, environment, parameters and the content of its inputs are
+hashed. The stage is skipped when the hash matches its last successful run
+and its outputs still exist. Changing one parameter therefore rebuilds only
+that stage and the ones downstream whose inputs actually changed. Independent
+branches (front/back tracks, several resolutions) run concurrently, with GPU
+stages one at a time.
+
+File hashes are memoised by (inode, size, mtime) in the state file
+(pipeline_state.json in the dataset directory), so unchanged image folders
+cost one stat per file. Stage output goes to pipeline_logs/<stage>.log.
+
+    python pipeline.py video --every-seconds 5 --cameras front,back   # Insta360 video
+    python pipeline.py photos --factors 2,4 --dry-run                  # downsampled photo sets
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from feature_cache import hash_file
+
+REPO_DIR: Path = Path(__file__).resolve().parent
+STATE_NAME: str = "pipeline_state.json"
+GPU_SLOTS: int = 1
+# With a single GPU slot, GPU stages also hold this lock so concurrent pipelines (run_batch.py) take turns.
+GPU_LOCK_PATH: Path = Path(tempfile.gettempdir()) / "av_gaussian_workflow_gpu.lock"
+
+
+@dataclass
+class Stage:
+    name: str
+    command: list[str]
+    inputs: list[Path] = field(default_factory=list)
+    outputs: list[Path] = field(default_factory=list)
+    params: dict[str, object] = field(default_factory=dict)
+    env: dict[str, str] = field(default_factory=dict)
+    gpu: bool = False
+
+
+@contextmanager
+def _gpu_lock() -> Iterator[None]:
+    with open(GPU_LOCK_PATH, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _overlaps(a: Path, b: Path) -> bool:
+    return a == b or a in b.parents or b in a.parents
+
+
+class Pipeline:
+    """Stages, their dependencies and the state of their last successful runs."""
+
+    def __init__(self, state_path: Path, log_dir: Path | None = None):
+        self.state_path = state_path
+        self.log_dir = log_dir or state_path.with_name("pipeline_logs")
+        self.stages: dict[str, Stage] = {}
+        self._lock = threading.Lock()
+        self.state: dict = {"stages": {}, "digests": {}}
+        if state_path.is_file():
+            with open(state_path) as f:
+                self.state = json.load(f)
+
+    def add(self, stage: Stage) -> Stage:
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage '{stage.name}'")
+        self.stages[stage.name] = stage
+        return stage
+
+    def dependencies(self) -> dict[str, list[str]]:
+        """Stages whose outputs each stage reads."""
+        deps = {}
+        for stage in self.stages.values():
+            deps[stage.name] = [other.name for other in self.stages.values() if other is not stage and any(
+                _overlaps(i, o) for i in stage.inputs for o in other.outputs)]
+        return deps
+
+    def order(self) -> list[str]:
+        """Stage names, dependencies first."""
+        deps, order, visiting = self.dependencies(), [], set()
+
+        def visit(name: str) -> None:
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Dependency cycle through stage '{name}'")
+            visiting.add(name)
+            for dep in deps[name]:
+                visit(dep)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.state_path)
+
+    def _file_digest(self, path: Path) -> str:
+        st = path.stat()
+        memo = self.state["digests"].get(str(path))
+        if memo and memo[:3] == [st.st_ino, st.st_size, st.st_mtime_ns]:
+            return memo[3]
+        digest = hash_file(path)
+        with self._lock:
+            self.state["digests"][str(path)] = [st.st_ino, st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def digest(self, path: Path) -> str:
+        """Content hash of a file, or of the relative names and contents of a directory tree."""
+        if path.is_file():
+            return self._file_digest(path)
+        if not path.is_dir():
+            raise FileNotFoundError(f"Input not found: {path}")
+        digest = hashlib.blake2b(digest_size=20)
+        for root, dirs, files in os.walk(path, followlinks=True):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = Path(root) / name
+                if file_path.is_file():
+                    digest.update(f"{file_path.relative_to(path)}\0{self._file_digest(file_path)}\n".encode())
+        return digest.hexdigest()
+
+    def key(self, stage: Stage) -> str:
+        """Hash of everything that determines a stage's outputs."""
+        settings = json.dumps([stage.command, stage.env, stage.params], sort_keys=True, default=str)
+        inputs = "\n".join(f"{path}\0{self.digest(path)}" for path in stage.inputs)
+        return hashlib.sha256(f"{settings}\n{inputs}".encode()).hexdigest()
+
+    def up_to_date(self, stage: Stage, key: str) -> bool:
+        record = self.state["stages"].get(stage.name)
+        return record is not None and record["key"] == key and all(p.exists() for p in stage.outputs)
+
+    def _run_stage(self, stage: Stage, force: bool, gpu_slots: threading.Semaphore, shared_gpu: bool) -> str:
+        try:
+            key = self.key(stage)
+        except FileNotFoundError as exc:
+            print(f"[ERROR] {stage.name}: {exc}", file=sys.stderr)
+            return "failed"
+        if not force and self.up_to_date(stage, key):
+            print(f"[INFO] {stage.name}: up to date")
+            return "up to date"
+
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        log_path = self.log_dir / f"{stage.name}.log"
+        with gpu_slots if stage.gpu else nullcontext(), _gpu_lock() if stage.gpu and shared_gpu else nullcontext():
+            print(f"[INFO] {stage.name}: running (log: {log_path})")
+            start = time.monotonic()
+            with open(log_path, "w") as log:
+                try:
+                    returncode = subprocess.run(stage.command, cwd=REPO_DIR, env={**os.environ, **stage.env},
+                                                stdin=subprocess.DEVNULL, stdout=log,
+                                                stderr=subprocess.STDOUT).returncode
+                except OSError as exc:
+                    log.write(f"[ERROR] Could not start: {exc}\n")
+                    returncode = -1
+        if returncode != 0:
+            print(f"[ERROR] {stage.name}: exit code {returncode} (see {log_path})", file=sys.stderr)
+            return "failed"
+        missing = [p for p in stage.outputs if not p.exists()]
+        if missing:
+            print(f"[ERROR] {stage.name}: declared output not written: {missing[0]}", file=sys.stderr)
+            return "failed"
+        with self._lock:
+            self.state["stages"][stage.name] = {"key": key, "finished": datetime.now().isoformat(timespec="seconds")}
+            self._save()
+        print(f"[INFO] {stage.name}: done in {time.monotonic() - start:.1f} s")
+        return "done"
+
+    def run(self, jobs: int | None = None, gpus: int = GPU_SLOTS, force: set[str] | None = None,
+            dry_run: bool = False) -> dict[str, str]:
+        """Run stale stages, each once its dependencies are done. Returns the outcome per stage:
+        done, up to date, failed, blocked (a dependency failed) or, with dry_run, stale."""
+        force = force or set()
+        deps, order = self.dependencies(), self.order()
+        outcome: dict[str, str] = {}
+        if dry_run:
+            for name in order:
+                stage = self.stages[name]
+                try:
+                    stale = (name in force or any(outcome[d] == "stale" for d in deps[name])
+                             or not self.up_to_date(stage, self.key(stage)))
+                except FileNotFoundError:
+                    stale = True  # an input an upstream stage will write
+                outcome[name] = "stale" if stale else "up to date"
+            self._save()
+            return outcome
+
+        gpu_slots = threading.Semaphore(gpus)
+        futures: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            while True:
+                for name in order:
+                    if name in outcome or name in futures.values():
+                        continue
+                    dep_outcomes = [outcome.get(dep) for dep in deps[name]]
+                    if any(o is None for o in dep_outcomes):
+                        continue
+                    if any(o in ("failed", "blocked") for o in dep_outcomes):
+                        print(f"[WARN] {name}: skipped, a dependency failed")
+                        outcome[name] = "blocked"
+                        continue
+                    futures[pool.submit(self._run_stage, self.stages[name], name in force, gpu_slots, gpus == 1)] = name
+                if not futures:
+                    break
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    outcome[futures.pop(future)] = future.result()
+        with self._lock:
+            self._save()
+        return outcome
+
+
+def video_pipeline(video: Path, every_seconds: int, cameras: list[str], train: bool = True) -> Pipeline:
+    """Insta360 workflow: IMU + per-track frame extraction, then fisheye SfM and training per camera."""
+    import config
+    py = sys.executable
+    pipeline = Pipeline(config.DATASET_PATH / STATE_NAME)
+    every_dir = config.DATASET_PATH / "_source" / "extracted" / f"every_{every_seconds}"
+    imu_dir = config.DATASET_PATH / "_source" / "imu_data"
+    pipeline.add(Stage("imu", [py, "extract_360video_imu.py", str(video), "--tracks", "none"],
+                       inputs=[video], outputs=[imu_dir / "heading_data.csv"]))
+    for index, track in enumerate(("front", "back")):
+        pipeline.add(Stage(f"extract_{track}", [py, "extract_360video_imu.py", str(video), "--no-imu",
+                                                "--tracks", str(index), "--every-seconds", str(every_seconds)],
+                           inputs=[video], outputs=[every_dir / track]))
+    for camera in cameras:
+        tracks = ["front", "back"] if camera == "both" else [camera]
+        run_dir = config.DATASET_PATH / "colmap_runs" / f"every_{every_seconds}" / camera
+        pipeline.add(Stage(f"sfm_{camera}", [py, "colmap_sfm_fisheye.py"],
+                           inputs=[every_dir / track for track in tracks] + [imu_dir / "heading_data.csv"],
+                           outputs=[run_dir],
+                           env={"IMAGE_DIR": str(every_dir / camera), "RUN_DIR": str(run_dir),
+                                "FRAME_INTERVAL_S": str(every_seconds)},
+                           gpu=True))
+        if train:
+            _add_train(pipeline, camera, run_dir)
+    return pipeline
+
+
+def photo_pipeline(source_dir: Path, factors: list[int], train: bool = True) -> Pipeline:
+    """Photo workflow: one downsampled image set, pinhole SfM run and training per factor."""
+    import config
+    py = sys.executable
+    pipeline = Pipeline(config.DATASET_PATH / STATE_NAME)
+    for factor in factors:
+        images = config.DATASET_PATH / "_source" / "colmap_images" / f"images_{factor}"
+        run_dir = config.DATASET_PATH / "colmap_runs" / f"{config.DATA_VARIANT}_x{factor}"
+        pipeline.add(Stage(f"downsample_x{factor}", [py, "downsample_images.py", "--input", str(source_dir),
+                                                     "--output", str(images), "--factor", str(factor)],
+                           inputs=[source_dir], outputs=[images]))
+        pipeline.add(Stage(f"sfm_x{factor}", [py, "colmap_sfm_pinhole.py"], inputs=[images], outputs=[run_dir],
+                           env={"IMAGE_DIR": str(images), "RUN_DIR": str(run_dir)}, gpu=True))
+        if train:
+            _add_train(pipeline, f"x{factor}", run_dir)
+    return pipeline
+
+
+def _add_train(pipeline: Pipeline, suffix: str, run_dir: Path) -> None:
+    import config
+    from run_3dgrut_train import last_run_marker
+    # 3DGRUT writes a new <name>-<DDMM_HHMMSS> directory per run; the marker names the latest one.
+    marker = last_run_marker(config.DATASET_PATH / "3dgrut_runs", run_dir.name)
+    pipeline.add(Stage(f"train_{suffix}", [sys.executable, "run_3dgrut_train.py", "--run", str(run_dir)],
+                       inputs=[run_dir / "sparse"], outputs=[marker], gpu=True))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the pipeline stages whose inputs or parameters changed")
+    sub = parser.add_subparsers(dest="workflow", required=True)
+    video = sub.add_parser("video", help="360 video: extract -> colmap_sfm_fisheye -> train")
+    video.add_argument("--video", type=Path, help="Input video (default: first .mp4/.insv in _source/original)")
+    video.add_argument("--every-seconds", type=int, default=5, help="Extract one frame every N seconds (default: 5)")
+    video.add_argument("--cameras", default="front,back,both", help="SfM runs: front, back and/or both")
+    photos = sub.add_parser("photos", help="Photos: downsample -> colmap_sfm_pinhole -> train")
+    photos.add_argument("--source", type=Path, help="Full-resolution images (default: _source/original)")
+    photos.add_argument("--factors", default="2", help="Comma-separated downsample factors (default: 2)")
+    for p in (video, photos):
+        p.add_argument("--no-train", action="store_true", help="Stop after SfM")
+        p.add_argument("--jobs", type=int, help="Concurrent stages (default: all cores)")
+        p.add_argument("--force", action="append", default=[], help="Re-run this stage even if up to date")
+        p.add_argument("--dry-run", action="store_true", help="Only report which stages are stale")
+    args = parser.parse_args()
+
+    import config
+    original = config.DATASET_PATH / "_source" / "original"
+    if args.workflow == "video":
+        input_video = args.video or next(iter(sorted(original.glob("*.mp4")) + sorted(original.glob("*.insv"))), None)
+        if input_video is None or not input_video.is_file():
+            print(f"[ERROR] No input video in {original}", file=sys.stderr)
+            return 1
+        cameras = [c.strip() for c in args.cameras.split(",") if c.strip()]
+        pipeline = video_pipeline(input_video, args.every_seconds, cameras, train=not args.no_train)
+    else:
+        factors = [int(f) for f in args.factors.split(",") if f.strip()]
+        pipeline = photo_pipeline(args.source or original, factors, train=not args.no_train)
+
+    unknown = set(args.force) - set(pipeline.stages)
+    if unknown:
+        print(f"[ERROR] Unknown stage(s): {', '.join(sorted(unknown))}; stages: {', '.join(pipeline.stages)}",
+              file=sys.stderr)
+        return 1
+    outcome = pipeline.run(jobs=args.jobs, force=set(args.force), dry_run=args.dry_run)
+    width = max(len(name) for name in outcome)
+    for name in pipeline.order():
+        print(f"  {name:<{width}}  {outcome[name]}")
+    return 1 if any(o in ("failed", "blocked") for o in outcome.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Reuse a sparse model built at one image resolution for another resolution.
+
+SfM at quarter resolution is much faster than at full resolution, and the
+poses and 3D points do not depend on the resolution. This writes the model
+for another pyramid level: intrinsics (focal lengths, principal point) and
+2D keypoints are scaled per camera; distortion parameters, poses and points
+are unchanged. COLMAP puts the image origin at the top-left pixel corner, so
+resizing by (sx, sy) maps x -> sx * x exactly, without half-pixel shifts.
+The scale comes from the target images' headers, and the target images are
+linked into the new run, ready for run_3dgrut_train.py.
+
+Example (SfM once at quarter resolution, train at full resolution):
+    python rescale_model.py --to FullSet_FullRes
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+import argparse
+import shutil
+import sys
+
+import numpy as np
+
+from colmap_model import CAMERA_MODELS, ColmapModel, read_model, write_model
+from image_headers import image_size
+from image_staging import stage_images
+
+# Camera models with a single focal length: params start f, cx, cy; all others fx, fy, cx, cy.
+SINGLE_FOCAL_MODELS: set[str] = {"SIMPLE_PINHOLE", "SIMPLE_RADIAL", "RADIAL", "SIMPLE_RADIAL_FISHEYE",
+                                 "RADIAL_FISHEYE"}
+# Tolerated difference between horizontal and vertical scale (rounding of odd image sizes).
+MAX_ANISOTROPY: float = 0.01
+
+
+def scale_model(model: ColmapModel, camera_scales: dict[int, tuple[float, float]],
+                target_sizes: dict[int, tuple[int, int]]) -> ColmapModel:
+    """Model for images resized by camera_scales[camera_id] = (sx, sy) to target_sizes[camera_id]."""
+    cameras = model.cameras
+    params = cameras.params.copy()
+    widths, heights = cameras.widths.copy(), cameras.heights.copy()
+    for i, camera_id in enumerate(cameras.ids.tolist()):
+        sx, sy = camera_scales[camera_id]
+        if CAMERA_MODELS[int(cameras.model_ids[i])][0] in SINGLE_FOCAL_MODELS:
+            params[i, :3] *= ((sx + sy) / 2, sx, sy)
+        else:
+            params[i, :4] *= (sx, sy, sx, sy)
+        widths[i], heights[i] = target_sizes[camera_id]
+
+    images = model.images
+    scale_by_id = np.array([camera_scales[int(c)] for c in images.camera_ids]).reshape(-1, 2)
+    counts = np.diff(images.point2D_offsets)
+    return ColmapModel(
+        cameras=replace(cameras, params=params, widths=widths, heights=heights),
+        images=replace(images, xys=images.xys * np.repeat(scale_by_id, counts, axis=0)),
+        points3D=model.points3D,
+    )
+
+
+def target_scales(model: ColmapModel, image_dir: Path
+                  ) -> tuple[dict[int, tuple[float, float]], dict[int, tuple[int, int]]]:
+    """Per-camera (sx, sy) and target size, from the headers of the target images."""
+    paths = [image_dir / name for name in model.images.names]
+    missing = [p for p in paths if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"{len(missing)} model images missing in {image_dir}, e.g. {missing[0]}")
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        sizes = list(pool.map(image_size, paths))
+
+    cameras = model.cameras
+    source = {int(c): (int(w), int(h)) for c, w, h in zip(cameras.ids, cameras.widths, cameras.heights)}
+    target: dict[int, tuple[int, int]] = {}
+    for camera_id, size, name in zip(model.images.camera_ids.tolist(), sizes, model.images.names):
+        if target.setdefault(camera_id, size) != size:
+            raise ValueError(f"Images of camera {camera_id} have different sizes in {image_dir} "
+                             f"({target[camera_id]} vs {size} for {name})")
+    scales = {}
+    for camera_id, (width, height) in target.items():
+        sx, sy = width / source[camera_id][0], height / source[camera_id][1]
+        if abs(sx / sy - 1) > MAX_ANISOTROPY:
+            raise ValueError(f"Camera {camera_id}: {source[camera_id]} -> {(width, height)} is not a uniform resize")
+        scales[camera_id] = (sx, sy)
+    return scales, target
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rescale a COLMAP sparse model to another image resolution")
+    parser.add_argument("--to", dest="variant", help="Target data variant, e.g. FullSet_FullRes "
+                        "(images from _source/colmap_images/<variant>, output colmap_runs/<variant>)")
+    parser.add_argument("--src-run", help="Run with the sparse/0 to rescale (default: config.py data variant)")
+    parser.add_argument("--images", help="Target image directory (overrides --to)")
+    parser.add_argument("--out", help="Output run directory (overrides --to)")
+    args = parser.parse_args()
+
+    import config
+    src_run = Path(args.src_run).expanduser() if args.src_run else \
+        config.DATASET_PATH / "colmap_runs" / config.DATA_VARIANT
+    if args.variant is None and (args.images is None or args.out is None):
+        parser.error("give --to, or both --images and --out")
+    image_dir = Path(args.images).expanduser() if args.images else \
+        config.DATASET_PATH / "_source" / "colmap_images" / args.variant
+    out_run = Path(args.out).expanduser() if args.out else config.DATASET_PATH / "colmap_runs" / args.variant
+    if out_run.resolve() == src_run.resolve():
+        print("[ERROR] Output run must differ from the source run", file=sys.stderr)
+        return 1
+
+    model = read_model(src_run / "sparse" / "0")
+    scales, sizes = target_scales(model, image_dir)
+    for camera_id, (sx, sy) in scales.items():
+        print(f"[INFO] Camera {camera_id}: scale {sx:.4f} x {sy:.4f} -> {sizes[camera_id][0]}x{sizes[camera_id][1]}")
+
+    out_model = out_run / "sparse" / "0"
+    if out_model.exists():
+        shutil.rmtree(out_model)
+    write_model(scale_model(model, scales, sizes), out_model)
+    stage_images(image_dir, out_run / "images", names=model.images.names)
+    print(f"[INFO] Wrote {out_model} ({model.stats(out_model).describe()}) from {src_run}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
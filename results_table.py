@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Comparison tables from the run logs written by the pipeline scripts.
+
+Reads run_log.jsonl files (see telemetry.py) and prints one Markdown table per
+dataset and script: a row per run with the wall time of every stage, the
+total, CPU time, peak RSS and bytes read/written, replacing the hand-written
+timings in results.md.
+
+    python results_table.py                                  # config.py dataset
+    python results_table.py a/run_log.jsonl b/run_log.jsonl --script colmap --out results_generated.md
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+import argparse
+import json
+import sys
+
+from telemetry import run_log_path
+
+# Record keys tried in order for the label of a run.
+LABEL_KEYS: tuple[str, ...] = ("experiment_name", "run_dir", "variant", "input")
+
+
+@dataclass
+class Run:
+    run_id: str
+    script: str
+    dataset: str
+    start: str
+    label: str
+    stages: list[dict] = field(default_factory=list)
+
+    @property
+    def status(self) -> str:
+        failed = [s["status"] for s in self.stages if s.get("status", "ok") != "ok"]
+        return failed[0] if failed else "ok"
+
+    def total(self, key: str) -> float:
+        return sum(float(s.get(key) or 0.0) for s in self.stages)
+
+    def peak_rss_mb(self) -> float:
+        return max((float(s.get("peak_rss_mb") or 0.0) for s in self.stages), default=0.0)
+
+
+def read_run_logs(paths: list[Path]) -> list[dict]:
+    """Records of all logs; unreadable lines (e.g. from an interrupted write) are skipped."""
+    records = []
+    for path in paths:
+        with open(path) as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"[WARN] Skipping malformed line {line_no} of {path}", file=sys.stderr)
+    return records
+
+
+def group_runs(records: list[dict]) -> list[Run]:
+    """Stage records grouped by run, in order of start time."""
+    runs: dict[str, Run] = {}
+    for record in records:
+        run = runs.get(record["run_id"])
+        if run is None:
+            label = next((str(record[key]) for key in LABEL_KEYS if record.get(key)), "")
+            if label.startswith("/"):
+                label = Path(label).name
+            run = runs[record["run_id"]] = Run(record["run_id"], record.get("script", "?"),
+                                               record.get("dataset", ""), record.get("start", ""), label)
+        run.stages.append(record)
+    return sorted(runs.values(), key=lambda run: run.start)
+
+
+def _duration(seconds: float) -> str:
+    return f"{seconds / 60:.3f} min" if seconds >= 60 else f"{seconds:.2f} s"
+
+
+def _size(mb: float) -> str:
+    return f"{mb / 1024:.2f} GB" if mb >= 1024 else f"{mb:.0f} MB"
+
+
+def markdown_tables(runs: list[Run]) -> str:
+    """One table per (dataset, script), one row per run."""
+    lines: list[str] = []
+    groups: dict[tuple[str, str], list[Run]] = {}
+    for run in runs:
+        groups.setdefault((run.dataset, run.script), []).append(run)
+
+    current_dataset = None
+    for (dataset, script), group in groups.items():
+        if dataset != current_dataset:
+            lines += [f"# {dataset or 'Unknown dataset'}", ""]
+            current_dataset = dataset
+        stage_names: list[str] = []
+        for run in group:
+            for stage in run.stages:
+                if stage["stage"] not in stage_names:
+                    stage_names.append(stage["stage"])
+        header = ["Run", "Started", *stage_names, "Total", "CPU", "Peak RSS", "Read", "Written", "Status"]
+        lines += [f"## {script}", "", "| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+        for run in group:
+            wall = {name: 0.0 for name in stage_names}
+            for stage in run.stages:
+                wall[stage["stage"]] += float(stage.get("wall_s") or 0.0)
+            has_stage = {stage["stage"] for stage in run.stages}
+            row = [
+                run.label or run.run_id,
+                run.start.replace("T", " "),
+                *(_duration(wall[name]) if name in has_stage else "" for name in stage_names),
+                _duration(run.total("wall_s")),
+                _duration(run.total("cpu_s")),
+                _size(run.peak_rss_mb()),
+                _size(run.total("read_mb")),
+                _size(run.total("write_mb")),
+                run.status,
+            ]
+            lines.append("| " + " | ".join(row) + " |")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Comparison tables from pipeline run logs")
+    parser.add_argument("logs", nargs="*", type=Path, help="run_log.jsonl files (default: config.py dataset)")
+    parser.add_argument("--script", help="Only scripts whose name starts with this")
+    parser.add_argument("--last", type=int, help="Only the last N runs")
+    parser.add_argument("--out", type=Path, help="Write the tables to this file instead of stdout")
+    args = parser.parse_args()
+
+    paths = args.logs or [run_log_path()]
+    missing = [p for p in paths if p is None or not p.is_file()]
+    if missing:
+        print(f"[ERROR] Run log not found: {missing[0]}", file=sys.stderr)
+        return 1
+    runs = group_runs(read_run_logs(paths))
+    if args.script:
+        runs = [run for run in runs if run.script.startswith(args.script)]
+    if args.last:
+        runs = runs[-args.last:]
+    text = markdown_tables(runs)
+    if args.out:
+        args.out.write_text(text)
+        print(f"[INFO] Wrote {len(runs)} runs to {args.out}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
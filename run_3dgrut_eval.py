@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import subprocess
+import re
 import sys
 from config import DATASET_ROOT, DATASET_NAME, DATASET_PATH, DATA_VARIANT
+from metrics_store import run_and_record
 
 # ===== User-configurable parameters =====
 TEST_NAME: str = "FullSet_QuarterRes-1009_145116"
@@ -11,6 +12,17 @@ CHECKPOINT: str = str(DATASET_PATH / "3dgrut_runs" / DATA_VARIANT / TEST_NAME /
 OUT_DIR: str = str(DATASET_PATH / "3dgrut_runs" / DATA_VARIANT / "eval")
 # =======================================
 
+# 3DGRUT names a training run <experiment_name>-<DDMM_HHMMSS>.
+RUN_SUFFIX_RE = re.compile(r"-\d{4}_\d{6}$")
+
+
+def experiment_name(checkpoint: Path) -> str:
+    """Experiment name the training run of checkpoint was recorded under (see run_3dgrut_train.py)."""
+    for parent in checkpoint.parents:
+        if RUN_SUFFIX_RE.search(parent.name):
+            return RUN_SUFFIX_RE.sub("", parent.name)
+    return checkpoint.parent.name
+
 
 def main() -> None:
     project_dir: Path = Path.home() / "Research" / "gaussian-splats" / "3dgrut"
@@ -32,12 +44,16 @@ def main() -> None:
     )
 
     try:
-        result = subprocess.run(
+        # Output is echoed and PSNR/SSIM/LPIPS go to the metrics store (METRICS_DB)
+        returncode, _ = run_and_record(
             ["bash", "-lc", train_cmd],
             cwd=project_dir,
-            check=False,
+            kind="eval",
+            # Same experiment as the training run, so compare/results_table pair them up.
+            experiment=experiment_name(Path(CHECKPOINT)),
+            config={"test_name": TEST_NAME, "checkpoint": CHECKPOINT, "steps": STEPS, "fisheye_mode": True},
         )
-        sys.exit(result.returncode)
+        sys.exit(returncode)
     except FileNotFoundError:
         print("Error: bash not found on this system.", file=sys.stderr)
         sys.exit(1)
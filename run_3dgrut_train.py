@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 from pathlib import Path
-import subprocess
+import argparse
 import sys
+import time
 from config import DATASET_ROOT, DATASET_NAME, DATASET_PATH, DATA_VARIANT
+from early_stopping import EarlyStopper, PlateauDetector
+from metrics_store import run_and_record
+from telemetry import RunLog
 
 # ===== User-configurable parameters =====
 DATA_PATH: str = str(DATASET_PATH / "colmap_runs" / DATA_VARIANT)
@@ -10,15 +14,71 @@ OUT_DIR: str = str(DATASET_PATH / "3dgrut_runs")
 EXPERIMENT_NAME: str = f"{DATA_VARIANT}"
 DOWNSAMPLE_FACTOR: int = 1
 ITERATIONS: int = 100000
+# Stop once the metric improves by less than EARLY_STOP_TOLERANCE (relative) between two
+# EARLY_STOP_WINDOW-step windows, after the next checkpoint/PLY export. Enabled with --early-stop.
+EARLY_STOP_METRIC: str = "loss"
+EARLY_STOP_MODE: str = "min"          # "max" for psnr/ssim
+EARLY_STOP_WINDOW: int = 5000
+EARLY_STOP_TOLERANCE: float = 0.005
+EARLY_STOP_MIN_STEPS: int = 30000
 # =======================================
 
 
+def saved_since(out_dir: Path, experiment_name: str, since: float) -> list[Path]:
+    """Checkpoints (*.pt) and PLY exports of the experiment's runs written after since, oldest first."""
+    files = [path for run in out_dir.glob(f"{experiment_name}-*") for pattern in ("*.pt", "*.ply")
+             for path in run.rglob(pattern) if path.stat().st_mtime >= since]
+    return sorted(files, key=lambda path: path.stat().st_mtime)
+
+
+def last_run_marker(out_dir: Path, experiment_name: str) -> Path:
+    """File naming the newest <experiment_name>-<DDMM_HHMMSS> run directory 3DGRUT wrote (pipeline.py output)."""
+    return out_dir / f"{experiment_name}.last_run"
+
+
+def record_last_run(out_dir: Path, experiment_name: str, since: float) -> Path | None:
+    """Write the last_run_marker for the run that saved the newest file after since; None if nothing was saved."""
+    saved = saved_since(out_dir, experiment_name, since)
+    if not saved:
+        return None
+    run_dir = out_dir / saved[-1].relative_to(out_dir).parts[0]
+    last_run_marker(out_dir, experiment_name).write_text(f"{run_dir}\n")
+    return run_dir
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser(description="Train 3DGRUT on a COLMAP run")
+    parser.add_argument("--run", help="COLMAP run directory to train on instead of DATA_PATH "
+                                      "(e.g. a filter_points.py or rescale_model.py variant)")
+    parser.add_argument("--subset", help="Train on an image subset (image_subsets.py directory or image list) "
+                                         "of the run, reusing its sparse model")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help=f"Training steps (default: {ITERATIONS})")
+    parser.add_argument("--downsample-factor", type=int, default=DOWNSAMPLE_FACTOR,
+                        help=f"dataset.downsample_factor (default: {DOWNSAMPLE_FACTOR})")
+    parser.add_argument("--early-stop", action="store_true",
+                        help="Stop after the next checkpoint once the loss plateaus (default: train all --iterations)")
+    args = parser.parse_args()
+
     project_dir: Path = Path.home() / "Research" / "gaussian-splats" / "3dgrut"
     if not project_dir.is_dir():
         print(f"Error: Directory not found: {project_dir}", file=sys.stderr)
         sys.exit(1)
 
+    data_path, experiment_name = DATA_PATH, EXPERIMENT_NAME
+    if args.run:
+        data_path = str(Path(args.run).expanduser())
+        experiment_name = Path(data_path).name
+    if args.subset:
+        from image_subsets import load_subset, make_subset_run
+        subset = load_subset(Path(args.subset).expanduser())
+        data_path = str(make_subset_run(Path(data_path), subset))
+        experiment_name = f"{experiment_name}__{subset.name}"
+    # Sweeps over these (experiment_queue.py) get one experiment per value.
+    if args.iterations != ITERATIONS:
+        experiment_name = f"{experiment_name}__{args.iterations}it"
+    if args.downsample_factor != DOWNSAMPLE_FACTOR:
+        experiment_name = f"{experiment_name}__ds{args.downsample_factor}"
+
     # Use login shell (-l) semantics to ensure ~/.bashrc is sourced, then source conda.sh explicitly.
     # This makes conda activation reliable even when launched from other environments (e.g., uv).
     train_cmd = (
@@ -26,23 +86,62 @@ def main() -> None:
         'conda activate 3dgrut && '
         'python train.py '
         '--config-name apps/colmap_3dgut.yaml '
-        f'path={DATA_PATH} '
+        f'path={data_path} '
         f'out_dir={OUT_DIR} '
-        f'experiment_name={EXPERIMENT_NAME} '
-        f'dataset.downsample_factor={DOWNSAMPLE_FACTOR} '
+        f'experiment_name={experiment_name} '
+        f'dataset.downsample_factor={args.downsample_factor} '
         'export_ply.enabled=true '
         'test_last=false '
         f'model.default_density=1.0 '
-        f'n_iterations={ITERATIONS}'        
+        f'n_iterations={args.iterations}'        
     )
 
+    stopper = None
+    if args.early_stop:
+        stopper = EarlyStopper(PlateauDetector(metric=EARLY_STOP_METRIC, mode=EARLY_STOP_MODE,
+                                               window=EARLY_STOP_WINDOW, tolerance=EARLY_STOP_TOLERANCE,
+                                               min_step=EARLY_STOP_MIN_STEPS))
+
+    # Wall/CPU time, peak RSS and I/O of the training go to run_log.jsonl (RUN_LOG)
+    log = RunLog("run_3dgrut_train", dataset=DATASET_NAME, variant=DATA_VARIANT, data_path=data_path,
+                 experiment_name=experiment_name, downsample_factor=args.downsample_factor, n_iterations=args.iterations)
+    started = time.time()
     try:
-        result = subprocess.run(
-            ["bash", "-lc", train_cmd],
-            cwd=project_dir,
-            check=False,
-        )
-        sys.exit(result.returncode)
+        with log.stage("train") as info:
+            # Output is echoed and it/s, loss and PSNR/SSIM/LPIPS go to the metrics store (METRICS_DB)
+            returncode, info["metrics_run_id"] = run_and_record(
+                ["bash", "-lc", train_cmd],
+                cwd=project_dir,
+                kind="train",
+                experiment=experiment_name,
+                config={"data_path": data_path, "config_name": "apps/colmap_3dgut.yaml",
+                        "downsample_factor": args.downsample_factor, "n_iterations": args.iterations,
+                        "early_stop": None if stopper is None else
+                        f"{EARLY_STOP_METRIC}/{EARLY_STOP_WINDOW}/{EARLY_STOP_TOLERANCE}"},
+                stopper=stopper,
+            )
+            info["returncode"] = returncode
+            if stopper is not None and stopper.stop_step is not None:
+                # Interrupted by us after a checkpoint line: a successful run only if the save is on disk.
+                info["plateau_step"], info["stopped_step"] = stopper.plateau_step, stopper.stop_step
+                saved = saved_since(Path(OUT_DIR), experiment_name, started)
+                if saved:
+                    info["checkpoint"] = str(saved[-1])
+                    returncode = 0
+                else:
+                    print(f"[ERROR] Stopped early, but no checkpoint or PLY of {experiment_name} "
+                          f"was written to {OUT_DIR}", file=sys.stderr)
+            if returncode == 0:
+                run_dir = record_last_run(Path(OUT_DIR), experiment_name, started)
+                if run_dir is not None:
+                    info["run_dir"] = str(run_dir)
+                else:
+                    print(f"[ERROR] Training finished, but no checkpoint or PLY of {experiment_name} "
+                          f"was written to {OUT_DIR}", file=sys.stderr)
+                    returncode = 1
+            if returncode != 0:
+                info["status"] = "failed"
+        sys.exit(returncode)
     except FileNotFoundError:
         print("Error: bash not found on this system.", file=sys.stderr)
         sys.exit(1)
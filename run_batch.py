@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Process many datasets in parallel.
+
+Every selected dataset of the registry (datasets.py) is processed by its
+type's default command (pipeline.py photos/video, colmap_sfm_skybox.py) or
+by the command given after `--`, run with DATASET=<name> so config.py points
+at that dataset. Output goes to <dataset>/batch_logs/<time>_<script>.log.
+GPU stages of concurrent pipeline.py runs still take turns on the GPU.
+
+    python run_batch.py --list
+    python run_batch.py 'YJP-*_250828-*' --jobs 3
+    python run_batch.py --type SonyA7Mk4 -- colmap_sfm_pinhole.py
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from datasets import DATASET_TYPES, Dataset, load_registry, select_datasets
+
+REPO_DIR: Path = Path(__file__).resolve().parent
+DEFAULT_JOBS: int = 2
+
+
+def run_dataset(dataset: Dataset, command: list[str] | None = None) -> tuple[int, float, Path]:
+    """Run a repository script for one dataset. Returns (exit code, seconds, log path)."""
+    command = command or dataset.command
+    log_dir = dataset.path / "batch_logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    log_path = log_dir / f"{datetime.now():%Y%m%d_%H%M%S}_{Path(command[0]).stem}.log"
+    argv = [sys.executable, *command] if command[0].endswith(".py") else command
+    start = time.monotonic()
+    with open(log_path, "w") as log:
+        log.write(f"# {' '.join(argv)}  (DATASET={dataset.name}, DATASET_ROOT={dataset.root})\n")
+        log.flush()
+        # config.py in the child resolves DATASET against DATASET_ROOT, so pass the selected root along.
+        env = {**os.environ, "DATASET": dataset.name, "DATASET_ROOT": str(dataset.root)}
+        try:
+            returncode = subprocess.run(argv, cwd=REPO_DIR, env=env,
+                                        stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT).returncode
+        except OSError as exc:
+            log.write(f"[ERROR] Could not start: {exc}\n")
+            returncode = -1
+    return returncode, time.monotonic() - start, log_path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the pipeline (or a script) for many datasets in parallel")
+    parser.add_argument("patterns", nargs="*", help="Dataset name globs (default: all registered datasets)")
+    parser.add_argument("--type", action="append", choices=sorted(DATASET_TYPES), help="Only datasets of this type")
+    parser.add_argument("--root", type=Path, help="Dataset root (default: config.py DATASET_ROOT)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help=f"Datasets at a time (default: {DEFAULT_JOBS})")
+    parser.add_argument("--list", action="store_true", help="Only list the selected datasets")
+    argv = sys.argv[1:]
+    command = None
+    if "--" in argv:
+        command, argv = argv[argv.index("--") + 1:], argv[:argv.index("--")]
+    args = parser.parse_args(argv)
+
+    if args.root is None:
+        import config
+        args.root = config.DATASET_ROOT
+    datasets = select_datasets(load_registry(args.root), args.patterns, args.type)
+    if not datasets:
+        print("[ERROR] No datasets selected", file=sys.stderr)
+        return 1
+    if args.list:
+        for dataset in datasets:
+            print(f"{dataset.name:<40} {' '.join(command or dataset.command)}")
+        return 0
+
+    missing = [d for d in datasets if not d.path.is_dir()]
+    for dataset in missing:
+        print(f"[WARN] Skipping {dataset.name}: {dataset.path} not found")
+    datasets = [d for d in datasets if d.path.is_dir()]
+    print(f"[INFO] Processing {len(datasets)} datasets, {args.jobs} at a time")
+
+    def run(dataset: Dataset) -> tuple[int, float, Path]:
+        print(f"[INFO] Started {dataset.name}")
+        result = run_dataset(dataset, command)
+        level = "INFO" if result[0] == 0 else "ERROR"
+        print(f"[{level}] {dataset.name}: exit {result[0]} after {result[1] / 60:.1f} min (log: {result[2]})")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        results = list(pool.map(run, datasets))
+    failed = [d.name for d, (code, _, _) in zip(datasets, results) if code != 0]
+    print(f"[INFO] {len(datasets) - len(failed)} of {len(datasets)} datasets succeeded"
+          + (f"; failed: {', '.join(failed)}" if failed else ""))
+    return 1 if failed or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Face selection, downsampling and side-face stitching for Matterport skyboxes.
+
+Each pano comes as six 90 degree cube faces, <pano>_skybox0..5: 0 looks up,
+5 looks down, 1-4 look around the horizon. colmap_sfm_skybox.py uses this to
+feed COLMAP fewer images:
+
+- SKYBOX_FACES keeps only the listed faces at full resolution,
+- SKYBOX_DOWNSAMPLE adds faces at reduced resolution (e.g. "0:2,5:2"),
+- SKYBOX_STITCH=n replaces the side faces by n wider pinhole views per pano,
+  resampled from the cube with a precomputed lookup table (one cv2.remap per
+  view), so neighbouring faces' content lands in one image.
+
+Derived images are written once into a cache directory and staged with the
+kept faces; each group gets its own folder (and so its own COLMAP camera).
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+import os
+import re
+
+import numpy as np
+
+from image_headers import image_size
+
+ALL_FACES: tuple[int, ...] = (0, 1, 2, 3, 4, 5)
+SIDE_FACES: tuple[int, ...] = (1, 2, 3, 4)
+# Yaw between consecutive side faces; use -90 if faces 1-4 run counter-clockwise seen from above.
+SIDE_FACE_YAW_STEP_DEG: float = 90.0
+# Extra horizontal field of view per stitched view, shared with its neighbours.
+STITCH_OVERLAP_DEG: float = 20.0
+DOWNSAMPLED_DIR: str = "lowres"
+STITCHED_DIR: str = "stitched"
+WORKERS: int = min(16, os.cpu_count() or 1)
+
+_FACE_RE = re.compile(r"^(?P<pano>.+)_skybox(?P<face>[0-5])$")
+
+
+@dataclass
+class SkyboxPlan:
+    faces: tuple[int, ...] = ALL_FACES             # faces staged at full resolution
+    downsample: dict[int, int] = field(default_factory=dict)  # face -> factor
+    stitch_views: int = 0                          # stitched side views per pano (0 = off)
+    stitch_hfov_deg: float | None = None           # default: 360 / n + STITCH_OVERLAP_DEG
+
+    @property
+    def is_default(self) -> bool:
+        return self.faces == ALL_FACES and not self.downsample and not self.stitch_views
+
+    def describe(self) -> str:
+        parts = [f"faces {','.join(map(str, self.faces)) or 'none'}"]
+        if self.downsample:
+            parts.append("downsampled " + ",".join(f"{f}:1/{k}" for f, k in sorted(self.downsample.items())))
+        if self.stitch_views:
+            parts.append(f"{self.stitch_views} stitched side views of {self.hfov_deg():.0f} deg")
+        return "; ".join(parts)
+
+    def hfov_deg(self) -> float:
+        if self.stitch_hfov_deg is not None:
+            return self.stitch_hfov_deg
+        return min(170.0, 360.0 / max(1, self.stitch_views) + STITCH_OVERLAP_DEG)
+
+
+def plan_from_env() -> SkyboxPlan:
+    """SkyboxPlan from SKYBOX_FACES, SKYBOX_DOWNSAMPLE, SKYBOX_STITCH and SKYBOX_STITCH_HFOV."""
+    stitch = int(os.environ.get("SKYBOX_STITCH", "0"))
+    faces_env = os.environ.get("SKYBOX_FACES")
+    if faces_env is not None:
+        faces = tuple(sorted({int(f) for f in faces_env.replace(" ", "").split(",") if f}))
+    else:
+        faces = tuple(f for f in ALL_FACES if not (stitch and f in SIDE_FACES))
+    downsample = {}
+    for item in os.environ.get("SKYBOX_DOWNSAMPLE", "").replace(" ", "").split(","):
+        if item:
+            face, factor = item.split(":")
+            downsample[int(face)] = int(factor)
+    if any(f not in ALL_FACES for f in (*faces, *downsample)):
+        raise ValueError("Skybox faces are numbered 0-5")
+    hfov = os.environ.get("SKYBOX_STITCH_HFOV")
+    return SkyboxPlan(
+        faces=tuple(f for f in faces if f not in downsample),
+        downsample=downsample,
+        stitch_views=stitch,
+        stitch_hfov_deg=float(hfov) if hfov else None,
+    )
+
+
+def parse_skybox_name(name: str) -> tuple[str, int] | None:
+    """(pano name, face) for '<pano>_skybox<face>.<ext>', else None."""
+    match = _FACE_RE.match(Path(name).stem)
+    if match is None:
+        return None
+    return str(Path(name).parent / match["pano"]), int(match["face"])
+
+
+def face_rotations() -> np.ndarray:
+    """Camera-to-world rotations of the six faces, (6, 3, 3).
+
+    World axes: x right, y down, z forward (face 1). Columns are the face
+    camera's x (image right), y (image down) and z (viewing direction).
+    The top and bottom faces have their image edge towards face 1 at the
+    bottom and top respectively (the usual cube-map layout).
+    """
+    rotations = np.empty((6, 3, 3))
+    rotations[0] = np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]], dtype=float).T
+    rotations[5] = np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]], dtype=float).T
+    for k, face in enumerate(SIDE_FACES):
+        yaw = np.deg2rad(k * SIDE_FACE_YAW_STEP_DEG)
+        rotations[face] = _yaw_rotation(yaw)
+    return rotations
+
+
+def _yaw_rotation(yaw: float) -> np.ndarray:
+    """Rotation turning the forward axis (z) towards x by yaw radians."""
+    c, s = np.cos(yaw), np.sin(yaw)
+    return np.array([[c, 0, s], [0, 1, 0], [-s, 0, c]])
+
+
+def stitch_lut(face_size: int, yaw_deg: float, hfov_deg: float, vfov_deg: float = 90.0
+               ) -> tuple[np.ndarray, np.ndarray, tuple[int, ...]]:
+    """Lookup table of a pinhole view at yaw_deg into a vertical atlas of cube faces.
+
+    The view keeps the faces' focal length (face_size / 2). Returns float32
+    map_x, map_y for cv2.remap and the faces used, in atlas order.
+    """
+    focal = face_size / 2
+    width = int(round(2 * focal * np.tan(np.deg2rad(hfov_deg) / 2)))
+    height = int(round(2 * focal * np.tan(np.deg2rad(vfov_deg) / 2)))
+    u = (np.arange(width) + 0.5 - width / 2) / focal
+    v = (np.arange(height) + 0.5 - height / 2) / focal
+    rays = np.stack(np.broadcast_arrays(u[None, :], v[:, None], 1.0), axis=-1)   # (h, w, 3)
+    dirs = rays @ _yaw_rotation(np.deg2rad(yaw_deg)).T
+
+    rotations = face_rotations()
+    forwards = rotations[:, :, 2]                                   # (6, 3)
+    face = np.argmax(dirs @ forwards.T, axis=-1)                    # dominant cube face per pixel
+    used = tuple(int(f) for f in np.flatnonzero(np.bincount(face.ravel(), minlength=6)))
+    fu = np.empty(face.shape)
+    fv = np.empty(face.shape)
+    for f in used:
+        cam = dirs @ rotations[f]                                   # world -> face camera
+        mask = face == f
+        fu[mask] = (cam[..., 0] / cam[..., 2])[mask]
+        fv[mask] = (cam[..., 1] / cam[..., 2])[mask]
+    fu = fu * (face_size / 2) + face_size / 2 - 0.5
+    fv = fv * (face_size / 2) + face_size / 2 - 0.5
+
+    slot = np.zeros(6, dtype=np.int64)
+    slot[list(used)] = np.arange(len(used))
+    slot = slot[face]
+    # Clamp inside each face so bilinear sampling never blends atlas neighbours.
+    map_x = np.clip(fu, 0, face_size - 1).astype(np.float32)
+    map_y = (slot * face_size + np.clip(fv, 0, face_size - 1)).astype(np.float32)
+    return map_x, map_y, used
+
+
+def group_panos(names: list[str]) -> dict[str, dict[int, str]]:
+    """pano -> {face: image name} for the skybox images among names."""
+    panos: dict[str, dict[int, str]] = {}
+    for name in names:
+        parsed = parse_skybox_name(name)
+        if parsed is not None:
+            panos.setdefault(parsed[0], {})[parsed[1]] = name
+    return panos
+
+
+def _downsample(src: Path, dst: Path, factor: int) -> None:
+    import cv2
+    reduced = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+    if factor in reduced:
+        # libjpeg scales while decoding: much cheaper than decode + resize.
+        image = cv2.imread(str(src), reduced[factor])
+    else:
+        image = cv2.imread(str(src), cv2.IMREAD_COLOR)
+        if image is not None:
+            image = cv2.resize(image, (image.shape[1] // factor, image.shape[0] // factor),
+                               interpolation=cv2.INTER_AREA)
+    if image is None:
+        raise OSError(f"Could not read {src}")
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    cv2.imwrite(str(dst), image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+
+def prepare_skybox_images(
+    image_dir: Path,
+    cache_dir: Path,
+    plan: SkyboxPlan,
+    names: list[str],
+) -> tuple[list[str], dict[str, Path]]:
+    """Staged image names and the sources of derived ones, for stage_images.
+
+    Full-resolution faces keep their names; downsampled faces go to lowres/
+    and stitched views to stitched/<pano>_view<k>.jpg. Derived images are
+    cached in cache_dir per factor / view setup and reused on later runs.
+    Non-skybox images pass through unchanged.
+    """
+    panos = group_panos(names)
+    staged: list[str] = [name for name in names if parse_skybox_name(name) is None]
+    sources: dict[str, Path] = {}
+    downsample_jobs: list[tuple[Path, Path, int]] = []
+    for faces in panos.values():
+        for face, name in sorted(faces.items()):
+            if face in plan.faces:
+                staged.append(name)
+            elif face in plan.downsample:
+                derived = f"{DOWNSAMPLED_DIR}/{name}"
+                staged.append(derived)
+                sources[derived] = cache_dir / f"{DOWNSAMPLED_DIR}_{plan.downsample[face]}" / name
+                if not sources[derived].exists():
+                    downsample_jobs.append((image_dir / name, sources[derived], plan.downsample[face]))
+
+    stitch_jobs: list[tuple[str, dict[int, str]]] = []
+    stitch_cache = cache_dir / f"{STITCHED_DIR}_{plan.stitch_views}x{plan.hfov_deg():g}"
+    if plan.stitch_views:
+        for pano, faces in panos.items():
+            if not all(face in faces for face in ALL_FACES):
+                print(f"[WARN] {pano} does not have all six faces; not stitched")
+                continue
+            for k in range(plan.stitch_views):
+                derived = f"{STITCHED_DIR}/{pano}_view{k}.jpg"
+                staged.append(derived)
+                sources[derived] = stitch_cache / f"{pano}_view{k}.jpg"
+            if not all(sources[f"{STITCHED_DIR}/{pano}_view{k}.jpg"].exists() for k in range(plan.stitch_views)):
+                stitch_jobs.append((pano, faces))
+
+    if downsample_jobs or stitch_jobs:
+        print(f"[INFO] Writing {len(downsample_jobs)} downsampled faces and stitched views for "
+              f"{len(stitch_jobs)} panos into {cache_dir}")
+    # One lookup table per face size and view, shared by all panos.
+    luts: dict[int, list[tuple[np.ndarray, np.ndarray, tuple[int, ...]]]] = {}
+    for pano, faces in stitch_jobs:
+        size = image_size(image_dir / faces[SIDE_FACES[0]])[0]
+        if size not in luts:
+            luts[size] = [stitch_lut(size, 45.0 + k * 360.0 / plan.stitch_views, plan.hfov_deg())
+                          for k in range(plan.stitch_views)]
+
+    def stitch(pano: str, faces: dict[int, str]) -> None:
+        import cv2
+        images = {face: cv2.imread(str(image_dir / name), cv2.IMREAD_COLOR) for face, name in faces.items()}
+        for face, image in images.items():
+            if image is None:
+                raise OSError(f"Could not read {image_dir / faces[face]}")
+        for k, (map_x, map_y, used) in enumerate(luts[images[SIDE_FACES[0]].shape[0]]):
+            atlas = np.concatenate([images[face] for face in used], axis=0)
+            view = cv2.remap(atlas, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+            dst = sources[f"{STITCHED_DIR}/{pano}_view{k}.jpg"]
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            cv2.imwrite(str(dst), view, [cv2.IMWRITE_JPEG_QUALITY, 95])
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        futures = [pool.submit(_downsample, *job) for job in downsample_jobs]
+        futures += [pool.submit(stitch, *job) for job in stitch_jobs]
+        for future in futures:
+            future.result()
+    return sorted(staged), sources
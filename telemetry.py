@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and resource telemetry for the pipeline scripts.
+
+Entry points open a RunLog and wrap their stages in `with log.stage(name):`.
+Every stage appends one JSON line to run_log.jsonl in the dataset directory
+(RUN_LOG overrides the path, RUN_LOG=0 turns logging off) with wall time,
+CPU time, peak RSS and bytes read/written. CPU time comes from getrusage and
+I/O from /proc/self/io; both include subprocesses (COLMAP, ffmpeg, training)
+once they have been waited for. Peak RSS is sampled from /proc every
+SAMPLE_INTERVAL_S over the script and all its descendants, summed, so
+parallel extraction shards or mapper chunks count together.
+
+results_table.py turns the log into results.md-style tables.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+import json
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+import uuid
+
+RUN_LOG_NAME: str = "run_log.jsonl"
+SAMPLE_INTERVAL_S: float = 0.5
+_PAGE_BYTES: int = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_MB: float = 1024 * 1024
+
+
+def run_log_path(dataset_dir: Path | None = None) -> Path | None:
+    """RUN_LOG, or run_log.jsonl in dataset_dir (default: the config.py dataset); None with RUN_LOG=0."""
+    location = os.environ.get("RUN_LOG", "")
+    if location == "0":
+        return None
+    if location:
+        return Path(location).expanduser()
+    if dataset_dir is None:
+        import config
+        dataset_dir = config.DATASET_PATH
+    return dataset_dir / RUN_LOG_NAME
+
+
+def _read_proc_io() -> dict[str, int]:
+    try:
+        with open("/proc/self/io") as f:
+            return {key: int(value) for key, value in (line.split(":") for line in f)}
+    except OSError:
+        return {}
+
+
+def _cpu_seconds() -> float:
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def _descendants(root: int) -> list[int]:
+    """Pids of all live descendants of root, from the parent pids in /proc/<pid>/stat."""
+    children: dict[int, list[int]] = {}
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; fields after it are space separated.
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+    found, stack = [], [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_BYTES
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _peak_rss_bytes(pid: int | str = "self") -> int:
+    """VmHWM (peak resident set size) of a process."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class _RssSampler(threading.Thread):
+    """Peak memory of this process and its descendants while running.
+
+    The peak is the largest summed RSS seen in a sample, or the largest
+    single-process peak (VmHWM), which also covers spikes between samples.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_S):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def sample(self) -> None:
+        pid = os.getpid()
+        children = _descendants(pid)
+        total = _rss_bytes(pid) + sum(_rss_bytes(child) for child in children)
+        self.peak = max(self.peak, total, *(_peak_rss_bytes(child) for child in children))
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        self.sample()
+        return self.peak
+
+
+class RunLog:
+    """Stage records of one script invocation, appended to the run log.
+
+    context (e.g. run_dir, variant) is stored with every stage of the run.
+    """
+
+    def __init__(self, script: str, dataset_dir: Path | None = None, **context: object):
+        self.script = script
+        self.path = run_log_path(dataset_dir)
+        self.run_id = uuid.uuid4().hex[:12]
+        self.context = {key: str(value) if isinstance(value, Path) else value for key, value in context.items()}
+
+    def write(self, record: dict) -> None:
+        if self.path is None:
+            return
+        line = json.dumps(record, default=str)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+        except OSError as exc:
+            print(f"[WARN] Could not write run log {self.path}: {exc}; telemetry disabled", file=sys.stderr)
+            self.path = None
+
+    @contextmanager
+    def stage(self, name: str, **fields: object) -> Iterator[dict]:
+        """Time a stage. Yields a dict; keys added to it are stored with the stage record."""
+        extra: dict = dict(fields)
+        try:
+            # Reset this process's VmHWM so the stage's own peak is measured.
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+        sampler = _RssSampler()
+        sampler.start()
+        io_start, cpu_start = _read_proc_io(), _cpu_seconds()
+        started, wall_start = datetime.now(), time.perf_counter()
+        status = "ok"
+        try:
+            yield extra
+        except KeyboardInterrupt:
+            status = "interrupted"
+            raise
+        except SystemExit as exc:
+            status = "ok" if exc.code in (0, None) else "failed"
+            raise
+        except BaseException:
+            status = "failed"
+            raise
+        finally:
+            wall = time.perf_counter() - wall_start
+            peak = max(sampler.stop(), _peak_rss_bytes())
+            io_end = _read_proc_io()
+            delta = {key: io_end.get(key, 0) - io_start.get(key, 0) for key in io_end}
+            self.write({
+                "run_id": self.run_id,
+                "script": self.script,
+                "stage": name,
+                "start": started.isoformat(timespec="seconds"),
+                "host": socket.gethostname(),
+                "status": extra.pop("status", status),
+                "wall_s": round(wall, 3),
+                "cpu_s": round(_cpu_seconds() - cpu_start, 3),
+                "peak_rss_mb": round(peak / _MB, 1),
+                "read_mb": round(delta.get("rchar", 0) / _MB, 1),
+                "write_mb": round(delta.get("wchar", 0) / _MB, 1),
+                "disk_read_mb": round(delta.get("read_bytes", 0) / _MB, 1),
+                "disk_write_mb": round(delta.get("write_bytes", 0) / _MB, 1),
+                **self.context,
+                **extra,
+            })
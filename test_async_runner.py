@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Tests for the shared asyncio subprocess runner."""
+
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from async_runner import ProgressDisplay, run_process
+
+# Prints ffmpeg-style -stats progress on stderr, then the frame count on stdout.
+FAKE_FFMPEG = r"""
+import sys, time
+for frame in (5, 10, 15):
+    sys.stderr.write(f"frame=  {frame} fps=30 q=2.0 size=N/A\r")
+    sys.stderr.flush()
+    time.sleep(0.1)
+sys.stderr.write("\n")
+print(15)
+sys.exit(int(sys.argv[1]))
+"""
+
+
+def test_processes_overlap_and_report_progress():
+    async def main():
+        with ProgressDisplay() as display:
+            display.add("front", 15)
+            display.add("back", 15)
+            results = await asyncio.gather(*(
+                run_process([sys.executable, "-c", FAKE_FFMPEG, "0"], label=label, display=display,
+                            progress=re.compile(r"frame=\s*(\d+)")) for label in ("front", "back")))
+            return results, {label: bar.n for label, bar in display._bars.items()}
+
+    start = time.monotonic()
+    results, counts = asyncio.run(main())
+    assert time.monotonic() - start < 0.55  # two 0.3 s children side by side
+    assert [r.stdout.strip() for r in results] == ["15", "15"]
+    assert counts == {"front": 15, "back": 15}
+
+
+def test_failure_carries_stderr_tail():
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        asyncio.run(run_process([sys.executable, "-c", FAKE_FFMPEG, "3"]))
+    assert error.value.returncode == 3 and "frame=  15" in error.value.stderr
+
+
+def test_cancellation_stops_process_group(tmp_path: Path):
+    pids = tmp_path / "pids"
+    # The child starts a grandchild in its group, records both pids and waits.
+    script = (f"import os, subprocess, sys, time\n"
+              f"p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+              f"open({str(pids)!r}, 'w').write(f'{{os.getpid()}} {{p.pid}}')\n"
+              f"time.sleep(60)\n")
+
+    async def main():
+        task = asyncio.create_task(run_process([sys.executable, "-c", script]))
+        while not pids.exists() or not pids.read_text():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    child, grandchild = map(int, pids.read_text().split())
+    time.sleep(0.2)
+    for pid in (child, grandchild):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            continue
+        # A zombie left to init is gone as far as the group is concerned.
+        with open(f"/proc/{pid}/stat") as f:
+            assert f.read().split(") ")[1].startswith("Z")
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Tests for the append mode's camera reuse and mapper options."""
+
+import sqlite3
+from pathlib import Path
+
+from colmap_append import append_extraction_groups, append_mapper_command
+
+
+def make_database(path: Path, images: dict[str, int]) -> Path:
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE images (image_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, "
+                 "camera_id INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO images (name, camera_id) VALUES (?, ?)", images.items())
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_new_images_join_the_model_camera(tmp_path: Path):
+    db_path = make_database(tmp_path / "database.db", {"frame_000001.jpg": 3, "frame_000002.jpg": 3})
+    options = ["--ImageReader.camera_model", "OPENCV_FISHEYE", "--ImageReader.single_camera", "1"]
+    groups = append_extraction_groups(db_path, options, ["frame_000003.jpg", "frame_000004.jpg"])
+    assert groups == [(["frame_000003.jpg", "frame_000004.jpg"],
+                       ["--ImageReader.camera_model", "OPENCV_FISHEYE", "--ImageReader.existing_camera_id", "3"])]
+
+
+def test_per_folder_cameras_and_new_folders(tmp_path: Path):
+    db_path = make_database(tmp_path / "database.db", {"front/a.jpg": 1, "back/a.jpg": 2})
+    options = ["--ImageReader.camera_model", "PINHOLE", "--ImageReader.single_camera_per_folder", "1"]
+    new_names = ["front/b.jpg", "back/b.jpg", "side/b.jpg", "front/c.jpg"]
+    groups = {tuple(names): opts for names, opts in append_extraction_groups(db_path, options, new_names)}
+    assert groups[("front/b.jpg", "front/c.jpg")][-2:] == ["--ImageReader.existing_camera_id", "1"]
+    assert groups[("back/b.jpg",)][-2:] == ["--ImageReader.existing_camera_id", "2"]
+    assert groups[("side/b.jpg",)] == options   # no camera yet: a new one, with the original options
+
+    # Without camera sharing every image gets its own camera.
+    assert append_extraction_groups(db_path, ["--ImageReader.camera_model", "PINHOLE"], ["x.jpg"]) == \
+        [(["x.jpg"], ["--ImageReader.camera_model", "PINHOLE"])]
+
+
+def test_mapper_refines_intrinsics_only_for_new_cameras(tmp_path: Path):
+    fixed = append_mapper_command(tmp_path / "db", tmp_path / "images", tmp_path / "0", tmp_path / "out", False)
+    assert fixed[fixed.index("--Mapper.fix_existing_images") + 1] == "1"
+    assert fixed[fixed.index("--Mapper.ba_refine_focal_length") + 1] == "0"
+    refined = append_mapper_command(tmp_path / "db", tmp_path / "images", tmp_path / "0", tmp_path / "out", True)
+    assert "--Mapper.fix_existing_images" in refined
+    assert not any(arg.startswith("--Mapper.ba_refine") for arg in refined)
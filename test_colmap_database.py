@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Tests for merging COLMAP databases, including the rig/frame tables of COLMAP >= 3.12."""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from colmap_database import MAX_IMAGE_ID, merge_databases
+
+SCHEMA = """
+CREATE TABLE cameras (camera_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, model INTEGER NOT NULL,
+    width INTEGER NOT NULL, height INTEGER NOT NULL, params BLOB, prior_focal_length INTEGER NOT NULL);
+CREATE TABLE images (image_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, name TEXT NOT NULL UNIQUE,
+    camera_id INTEGER NOT NULL);
+CREATE TABLE keypoints (image_id INTEGER PRIMARY KEY NOT NULL, rows INTEGER NOT NULL, cols INTEGER NOT NULL, data BLOB);
+CREATE TABLE matches (pair_id INTEGER PRIMARY KEY NOT NULL, rows INTEGER NOT NULL, cols INTEGER NOT NULL, data BLOB);
+CREATE TABLE rigs (rig_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, ref_sensor_id INTEGER NOT NULL,
+    ref_sensor_type INTEGER NOT NULL);
+CREATE TABLE rig_sensors (rig_id INTEGER NOT NULL, sensor_id INTEGER NOT NULL, sensor_type INTEGER NOT NULL,
+    sensor_from_rig BLOB);
+CREATE TABLE frames (frame_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, rig_id INTEGER NOT NULL);
+CREATE TABLE frame_data (frame_id INTEGER NOT NULL, data_id INTEGER NOT NULL, sensor_id INTEGER NOT NULL,
+    sensor_type INTEGER NOT NULL);
+CREATE TABLE notes (text TEXT);
+"""
+
+
+def make_shard(path: Path, names: list[str], width: int = 64) -> Path:
+    """What feature_extractor writes: one camera, its trivial rig, and a frame per image."""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    camera_id = conn.execute("INSERT INTO cameras (model, width, height, params, prior_focal_length) "
+                             "VALUES (1, ?, 48, ?, 0)", (width, b"params")).lastrowid
+    rig_id = conn.execute("INSERT INTO rigs (ref_sensor_id, ref_sensor_type) VALUES (?, 0)", (camera_id,)).lastrowid
+    for name in names:
+        image_id = conn.execute("INSERT INTO images (name, camera_id) VALUES (?, ?)", (name, camera_id)).lastrowid
+        conn.execute("INSERT INTO keypoints VALUES (?, 1, 2, ?)", (image_id, name.encode()))
+        frame_id = conn.execute("INSERT INTO frames (rig_id) VALUES (?)", (rig_id,)).lastrowid
+        conn.execute("INSERT INTO frame_data VALUES (?, ?, ?, 0)", (frame_id, image_id, camera_id))
+    conn.execute("INSERT INTO matches VALUES (?, 0, 2, NULL)", (1 * MAX_IMAGE_ID + 2,))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def rows(db: Path, sql: str) -> list[tuple]:
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize("share_cameras", [False, True])
+def test_merge_renumbers_rigs_and_frames(tmp_path: Path, share_cameras: bool):
+    shards = [make_shard(tmp_path / "a.db", ["a1.jpg", "a2.jpg"]),
+              make_shard(tmp_path / "b.db", ["b1.jpg", "b2.jpg"])]
+    out = tmp_path / "out.db"
+    assert merge_databases(shards, out, share_cameras=share_cameras) == 4
+
+    images = dict(rows(out, "SELECT name, image_id FROM images"))
+    assert images == {"a1.jpg": 1, "a2.jpg": 2, "b1.jpg": 3, "b2.jpg": 4}
+    assert rows(out, "SELECT pair_id FROM matches ORDER BY pair_id") == [(1 * MAX_IMAGE_ID + 2,), (3 * MAX_IMAGE_ID + 4,)]
+    num_cameras = 1 if share_cameras else 2
+    assert rows(out, "SELECT COUNT(*) FROM cameras") == [(num_cameras,)]
+    assert rows(out, "SELECT COUNT(*) FROM rigs") == [(num_cameras,)]
+    # Every image's frame points at its own image, its camera and that camera's rig.
+    joined = rows(out, "SELECT i.name, d.data_id = i.image_id, d.sensor_id = i.camera_id, "
+                       "r.ref_sensor_id = i.camera_id FROM frame_data d JOIN images i ON d.data_id = i.image_id "
+                       "JOIN frames f ON f.frame_id = d.frame_id JOIN rigs r ON r.rig_id = f.rig_id")
+    assert sorted(joined) == [(name, 1, 1, 1) for name in sorted(images)]
+    assert rows(out, "SELECT COUNT(DISTINCT frame_id) FROM frame_data") == [(4,)]
+
+
+def test_merge_refuses_unknown_tables(tmp_path: Path):
+    shards = [make_shard(tmp_path / "a.db", ["a1.jpg"]), make_shard(tmp_path / "b.db", ["b1.jpg"])]
+    merge_databases(shards, tmp_path / "empty_notes.db")   # empty unknown tables are fine
+    conn = sqlite3.connect(shards[1])
+    conn.execute("INSERT INTO notes VALUES ('x')")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError, match="notes"):
+        merge_databases(shards, tmp_path / "out.db")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Tests for the database.db report."""
+
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+
+from colmap_database import MAX_IMAGE_ID
+from colmap_db_report import connected_components, read_database_report
+
+
+def test_connected_components_ordered_by_size():
+    edges = np.array([[0, 1], [5, 6], [6, 4], [4, 5], [2, 2]])
+    labels = connected_components(8, edges)
+    assert labels.tolist() == [1, 1, 2, 3, 0, 0, 0, 4]
+
+
+def make_database(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+    CREATE TABLE images (image_id INTEGER PRIMARY KEY, name TEXT, camera_id INTEGER);
+    CREATE TABLE keypoints (image_id INTEGER PRIMARY KEY, rows INTEGER, cols INTEGER, data BLOB);
+    CREATE TABLE matches (pair_id INTEGER PRIMARY KEY, rows INTEGER, cols INTEGER, data BLOB);
+    CREATE TABLE two_view_geometries (pair_id INTEGER PRIMARY KEY, rows INTEGER, cols INTEGER, data BLOB,
+        config INTEGER);
+    """)
+    for image_id, num_keypoints in [(1, 100), (2, 100), (3, 50), (4, 10)]:
+        conn.execute("INSERT INTO images VALUES (?, ?, 1)", (image_id, f"img_{image_id}.jpg"))
+        conn.execute("INSERT INTO keypoints VALUES (?, ?, 6, NULL)", (image_id, num_keypoints))
+    # Pair 1-2: 20 of 40 matches verified; pair 3-4: 5 of 10, below the edge threshold.
+    for (id1, id2), raw, inliers in [((1, 2), 40, 20), ((3, 4), 10, 5)]:
+        pair_id = id1 * MAX_IMAGE_ID + id2
+        idx = np.stack([np.arange(inliers), np.arange(inliers) // 2], axis=1).astype(np.uint32)
+        conn.execute("INSERT INTO matches VALUES (?, ?, 2, NULL)", (pair_id, raw))
+        conn.execute("INSERT INTO two_view_geometries VALUES (?, ?, 2, ?, 2)", (pair_id, inliers, idx.tobytes()))
+    conn.commit()
+    conn.close()
+
+
+def test_database_report(tmp_path: Path):
+    make_database(tmp_path / "database.db")
+    report = read_database_report(tmp_path / "database.db", min_inliers=15)
+
+    assert report.keypoints.tolist() == [100, 100, 50, 10]
+    assert report.inlier_keypoints.tolist() == [20, 10, 5, 3]
+    assert report.verified_pairs.tolist() == [1, 1, 0, 0]
+    assert report.components.tolist() == [0, 0, 1, 2]
+    assert np.allclose(report.inlier_ratios, [0.5, 0.5])
+    assert report.configs == {"CALIBRATED": 2}
+    assert any("2 images with no view-graph edge" in line for line in report.summary(min_keypoints=20))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for sharded feature extraction, driven by a stand-in colmap script.
+"""
+
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from colmap_features import run_sharded_feature_extraction, shard_image_lists
+
+FAKE_COLMAP = '''
+import sqlite3, sys
+args = dict(zip(sys.argv[2::2], sys.argv[3::2]))
+names = open(args["--image_list_path"]).read().split()
+if any("fail" in n for n in names):
+    sys.exit(3)
+conn = sqlite3.connect(args["--database_path"])
+conn.executescript("""
+CREATE TABLE cameras (camera_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, model INTEGER NOT NULL,
+    width INTEGER NOT NULL, height INTEGER NOT NULL, params BLOB, prior_focal_length INTEGER NOT NULL);
+CREATE TABLE images (image_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, name TEXT NOT NULL UNIQUE,
+    camera_id INTEGER NOT NULL);
+CREATE TABLE keypoints (image_id INTEGER PRIMARY KEY NOT NULL, rows INTEGER NOT NULL, cols INTEGER NOT NULL, data BLOB);
+CREATE TABLE descriptors (image_id INTEGER PRIMARY KEY NOT NULL, rows INTEGER NOT NULL, cols INTEGER NOT NULL, data BLOB);
+CREATE TABLE matches (pair_id INTEGER PRIMARY KEY NOT NULL, rows INTEGER NOT NULL, cols INTEGER NOT NULL, data BLOB);
+""")
+camera_id = conn.execute("INSERT INTO cameras (model, width, height, params, prior_focal_length) "
+                         "VALUES (1, 64, 48, ?, 0)", (b"params",)).lastrowid
+for i, name in enumerate(names, 1):
+    image_id = conn.execute("INSERT INTO images (name, camera_id) VALUES (?, ?)", (name, camera_id)).lastrowid
+    conn.execute("INSERT INTO keypoints VALUES (?, 1, 6, ?)", (image_id, name.encode()))
+    conn.execute("INSERT INTO descriptors VALUES (?, 1, 128, ?)", (image_id, name.encode()))
+    print(f"Processed file [{i}/{len(names)}]", flush=True)
+conn.commit()
+'''
+
+
+def make_fake_colmap(tmp_path: Path) -> str:
+    script = tmp_path / "colmap"
+    script.write_text(f"#!{sys.executable}\n{FAKE_COLMAP}")
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_shard_image_lists():
+    shards = shard_image_lists([str(i) for i in range(10)], 3)
+    assert [len(s) for s in shards] == [4, 3, 3]
+    assert sum(shards, []) == [str(i) for i in range(10)]
+    assert shard_image_lists(["a"], 4) == [["a"]]
+
+
+def test_sharded_extraction_merges_databases(tmp_path: Path):
+    colmap = make_fake_colmap(tmp_path)
+    names = [f"frame_{i:06d}.jpg" for i in range(23)]
+    db_path = tmp_path / "run" / "database" / "database.db"
+
+    count = run_sharded_feature_extraction(db_path, tmp_path, ["--ImageReader.single_camera", "1"],
+                                           num_shards=4, threads_per_shard=1, names=names,
+                                           colmap=colmap, share_cameras=True)
+    assert count == 23
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT image_id, name, camera_id FROM images ORDER BY image_id").fetchall()
+    assert [r[1] for r in rows] == names
+    assert [r[0] for r in rows] == list(range(1, 24))
+    assert {r[2] for r in rows} == {1}
+    assert conn.execute("SELECT COUNT(*) FROM cameras").fetchone()[0] == 1
+    keypoints = dict(conn.execute("SELECT image_id, data FROM keypoints"))
+    assert all(keypoints[image_id] == name.encode() for image_id, name, _ in rows)
+    conn.close()
+    assert not (db_path.parent / "shards").exists()
+
+    # A second run only extracts images missing from the existing database.
+    count = run_sharded_feature_extraction(db_path, tmp_path, [], num_shards=2, threads_per_shard=1,
+                                           names=names + ["extra_a.jpg", "extra_b.jpg"], colmap=colmap)
+    assert count == 25
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM cameras").fetchone()[0] == 3
+    conn.close()
+
+
+def test_failed_shard_raises_and_keeps_database(tmp_path: Path):
+    colmap = make_fake_colmap(tmp_path)
+    db_path = tmp_path / "database.db"
+    run_sharded_feature_extraction(db_path, tmp_path, [], num_shards=1, names=["a.jpg"], colmap=colmap)
+
+    with pytest.raises(subprocess.CalledProcessError):
+        run_sharded_feature_extraction(db_path, tmp_path, [], num_shards=2,
+                                       names=["a.jpg", "b.jpg", "fail.jpg"], colmap=colmap)
+    assert db_path.exists()
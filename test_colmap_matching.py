@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""Tests for COLMAP matcher selection and the video frame pair list."""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from colmap_matching import (
+    RETRIEVAL_MIN_IMAGES,
+    SEQUENTIAL_OVERLAP,
+    VOCAB_TREE_MIN_IMAGES,
+    _frame_table,
+    exhaustive_pair_count,
+    frame_streams,
+    heading_loop_pairs,
+    plan_from_env,
+    select_matcher,
+    temporal_pairs,
+    video_frame_pairs,
+)
+from imu_extractor import load_heading_data_csv
+
+
+def photo_names(n: int) -> list[str]:
+    return [f"IMG_{i:04d}.jpg" for i in range(n)]
+
+
+def video_names(n: int, lenses: tuple[str, ...] = ("back", "front")) -> list[str]:
+    return sorted(f"frame_{i:06d}_{lens}.jpg" for i in range(1, n + 1) for lens in lenses)
+
+
+def write_images(image_dir: Path, names: list[str]) -> None:
+    import cv2
+    image_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(0)
+    for name in names:
+        cv2.imwrite(str(image_dir / name), rng.integers(0, 256, size=(16, 16, 3), dtype=np.uint8))
+
+
+@pytest.fixture
+def vocab_tree(tmp_path: Path) -> Path:
+    path = tmp_path / "vocab_tree.bin"
+    path.write_bytes(b"tree")
+    return path
+
+
+def test_small_photo_sets_are_matched_exhaustively(tmp_path: Path, vocab_tree: Path):
+    plan = select_matcher(photo_names(40), "photo", vocab_tree_path=vocab_tree,
+                          pairs_path=tmp_path / "pairs.txt", image_dir=tmp_path)
+    assert plan.matcher == "exhaustive_matcher"
+    assert plan.expected_pairs == exhaustive_pair_count(40) == 780
+    assert plan.options == []
+
+
+def test_vocab_tree_threshold(tmp_path: Path, vocab_tree: Path):
+    at_threshold = select_matcher(photo_names(VOCAB_TREE_MIN_IMAGES), "photo", vocab_tree_path=vocab_tree)
+    assert at_threshold.matcher == "exhaustive_matcher"
+
+    plan = select_matcher(photo_names(VOCAB_TREE_MIN_IMAGES + 1), "photo", vocab_tree_path=vocab_tree)
+    assert plan.matcher == "vocab_tree_matcher"
+    assert plan.options[:2] == ["--VocabTreeMatching.vocab_tree_path", str(vocab_tree)]
+    assert plan.expected_pairs < exhaustive_pair_count(VOCAB_TREE_MIN_IMAGES + 1)
+
+    # A missing tree file is ignored rather than passed to COLMAP.
+    missing = select_matcher(photo_names(VOCAB_TREE_MIN_IMAGES + 1), "photo",
+                             vocab_tree_path=tmp_path / "missing.bin")
+    assert missing.matcher == "exhaustive_matcher"
+
+
+def test_retrieval_threshold(tmp_path: Path):
+    names = photo_names(RETRIEVAL_MIN_IMAGES + 1)
+    image_dir = tmp_path / "images"
+    write_images(image_dir, names)
+    pairs_path = tmp_path / "sparse" / "pairs.txt"
+
+    at_threshold = select_matcher(names[:RETRIEVAL_MIN_IMAGES], "photo",
+                                  pairs_path=pairs_path, image_dir=image_dir)
+    assert at_threshold.matcher == "exhaustive_matcher"
+    # Retrieval needs somewhere to write the pair list and images to describe.
+    assert select_matcher(names, "photo", image_dir=image_dir).matcher == "exhaustive_matcher"
+    assert select_matcher(names, "photo", pairs_path=pairs_path).matcher == "exhaustive_matcher"
+
+    plan = select_matcher(names, "photo", pairs_path=pairs_path, image_dir=image_dir)
+    assert plan.matcher == "matches_importer"
+    assert plan.options == ["--match_list_path", str(pairs_path), "--match_type", "pairs"]
+    lines = pairs_path.read_text().splitlines()
+    assert len(lines) == plan.expected_pairs
+    assert exhaustive_pair_count(len(names)) > plan.expected_pairs >= len(names)
+    assert (pairs_path.parent / "retrieval_descriptors.npz").is_file()
+
+
+def test_video_streams_use_sequential_matching(vocab_tree: Path):
+    plan = select_matcher(video_names(50), "video")
+    assert plan.matcher == "sequential_matcher"
+    # Front/back frames interleave, so the window doubles.
+    assert plan.options[:2] == ["--SequentialMatching.overlap", str(2 * SEQUENTIAL_OVERLAP)]
+    assert "--SequentialMatching.loop_detection" not in plan.options
+
+    single = select_matcher(video_names(50, ("front",)), "video", vocab_tree_path=vocab_tree)
+    assert single.options[:2] == ["--SequentialMatching.overlap", str(SEQUENTIAL_OVERLAP)]
+    assert single.options[single.options.index("--SequentialMatching.vocab_tree_path") + 1] == str(vocab_tree)
+
+    # The same names shot as photos, or frames without numbers, are not treated as a sequence.
+    assert select_matcher(video_names(50), "photo").matcher == "exhaustive_matcher"
+    assert select_matcher(["a.jpg", "b.jpg"], "video").matcher == "exhaustive_matcher"
+
+
+def test_video_with_heading_writes_pair_list(tmp_path: Path):
+    names = video_names(60)
+    heading = (np.arange(60.0), np.zeros(60))
+    pairs_path = tmp_path / "pairs.txt"
+
+    plan = select_matcher(names, "video", pairs_path=pairs_path, heading=heading)
+    assert plan.matcher == "matches_importer"
+    assert len(pairs_path.read_text().splitlines()) == plan.expected_pairs
+    # Without a pair list path the heading cannot be used.
+    assert select_matcher(names, "video", heading=heading).matcher == "sequential_matcher"
+
+
+def test_forced_matchers(tmp_path: Path):
+    assert select_matcher(video_names(10), "video", forced="exhaustive_matcher").matcher == "exhaustive_matcher"
+    with pytest.raises(ValueError):
+        select_matcher(photo_names(10), "photo", forced="pairs")
+    with pytest.raises(ValueError):
+        select_matcher(photo_names(10), "photo", forced="retrieval", pairs_path=tmp_path / "pairs.txt")
+    with pytest.raises(ValueError):
+        select_matcher(photo_names(10), "photo", forced="vocab_tree_matcher")
+    with pytest.raises(ValueError):
+        select_matcher(photo_names(10), "photo", forced="spatial_matcher")
+
+
+@pytest.mark.parametrize("value, matcher", [
+    ("exhaustive", "exhaustive_matcher"),
+    ("sequential_matcher", "sequential_matcher"),
+    ("pairs", "matches_importer"),
+    ("", "sequential_matcher"),
+])
+def test_plan_from_env_normalises_matcher(tmp_path: Path, monkeypatch, value: str, matcher: str):
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    for name in video_names(12):
+        (image_dir / name).write_bytes(b"")
+    monkeypatch.setenv("MATCHER", value)
+    monkeypatch.delenv("VOCAB_TREE_PATH", raising=False)
+
+    plan = plan_from_env(image_dir, "video", pairs_path=tmp_path / "pairs.txt")
+    assert plan.matcher == matcher
+    assert plan.num_images == 24
+
+
+def test_plan_from_env_reads_vocab_tree_and_heading(tmp_path: Path, monkeypatch, vocab_tree: Path):
+    image_dir = tmp_path / "images"
+    image_dir.mkdir()
+    for name in video_names(12):
+        (image_dir / name).write_bytes(b"")
+    monkeypatch.delenv("MATCHER", raising=False)
+    monkeypatch.setenv("VOCAB_TREE_PATH", str(vocab_tree))
+
+    plan = plan_from_env(image_dir, "video", heading_csv=tmp_path / "missing.csv")
+    assert plan.matcher == "sequential_matcher"
+    assert str(vocab_tree) in plan.options
+
+    heading_csv = tmp_path / "heading_data.csv"
+    heading_csv.write_text("timestamp,heading_degrees\n0,0\n5,10\n11,20\n")
+    # Sequential unless the heading is loaded, since a pair list path is given either way.
+    assert plan_from_env(image_dir, "video", pairs_path=tmp_path / "pairs.txt").matcher == "sequential_matcher"
+    plan = plan_from_env(image_dir, "video", pairs_path=tmp_path / "pairs.txt", heading_csv=heading_csv)
+    assert plan.matcher == "matches_importer"
+
+
+def test_frame_streams():
+    assert frame_streams(video_names(3)) == {"./frame_#_back.jpg": [1, 2, 3], "./frame_#_front.jpg": [1, 2, 3]}
+    assert frame_streams(["seq/cam2_0010.jpg", "seq/cam2_0011.jpg"]) == {"seq/cam2_#.jpg": [10, 11]}
+    # A date prefix is not mistaken for the frame number.
+    assert frame_streams(["20240101_frame_0001.jpg", "20240101_frame_0002.jpg"]) == {"./20240101_frame_#.jpg": [1, 2]}
+    # Too-short numbers, names whose sort order is not
+    # temporal, more than two streams and unnumbered names are not sequences.
+    assert frame_streams(["frame_1.jpg", "frame_2.jpg"]) is None
+    assert frame_streams(["frame_1000.jpg", "frame_999.jpg"]) is None
+    assert frame_streams(video_names(3, ("back", "front", "left"))) is None
+    assert frame_streams(["frame_001.jpg", "cover.jpg"]) is None
+    assert frame_streams([]) is None
+
+
+def test_temporal_pairs_interleaved_and_single_stream():
+    frame_idx, stream_idx, keys = _frame_table(video_names(4))
+    assert keys == ["./frame_#_back.jpg", "./frame_#_front.jpg"]
+    assert stream_idx.tolist() == [0, 1] * 4
+    pairs = {tuple(p) for p in temporal_pairs(frame_idx, stream_idx, window=1).tolist()}
+    # Neighbouring frames within each lens, plus front/back at the same frame.
+    assert pairs == {(0, 2), (2, 4), (4, 6), (1, 3), (3, 5), (5, 7), (0, 1), (2, 3), (4, 5), (6, 7)}
+
+    # A single stream with a dropped frame: the window counts frame numbers, not images.
+    frame_idx, stream_idx, _ = _frame_table(["f_0001.jpg", "f_0002.jpg", "f_0004.jpg"])
+    assert temporal_pairs(frame_idx, stream_idx, window=1).tolist() == [[0, 1]]
+    assert temporal_pairs(frame_idx, stream_idx, window=2).tolist() == [[0, 1], [1, 2]]
+    assert temporal_pairs(np.empty(0, np.int64), np.empty(0, np.int64), 3).shape == (0, 2)
+
+
+def test_heading_loop_pairs():
+    # Two laps of a loop: one image a second, turning 6 degrees per second.
+    times = np.arange(120.0)
+    directions = times * 6.0
+    pairs = heading_loop_pairs(directions, times, query_period=1, num_candidates=3,
+                               tolerance_deg=10.0, min_gap_s=30.0)
+    assert len(pairs) > 0
+    gap = np.abs(times[pairs[:, 0]] - times[pairs[:, 1]])
+    assert (gap >= 30.0).all()
+    diff = np.abs((directions[pairs[:, 0]] - directions[pairs[:, 1]] + 180.0) % 360.0 - 180.0)
+    assert (diff <= 10.0).all()
+    # Headings either side of 0/360 still match.
+    assert (0, 1) in {tuple(p) for p in heading_loop_pairs(np.array([359.0, 1.0]), np.array([0.0, 60.0])).tolist()}
+    assert heading_loop_pairs(np.array([0.0]), np.array([0.0])).shape == (0, 2)
+
+
+def test_video_frame_pairs_adds_loops_across_lenses():
+    names = video_names(120)
+    temporal_only = video_frame_pairs(names, None, frame_interval_s=1.0)
+    # Turning 3 degrees a second, the back lens at t sees what the front lens saw at t + 60 s.
+    heading = (np.arange(200.0), np.arange(200.0) * 3.0)
+    pairs = video_frame_pairs(names, heading, frame_interval_s=1.0)
+    assert len(pairs) > len(temporal_only)
+    assert {tuple(p) for p in temporal_only.tolist()} <= {tuple(p) for p in pairs.tolist()}
+    loops = {tuple(p) for p in pairs.tolist()} - {tuple(p) for p in temporal_only.tolist()}
+    front_back = [(a, b) for a, b in loops if a % 2 != b % 2]
+    assert front_back
+    with pytest.raises(ValueError):
+        video_frame_pairs(names + ["cover.jpg"], None, frame_interval_s=1.0)
+
+
+@pytest.mark.filterwarnings("ignore:loadtxt")
+def test_load_heading_data_csv(tmp_path: Path):
+    csv_path = tmp_path / "heading_data.csv"
+    csv_path.write_text("timestamp,heading_degrees\n12.0,350\n10.0,340\n14.0,10\n")
+    times, headings = load_heading_data_csv(csv_path)
+    # Sorted, relative to the first reading and unwrapped across 360.
+    assert times.tolist() == [0.0, 2.0, 4.0]
+    assert headings.tolist() == pytest.approx([340.0, 350.0, 370.0])
+
+    csv_path.write_text("timestamp,heading_degrees\n")
+    times, headings = load_heading_data_csv(csv_path)
+    assert len(times) == len(headings) == 0
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for the NumPy COLMAP binary model reader.
+
+Models are encoded here with struct, independently of colmap_model.py, using
+the layout COLMAP's own reconstruction writer produces.
+"""
+
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from colmap_model import (filter_model, find_best_model, read_model, read_model_stats, read_points3D_binary,
+                          write_model)
+
+
+def write_test_model(model_dir: Path, num_images: int, num_points: int, error: float = 0.5) -> None:
+    """Write a small PINHOLE model where every point is seen by images 0 and 1."""
+    model_dir.mkdir(parents=True, exist_ok=True)
+    with open(model_dir / "cameras.bin", "wb") as f:
+        f.write(struct.pack("<Q", 1))
+        f.write(struct.pack("<iiQQ", 1, 1, 640, 480))
+        f.write(struct.pack("<4d", 500.0, 510.0, 320.0, 240.0))
+
+    with open(model_dir / "images.bin", "wb") as f:
+        f.write(struct.pack("<Q", num_images))
+        for i in range(num_images):
+            f.write(struct.pack("<i", i + 1))
+            f.write(struct.pack("<4d", 1.0, 0.0, 0.0, 0.0))
+            f.write(struct.pack("<3d", float(i), 2.0, 3.0))
+            f.write(struct.pack("<i", 1))
+            f.write(f"img_{i:03d}.jpg".encode() + b"\0")
+            num_p2d = num_points if i < 2 else 1
+            f.write(struct.pack("<Q", num_p2d))
+            for j in range(num_p2d):
+                point_id = j + 1 if i < 2 else -1
+                f.write(struct.pack("<ddq", float(j), float(i), point_id))
+
+    with open(model_dir / "points3D.bin", "wb") as f:
+        f.write(struct.pack("<Q", num_points))
+        for j in range(num_points):
+            f.write(struct.pack("<Q", j + 1))
+            f.write(struct.pack("<3d", float(j), -float(j), 0.5))
+            f.write(struct.pack("<3B", j % 256, 7, 9))
+            f.write(struct.pack("<d", error))
+            f.write(struct.pack("<Q", 2))
+            f.write(struct.pack("<ii", 1, j))
+            f.write(struct.pack("<ii", 2, j))
+
+
+def test_read_model(tmp_path: Path):
+    write_test_model(tmp_path, num_images=3, num_points=5)
+    model = read_model(tmp_path)
+
+    assert model.cameras.ids.tolist() == [1]
+    assert model.cameras.camera_params(0).tolist() == [500.0, 510.0, 320.0, 240.0]
+    assert model.cameras.widths.tolist() == [640]
+
+    images = model.images
+    assert images.names == ["img_000.jpg", "img_001.jpg", "img_002.jpg"]
+    assert images.ids.tolist() == [1, 2, 3]
+    assert images.point2D_offsets.tolist() == [0, 5, 10, 11]
+    assert images.point3D_ids[-1] == -1
+    assert np.allclose(images.xys[5:10, 0], np.arange(5))
+    assert np.allclose(images.camera_centers(), -images.tvecs)
+
+    points = model.points3D
+    assert points.ids.tolist() == [1, 2, 3, 4, 5]
+    assert np.allclose(points.xyz[:, 1], -np.arange(5))
+    assert points.rgb[3].tolist() == [3, 7, 9]
+    assert points.track_lengths.tolist() == [2] * 5
+    assert points.track_image_ids.tolist() == [1, 2] * 5
+    assert points.track_point2D_idxs.tolist() == np.repeat(np.arange(5), 2).tolist()
+
+
+def test_read_points3D_with_varying_track_lengths(tmp_path: Path):
+    lengths = [0, 3, 1, 7, 2]
+    with open(tmp_path / "points3D.bin", "wb") as f:
+        f.write(struct.pack("<Q", len(lengths)))
+        for j, length in enumerate(lengths):
+            f.write(struct.pack("<Q3d3Bd", 10 * j, float(j), 0.0, 0.0, 1, 2, 3, 0.1 * j))
+            f.write(struct.pack("<Q", length))
+            for k in range(length):
+                f.write(struct.pack("<ii", k + 1, j))
+
+    points = read_points3D_binary(tmp_path / "points3D.bin")
+    assert points.ids.tolist() == [0, 10, 20, 30, 40]
+    assert np.allclose(points.errors, 0.1 * np.arange(5))
+    assert points.track_lengths.tolist() == lengths
+    assert points.track_image_ids.tolist() == [k + 1 for length in lengths for k in range(length)]
+    assert points.track_point2D_idxs.tolist() == np.repeat(np.arange(5), lengths).tolist()
+
+
+def test_truncated_points3D_is_skipped(tmp_path: Path):
+    write_test_model(tmp_path / "sparse" / "0", num_images=3, num_points=5)
+    write_test_model(tmp_path / "sparse" / "1", num_images=2, num_points=5)
+    points_path = tmp_path / "sparse" / "0" / "points3D.bin"
+    data = points_path.read_bytes()
+    for size in (18, len(data) - 1):
+        points_path.write_bytes(data[:size])
+        with pytest.raises(ValueError, match="truncated"):
+            read_points3D_binary(points_path)
+        assert find_best_model(tmp_path / "sparse") == tmp_path / "sparse" / "1"
+
+
+def test_find_best_model_prefers_registered_images(tmp_path: Path):
+    # Model 0 has more points and a larger directory, model 1 registers more images.
+    write_test_model(tmp_path / "0", num_images=3, num_points=200)
+    write_test_model(tmp_path / "1", num_images=4, num_points=20)
+    write_test_model(tmp_path / "2", num_images=4, num_points=20, error=0.2)
+
+    stats = read_model_stats(tmp_path / "1")
+    assert (stats.num_images, stats.num_points, stats.num_observations) == (4, 20, 40)
+    assert find_best_model(tmp_path) == tmp_path / "2"
+
+
+def test_write_model_round_trip(tmp_path: Path):
+    write_test_model(tmp_path / "in", num_images=3, num_points=50)
+    write_model(read_model(tmp_path / "in"), tmp_path / "out")
+    for name in ("cameras.bin", "images.bin", "points3D.bin"):
+        assert (tmp_path / "out" / name).read_bytes() == (tmp_path / "in" / name).read_bytes()
+
+
+def test_filter_model_drops_short_tracks(tmp_path: Path):
+    write_test_model(tmp_path, num_images=4, num_points=10)
+    model = read_model(tmp_path)
+
+    kept = filter_model(model, ["img_000.jpg", "img_001.jpg", "img_003.jpg"])
+    assert kept.images.names == ["img_000.jpg", "img_001.jpg", "img_003.jpg"]
+    assert len(kept.points3D) == 10
+    assert kept.images.point2D_offsets.tolist() == [0, 10, 20, 21]
+
+    # Without image 1 every track is left with a single observation.
+    alone = filter_model(model, ["img_000.jpg", "img_002.jpg"])
+    assert len(alone.points3D) == 0
+    assert (alone.images.point3D_ids == -1).all()
+    write_model(alone, tmp_path / "alone")
+    assert read_model_stats(tmp_path / "alone").num_images == 2
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""Tests for chunking ordered sequences and the Sim(3) overlap check."""
+
+import numpy as np
+import pytest
+
+from colmap_partition import estimate_sim3, partition_ordered
+
+
+@pytest.mark.parametrize("num_names", [1001, 1200, 1341, 1399])
+def test_partition_chunks_are_even_and_overlap(num_names: int):
+    names = [f"frame_{i:06d}.jpg" for i in range(num_names)]
+    chunks = partition_ordered(names, chunk_size=400, overlap=60)
+    assert all(len(chunk) == 400 for chunk in chunks)
+    assert chunks[0][0] == names[0] and chunks[-1][-1] == names[-1]
+    for a, b in zip(chunks, chunks[1:]):
+        shared = len(set(a) & set(b))
+        assert shared >= 60 and a[-shared:] == b[:shared]
+    # The fewest chunks that keep the overlap.
+    assert len(chunks) == -(-(num_names - 60) // 340)
+
+
+def test_partition_short_lists_and_bad_overlap():
+    assert partition_ordered(["a", "b"], chunk_size=400, overlap=60) == [["a", "b"]]
+    with pytest.raises(ValueError):
+        partition_ordered(["a"] * 10, chunk_size=5, overlap=5)
+
+
+def test_estimate_sim3_recovers_transform():
+    rng = np.random.default_rng(0)
+    src = rng.normal(size=(50, 3))
+    angle = 0.7
+    R = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+    t = np.array([1.0, -2.0, 0.5])
+    s_est, R_est, t_est = estimate_sim3(src, 2.5 * src @ R.T + t)
+    assert s_est == pytest.approx(2.5)
+    assert np.allclose(R_est, R) and np.allclose(t_est, t)
+
+    # A mirrored target still gives a proper rotation, not a reflection.
+    _, R_mirror, _ = estimate_sim3(src, src * [1, 1, -1])
+    assert np.linalg.det(R_mirror) == pytest.approx(1.0)
+
+
+def test_estimate_sim3_degenerate_input():
+    src = np.ones((4, 3))
+    dst = np.full((4, 3), 5.0)
+    s, R, t = estimate_sim3(src, dst)
+    assert s == 1.0 and np.isfinite(R).all()
+    assert np.allclose(s * R @ src[0] + t, dst[0])
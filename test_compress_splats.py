@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Tests for splat PLY reading, pruning and compression."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from compress_splats import (CHUNK_SIZE, SH_RANGE, compress, decompress, morton_order, prune_mask, read_ply,
+                             read_ply_header, roundtrip_errors, write_ply)
+
+REPO_DIR = Path(__file__).resolve().parent
+
+
+def make_splats(n: int, seed: int = 0) -> np.ndarray:
+    """Random splats in the 3DGS/3DGRUT export layout, with degree-3 SH."""
+    rng = np.random.default_rng(seed)
+    names = ["x", "y", "z", "nx", "ny", "nz", "f_dc_0", "f_dc_1", "f_dc_2"]
+    names += [f"f_rest_{i}" for i in range(45)] + ["opacity", "scale_0", "scale_1", "scale_2"]
+    names += ["rot_0", "rot_1", "rot_2", "rot_3"]
+    splats = np.zeros(n, dtype=[(name, "<f4") for name in names])
+    for axis, size in zip("xyz", (40.0, 30.0, 4.0)):
+        splats[axis] = rng.random(n) * size
+    for name in names[6:9]:
+        splats[name] = rng.normal(0, 1, n)
+    for i in range(45):
+        splats[f"f_rest_{i}"] = rng.normal(0, 0.1, n)
+    splats["opacity"] = rng.normal(0, 3, n)
+    for i in range(3):
+        splats[f"scale_{i}"] = rng.normal(-4, 1, n)
+    for i in range(4):
+        splats[f"rot_{i}"] = rng.normal(0, 1, n)
+    return splats
+
+
+def test_read_ply_memory_maps_header_layout(tmp_path: Path):
+    splats = make_splats(100)
+    write_ply(tmp_path / "a.ply", {"vertex": splats})
+    data = read_ply(tmp_path / "a.ply")
+    assert isinstance(data["vertex"], np.memmap)
+    assert data["vertex"].dtype.names == splats.dtype.names
+    assert np.array_equal(data["vertex"]["f_rest_44"], splats["f_rest_44"])
+
+    # Big-endian files map through a big-endian dtype.
+    header = b"ply\nformat binary_big_endian 1.0\ncomment x\nelement vertex 2\nproperty float x\n" \
+             b"property uchar red\nend_header\n"
+    (tmp_path / "b.ply").write_bytes(header + np.array([(1.5, 7), (-2.0, 9)], dtype=">f4,u1").tobytes())
+    elements, offset = read_ply_header(tmp_path / "b.ply")
+    assert offset == len(header) and elements[0].count == 2
+    vertex = read_ply(tmp_path / "b.ply")["vertex"]
+    assert vertex["x"].tolist() == [1.5, -2.0] and vertex["red"].tolist() == [7, 9]
+
+
+def test_prune_by_opacity_and_scale():
+    splats = make_splats(6)
+    splats["opacity"] = [-10, -3, 0, 3, 3, 3]              # sigmoid: 0.00005, 0.047, 0.5, 0.95, ...
+    splats["scale_0"] = splats["scale_1"] = splats["scale_2"] = np.log([1, 1, 1, 1, 1e-5, 0.01])
+    assert prune_mask(splats, 0.01).tolist() == [False, True, True, True, True, True]
+    assert prune_mask(splats, 0.01, min_scale=1e-3).tolist() == [False, True, True, True, False, True]
+
+
+def test_compress_roundtrip(tmp_path: Path):
+    splats = make_splats(3 * CHUNK_SIZE + 17)
+    splats = splats[morton_order(np.stack([splats["x"], splats["y"], splats["z"]], axis=1))]
+    write_ply(tmp_path / "splats.ply", {"vertex": splats})
+    write_ply(tmp_path / "splats.compressed.ply", compress(splats))
+    data = read_ply(tmp_path / "splats.compressed.ply")
+    assert len(data["chunk"]) == 4 and len(data["vertex"]) == len(data["sh"]) == len(splats)
+    assert (tmp_path / "splats.compressed.ply").stat().st_size < (tmp_path / "splats.ply").stat().st_size / 3
+
+    errors = roundtrip_errors(splats, decompress(data))
+    assert errors["position_max"] < 0.5          # 11/10/11 bits within 256-splat chunks of a 40 m scene
+    assert errors["rotation_max_deg"] < 1.0
+    assert errors["scale_max_rel"] < 0.02
+    assert errors["opacity_max"] <= 0.5 / 255 + 1e-6
+    assert errors["color_max"] < 0.01
+    assert errors["sh_max"] <= SH_RANGE / 256 + 1e-6     # half a step of the fixed [-4, 4] range
+
+
+def test_sh_uses_fixed_viewer_range():
+    splats = make_splats(4)
+    splats["f_rest_0"] = [-SH_RANGE, 0.0, 1.0, 10.0]
+    elements = compress(splats)
+    assert not any("sh" in name for name in elements["chunk"].dtype.names)
+    # Viewers decode a byte v as ((v + 0.5) / 256 - 0.5) * 8.
+    assert elements["sh"]["f_rest_0"].tolist() == [0, 128, 160, 255]
+    restored = decompress(elements)["f_rest_0"]
+    assert np.allclose(restored[:3], [-SH_RANGE, 0.0, 1.0], atol=SH_RANGE / 256)
+    assert restored[3] < SH_RANGE
+
+
+def test_cli_compress_and_decompress(tmp_path: Path):
+    splats = make_splats(1000)
+    splats["opacity"] = 0.0
+    splats["opacity"][:100] = -10
+    write_ply(tmp_path / "run" / "export_last.ply", {"vertex": splats})
+    result = subprocess.run([sys.executable, "compress_splats.py", str(tmp_path / "run")], cwd=REPO_DIR,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "1,000 -> 900 splats" in result.stdout and "Round-trip error" in result.stdout
+    compressed = tmp_path / "run" / "export_last.compressed.ply"
+    result = subprocess.run([sys.executable, "compress_splats.py", str(compressed), "--decompress"], cwd=REPO_DIR,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert len(read_ply(tmp_path / "run" / "export_last.decompressed.ply")["vertex"]) == 900
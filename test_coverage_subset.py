@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Tests for coverage-based training subset selection."""
+
+from pathlib import Path
+
+import numpy as np
+
+from colmap_model import read_model
+from coverage_subset import greedy_coverage, visibility_csr
+from test_colmap_model import write_test_model
+
+
+def test_visibility_csr(tmp_path: Path):
+    write_test_model(tmp_path, num_images=3, num_points=4)
+    offsets, point_idx = visibility_csr(read_model(tmp_path))
+    # Images 1 and 2 see every point; image 3 sees none.
+    assert offsets.tolist() == [0, 4, 8, 8]
+    assert point_idx.tolist() == [0, 1, 2, 3] * 2
+
+
+def test_greedy_coverage_skips_redundant_images():
+    # Images 0-2 each see a disjoint block of points, image 3 duplicates image 0
+    # and image 4 sees one point of each block.
+    blocks = [np.arange(0, 10), np.arange(10, 20), np.arange(20, 30), np.arange(0, 10), np.array([0, 10, 20])]
+    offsets = np.concatenate([[0], np.cumsum([len(b) for b in blocks])])
+    point_idx = np.concatenate(blocks)
+
+    single = greedy_coverage(offsets, point_idx, 30, target=1.0, min_views=1)
+    assert sorted(single.image_indices.tolist()) == [0, 1, 2]
+    assert single.coverage[-1] == 1.0
+
+    double = greedy_coverage(offsets, point_idx, 30, target=1.0, min_views=2)
+    assert sorted(double.image_indices.tolist()) == [0, 1, 2, 3, 4]
+    assert (double.point_views >= np.minimum(np.bincount(point_idx, minlength=30), 2)).all()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Tests for the dataset registry, the DATASET override of config.py and the batch runner."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from datasets import Dataset, load_registry, select_datasets
+from run_batch import run_dataset
+
+REPO_DIR = Path(__file__).resolve().parent
+
+
+def test_variant_follows_dataset_type(tmp_path: Path):
+    sony = Dataset.from_name("YJP-Lvl04_SonyA7Mk4_250828-00", tmp_path)
+    assert (sony.location, sony.date, sony.no) == ("YJP-Lvl04", "250828", "00")
+    assert sony.data_variant == "FullSet_QuarterRes" and sony.path == tmp_path / sony.name
+    assert Dataset("A", "MatterportPro3", "250101").data_variant == "FullSet_FullRes"
+    insta = Dataset.from_name("YJP_Lvl05_Insta360X4_250901-01", tmp_path, every_seconds=2)
+    assert insta.location == "YJP_Lvl05" and insta.data_variant == "every_2/front"
+    assert insta.command[-4:] == ["--every-seconds", "2", "--cameras", "front"]
+    with pytest.raises(ValueError):
+        Dataset.from_name("YJP_Lvl04_250828_DSLR", tmp_path)
+
+
+def test_registry_file_and_root_scan(tmp_path: Path):
+    for name in ("B_SonyA7Mk4_250829-00", "A_Insta360X4_250828-01", "notes", "C_UnknownCam_250828-00"):
+        (tmp_path / name).mkdir()
+    assert [d.name for d in load_registry(tmp_path, tmp_path / "missing.toml")] == [
+        "A_Insta360X4_250828-01", "B_SonyA7Mk4_250829-00"]
+
+    registry = tmp_path / "datasets.toml"
+    registry.write_text(f'root = "{tmp_path}"\n'
+                        '[[dataset]]\nname = "A_Insta360X4_250828-01"\ncamera = "both"\n'
+                        '[[dataset]]\nlocation = "B"\ntype = "SonyA7Mk4"\ndate = "250829"\nresolution = "Half"\n')
+    datasets = load_registry(Path("/elsewhere"), registry)
+    assert [(d.name, d.data_variant) for d in datasets] == [
+        ("A_Insta360X4_250828-01", "every_1/both"), ("B_SonyA7Mk4_250829-00", "FullSet_HalfRes")]
+    assert datasets[0].root == tmp_path
+    assert [d.name for d in select_datasets(datasets, ["*_2508*"], ["SonyA7Mk4"])] == ["B_SonyA7Mk4_250829-00"]
+
+    # config.py takes the dataset (and its registry overrides) from DATASET.
+    env = {**os.environ, "DATASET": "A_Insta360X4_250828-01", "DATASETS_TOML": str(registry)}
+    out = subprocess.run([sys.executable, "-c", "import config; print(config.DATASET_PATH, config.DATA_VARIANT)"],
+                         cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    assert out.split() == [str(tmp_path / "A_Insta360X4_250828-01"), "every_1/both"]
+
+
+def test_run_dataset_writes_per_dataset_log(tmp_path: Path):
+    script = tmp_path / "show_config.py"
+    script.write_text(f"import sys; sys.path.insert(0, {str(REPO_DIR)!r})\n"
+                      "import config; print('variant', config.DATA_VARIANT, 'path', config.DATASET_PATH)\n"
+                      "sys.exit(config.DATASET_NO == '01')\n")
+    results = {}
+    for name in ("A_SonyA7Mk4_250828-00", "A_SonyA7Mk4_250828-01"):
+        dataset = Dataset.from_name(name, tmp_path)
+        dataset.path.mkdir()
+        results[name] = run_dataset(dataset, [str(script)])
+    code, _, log_path = results["A_SonyA7Mk4_250828-00"]
+    assert code == 0 and log_path.parent == tmp_path / "A_SonyA7Mk4_250828-00" / "batch_logs"
+    # The child processes the dataset under the batch root, not config.py's default root.
+    assert f"variant FullSet_QuarterRes path {tmp_path / 'A_SonyA7Mk4_250828-00'}" in log_path.read_text()
+    assert results["A_SonyA7Mk4_250828-01"][0] == 1
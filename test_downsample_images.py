@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Tests for the downsample script's dataset detection for the run log."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from downsample_images import dataset_dir_of
+
+REPO_DIR = Path(__file__).resolve().parent
+
+
+def test_dataset_dir_of(tmp_path: Path, monkeypatch):
+    import config
+    dataset = tmp_path / "A_SonyA7Mk4_250828-00"
+    assert dataset_dir_of(dataset / "_source" / "original") == dataset
+    assert dataset_dir_of(dataset / "_source" / "edited" / "full") == dataset
+    monkeypatch.chdir(dataset.parent)
+    assert dataset_dir_of("A_SonyA7Mk4_250828-00/_source/original") == dataset
+    assert dataset_dir_of("imgs") == config.DATASET_PATH
+
+
+def test_short_relative_input(tmp_path: Path):
+    import cv2
+    (tmp_path / "imgs").mkdir()
+    cv2.imwrite(str(tmp_path / "imgs" / "a.png"), np.zeros((8, 8, 3), dtype=np.uint8))
+    for run_log in ("0", str(tmp_path / "run_log.jsonl")):
+        result = subprocess.run([sys.executable, str(REPO_DIR / "downsample_images.py"), "--input", "imgs",
+                                 "--output", "out"], cwd=tmp_path, env={**os.environ, "RUN_LOG": run_log},
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert cv2.imread(str(tmp_path / "out" / "a.png")).shape == (4, 4, 3)
+    record = json.loads((tmp_path / "run_log.jsonl").read_text().splitlines()[0])
+    assert record["script"] == "downsample_images"
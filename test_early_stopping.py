@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Tests for plateau detection and early stopping, driven by a stand-in trainer."""
+
+import math
+import os
+import sys
+import time
+from pathlib import Path
+
+from early_stopping import CHECKPOINT_RE, EarlyStopper, PlateauDetector
+from metrics_store import MetricsStore, run_and_record
+from run_3dgrut_train import saved_since
+
+# Loss decays towards 0.02, a checkpoint every 2000 steps; SIGINT exits like a Ctrl-C'd trainer.
+FAKE_TRAINER = r'''
+import math, signal, sys, time
+signal.signal(signal.SIGINT, lambda *_: (print("\nInterrupted, exiting"), sys.exit(130)))
+for step in range(100, 30001, 100):
+    loss = 0.02 + math.exp(-step / 2000)
+    sys.stdout.write(f"\rTraining {step}/30000 [00:01<00:10, 150.00it/s, loss={loss:.6f}]")
+    sys.stdout.flush()
+    if step % 2000 == 0:
+        print(f"\nSaved checkpoint to ckpt_{step}.pt")
+    time.sleep(0.002)
+print("\nTraining complete")
+'''
+
+
+def test_detector_waits_for_flat_window():
+    detector = PlateauDetector(metric="psnr", mode="max", window=1000, tolerance=0.01)
+    hits = [step for step in range(100, 10001, 100)
+            if detector.update(step, 30 - 10 * math.exp(-step / 1000))]
+    # Two full windows are needed; the gain then has to drop below 1% of the previous mean.
+    assert hits and hits[0] > 2000
+    previous = 30 - 10 * math.exp(-(hits[0] - 1500) / 1000)
+    assert 30 - 10 * math.exp(-(hits[0] - 500) / 1000) - previous < 0.011 * previous
+
+
+def test_trainer_stopped_after_checkpoint(tmp_path: Path):
+    db_path = tmp_path / "metrics.db"
+    stopper = EarlyStopper(PlateauDetector(window=1000, tolerance=0.01))
+    returncode, run_id = run_and_record([sys.executable, "-c", FAKE_TRAINER], tmp_path, "train", "plateau",
+                                        {}, store_path=db_path, stopper=stopper)
+    assert returncode == 130
+    assert stopper.plateau_step is not None and stopper.plateau_step < 30000
+    # Stopped on the progress line right after the first checkpoint following the plateau.
+    assert stopper.checkpoint_step == (stopper.plateau_step // 2000 + 1) * 2000
+    assert stopper.stop_step == stopper.checkpoint_step + 100
+
+    store = MetricsStore(db_path)
+    summary = store.summary(run_id)
+    assert summary["plateau_step"] == stopper.plateau_step
+    assert summary["early_stop_step"] == stopper.stop_step
+    last_step = store.conn.execute("SELECT MAX(step) FROM metrics WHERE name = 'loss'").fetchone()[0]
+    assert last_step < stopper.stop_step + 1000
+    store.close()
+
+
+def test_checkpoint_lines_need_whole_words():
+    for line in ("Saved checkpoint to ckpt_2000.pt", "Exporting PLY to runs/export_last.ply",
+                 "[INFO] Checkpoint saved", "wrote runs/ckpt_30000.pt"):
+        assert CHECKPOINT_RE.search(line), line
+    for line in ("Writing summary; applying densification", "[INFO] exporting multiply",
+                 "Densify: applying split, saved 1200 gaussians", "Densification: applying prune"):
+        assert not CHECKPOINT_RE.search(line), line
+    stopper = EarlyStopper(PlateauDetector(window=1000))
+    stopper.plateau_step = stopper.step = 5000
+    assert not stopper.observe("Densify: applying split, saved 1200 gaussians", [])
+    assert stopper.checkpoint_step is None
+
+
+def test_saved_since_only_counts_new_files_of_the_experiment(tmp_path: Path):
+    old = tmp_path / "exp-0101_000000" / "ckpt_1000.pt"
+    old.parent.mkdir()
+    old.write_bytes(b"")
+    os.utime(old, (time.time() - 3600,) * 2)
+    since = time.time() - 60
+    (tmp_path / "other-0101_000000").mkdir()
+    (tmp_path / "other-0101_000000" / "ckpt_2000.pt").write_bytes(b"")
+    assert saved_since(tmp_path, "exp", since) == []
+    new = tmp_path / "exp-0101_000000" / "ckpt_2000.pt"
+    new.write_bytes(b"")
+    assert saved_since(tmp_path, "exp", since) == [new]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Tests for sweep expansion and the experiment queue runner, with stand-in commands."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from experiment_queue import ExperimentQueue, expand_sweep
+
+# Records its start and end time, sleeps, and exits with the given code.
+STAND_IN = """
+import sys, time
+start = time.time()
+time.sleep(float(sys.argv[2]))
+with open(sys.argv[1], "w") as f:
+    f.write(f"{start} {time.time()}")
+sys.exit(int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+"""
+
+
+def _sweep(tmp_path: Path, jobs: dict, matrix: dict) -> dict:
+    script = tmp_path / "stand_in.py"
+    script.write_text(STAND_IN)
+    return {"vars": {"script": str(script), "out": str(tmp_path)}, "matrix": matrix, "jobs": jobs}
+
+
+def _intervals(tmp_path: Path, prefix: str) -> list[tuple[float, float]]:
+    return sorted(tuple(map(float, p.read_text().split())) for p in tmp_path.glob(f"{prefix}*.txt"))
+
+
+def _max_overlap(intervals: list[tuple[float, float]]) -> int:
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    current = peak = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def test_expand_sweep_follows_referenced_axes(tmp_path: Path):
+    spec = _sweep(tmp_path, {
+        "sfm": {"gpu": True, "command": ["{python}", "{script}", "{out}/sfm-{variant}-{matcher}.txt", "0"]},
+        "train": {"gpu": True, "after": ["sfm"], "command": ["{python}", "{script}", "{out}/train-{iterations}.txt", "0"]},
+    }, {"variant": ["Full", "Half"], "matcher": ["seq", "exh"], "iterations": [100, 200], "unused": [1, 2]})
+    jobs = expand_sweep(spec)
+    sfm = [job for job in jobs if job.template == "sfm"]
+    train = [job for job in jobs if job.template == "train"]
+    assert len(sfm) == 4 and len(train) == 8
+    job = next(job for job in train if job.id == "train[variant=Half,matcher=exh,iterations=200]")
+    assert job.after == ["sfm[variant=Half,matcher=exh]"]
+    assert job.command[-2].endswith("train-200.txt")
+
+    with pytest.raises(ValueError, match="undefined placeholders: missing"):
+        expand_sweep(_sweep(tmp_path, {"a": {"command": ["{missing}"]}}, {}))
+    with pytest.raises(ValueError, match="cycle"):
+        expand_sweep(_sweep(tmp_path, {"a": {"command": ["x"], "after": ["b"]},
+                                       "b": {"command": ["x"], "after": ["a"]}}, {}))
+
+
+def test_runner_respects_gpu_and_cpu_limits(tmp_path: Path):
+    jobs = expand_sweep(_sweep(tmp_path, {
+        "gpu": {"gpu": True, "command": ["{python}", "{script}", "{out}/gpu-{n}.txt", "0.3"]},
+        "cpu": {"cpus": 2, "command": ["{python}", "{script}", "{out}/cpu-{n}.txt", "0.3"]},
+    }, {"n": [1, 2, 3]}))
+    queue = ExperimentQueue(tmp_path / "queue.json")
+    assert queue.add(jobs) == 6
+    assert queue.add(jobs) == 0
+
+    counts = queue.run(cpus=5)
+    assert counts["done"] == 6
+    assert _max_overlap(_intervals(tmp_path, "gpu")) == 1
+    # 5 cores: the GPU job takes one, so two 2-core CPU jobs run side by side.
+    assert _max_overlap(_intervals(tmp_path, "cpu")) == 2
+    assert all(queue.log_path(job).is_file() for job in jobs)
+
+
+def test_failure_skips_dependents_and_resume(tmp_path: Path):
+    jobs = expand_sweep(_sweep(tmp_path, {
+        "sfm": {"command": ["{python}", "{script}", "{out}/sfm-{m}.txt", "0", "{m}"]},
+        "train": {"after": ["sfm"], "command": ["{python}", "{script}", "{out}/train-{m}.txt", "0"]},
+    }, {"m": [0, 3]}))
+    state = tmp_path / "queue.json"
+    queue = ExperimentQueue(state)
+    queue.add(jobs)
+    counts = queue.run(cpus=2)
+    assert counts == {"pending": 0, "running": 0, "done": 2, "failed": 1, "skipped": 1}
+    statuses = {job.id: (job.status, job.returncode) for job in queue.jobs()}
+    assert statuses["sfm[m=3]"] == ("failed", 3) and statuses["train[m=3]"] == ("skipped", None)
+
+    # A runner killed mid-job leaves it "running"; the next runner starts it again, done jobs stay done.
+    data = json.loads(state.read_text())
+    for record in data["jobs"]:
+        if record["id"] == "train[m=0]":
+            record["status"] = "running"
+    state.write_text(json.dumps(data))
+    (tmp_path / "sfm-0.txt").unlink()
+    assert queue.retry(("failed",)) == 1
+    counts = ExperimentQueue(state).run(cpus=2)
+    assert not (tmp_path / "sfm-0.txt").exists()
+    attempts = {job.id: job.attempts for job in queue.jobs()}
+    assert attempts == {"sfm[m=0]": 1, "sfm[m=3]": 2, "train[m=0]": 2, "train[m=3]": 0}
+    assert counts["failed"] == 1 and counts["skipped"] == 1 and counts["done"] == 2
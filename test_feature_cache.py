@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed feature cache, using databases from the stand-in colmap script.
+"""
+
+import sqlite3
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from feature_cache import FeatureCache, cache_from_env
+from test_colmap_database import make_shard
+from test_colmap_features import make_fake_colmap
+
+OPTIONS = ["--ImageReader.single_camera", "1", "--SiftExtraction.estimate_affine_shape", "1"]
+
+
+def extract(colmap: str, db_path: Path, names: list[str]) -> None:
+    list_path = db_path.with_suffix(".txt")
+    list_path.write_text("\n".join(names) + "\n")
+    subprocess.run([colmap, "feature_extractor", "--database_path", str(db_path),
+                    "--image_list_path", str(list_path)], check=True, capture_output=True)
+
+
+def test_keys_follow_content_and_feature_options(tmp_path: Path):
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "a.jpg").write_bytes(b"image a")
+    (images / "b.jpg").write_bytes(b"image a")
+    cache = FeatureCache(tmp_path / "cache", colmap=make_fake_colmap(tmp_path))
+
+    keys = cache.keys(images, ["a.jpg", "b.jpg"], OPTIONS)
+    assert keys["a.jpg"] == keys["b.jpg"]
+    assert cache.keys(images, ["a.jpg"], OPTIONS + ["--SiftExtraction.num_threads", "4"]) == {"a.jpg": keys["a.jpg"]}
+    assert cache.keys(images, ["a.jpg"], OPTIONS[2:])["a.jpg"] == keys["a.jpg"]
+    assert cache.keys(images, ["a.jpg"], ["--SiftExtraction.use_gpu", "0"])["a.jpg"] != keys["a.jpg"]
+
+    (images / "b.jpg").write_bytes(b"image b, edited")
+    assert cache.keys(images, ["b.jpg"], OPTIONS)["b.jpg"] != keys["b.jpg"]
+    cache.close()
+
+
+def test_store_and_restore_into_new_database(tmp_path: Path):
+    colmap = make_fake_colmap(tmp_path)
+    images = tmp_path / "images"
+    images.mkdir()
+    names = [f"frame_{i:03d}.jpg" for i in range(5)]
+    for name in names:
+        (images / name).write_bytes(name.encode())
+    cache = FeatureCache(tmp_path / "cache", colmap=colmap)
+    keys = cache.keys(images, names, OPTIONS)
+
+    extract(colmap, tmp_path / "first.db", names[:3])
+    assert cache.store(tmp_path / "first.db", keys) == 3
+    assert cache.cached(list(keys.values())) == {keys[name] for name in names[:3]}
+
+    # A second run extracts the misses and takes the rest from the cache, on the same camera.
+    db_path = tmp_path / "second.db"
+    extract(colmap, db_path, names[3:])
+    assert cache.restore(db_path, names[:3], keys, OPTIONS) == 3
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT name, camera_id, data FROM images JOIN keypoints USING (image_id)").fetchall()
+    assert sorted(r[0] for r in rows) == names
+    assert {r[1] for r in rows} == {1}
+    assert all(data == name.encode() for name, _, data in rows)
+    assert conn.execute("SELECT COUNT(*) FROM descriptors").fetchone()[0] == 5
+    conn.close()
+
+    # Without camera sharing every restored image gets its own camera.
+    extract(colmap, tmp_path / "third.db", names[3:4])
+    cache.restore(tmp_path / "third.db", names[:3], keys, OPTIONS[2:])
+    conn = sqlite3.connect(tmp_path / "third.db")
+    assert conn.execute("SELECT COUNT(*) FROM cameras").fetchone()[0] == 4
+    conn.close()
+    cache.close()
+
+
+def test_store_evicts_least_recently_used_beyond_cap(tmp_path: Path, monkeypatch):
+    colmap = make_fake_colmap(tmp_path)
+    images = tmp_path / "images"
+    images.mkdir()
+    names = [f"frame_{i:03d}.jpg" for i in range(4)]
+    for name in names:
+        (images / name).write_bytes(name.encode())
+    cache = FeatureCache(tmp_path / "cache", colmap=colmap)
+    keys = cache.keys(images, names, OPTIONS)
+    extract(colmap, tmp_path / "first.db", names[:3])
+    cache.store(tmp_path / "first.db", {name: keys[name] for name in names[:3]})
+    entry_size = cache.size() // 3
+    with cache.conn:
+        cache.conn.execute("UPDATE features SET used = used - 60 WHERE key = ?", (keys["frame_001.jpg"],))
+
+    # Using frame_000 again leaves frame_001 as the least recently used entry.
+    extract(colmap, tmp_path / "second.db", names[3:])
+    cache.restore(tmp_path / "second.db", names[:1], keys, OPTIONS)
+    cache.max_bytes = 3 * entry_size
+    assert cache.store(tmp_path / "second.db", keys) == 2
+    kept = {keys[name] for name in ("frame_000.jpg", "frame_002.jpg", "frame_003.jpg")}
+    assert cache.cached(list(keys.values())) == kept
+    assert cache.size() <= cache.max_bytes
+    assert cache.evict(0) == 3 and cache.size() == 0
+    cache.close()
+
+    monkeypatch.setenv("FEATURE_CACHE", str(tmp_path / "env_cache"))
+    monkeypatch.setenv("FEATURE_CACHE_MAX_GB", "0.5")
+    env_cache = cache_from_env()
+    assert env_cache.max_bytes == 500_000_000
+    env_cache.close()
+    monkeypatch.setenv("FEATURE_CACHE_MAX_GB", "0")
+    env_cache = cache_from_env()
+    assert env_cache.max_bytes is None
+    env_cache.close()
+    monkeypatch.setenv("FEATURE_CACHE", "0")
+    assert cache_from_env() is None
+
+
+@pytest.mark.parametrize("options, num_rigs", [(OPTIONS, 1), (OPTIONS[2:], 4)])
+def test_restore_adds_rigs_and_frames_on_new_schema(tmp_path: Path, options: list[str], num_rigs: int):
+    colmap = make_fake_colmap(tmp_path)
+    images = tmp_path / "images"
+    images.mkdir()
+    names = [f"frame_{i:03d}.jpg" for i in range(4)]
+    for name in names:
+        (images / name).write_bytes(name.encode())
+    cache = FeatureCache(tmp_path / "cache", colmap=colmap)
+    keys = cache.keys(images, names, options)
+    extract(colmap, tmp_path / "first.db", names[:3])
+    cache.store(tmp_path / "first.db", keys)
+
+    # A COLMAP >= 3.12 database from feature_extractor: the camera, its rig and a frame per image.
+    db_path = make_shard(tmp_path / "second.db", names[3:])
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE descriptors (image_id INTEGER PRIMARY KEY NOT NULL, rows INTEGER NOT NULL, "
+                 "cols INTEGER NOT NULL, data BLOB)")
+    conn.commit()
+    conn.close()
+    assert cache.restore(db_path, names[:3], keys, options) == 3
+    cache.close()
+
+    conn = sqlite3.connect(db_path)
+    frames = conn.execute("SELECT i.name, i.camera_id, r.ref_sensor_id, r.ref_sensor_type, d.sensor_id "
+                          "FROM images i JOIN frame_data d ON d.data_id = i.image_id AND d.sensor_type = 0 "
+                          "JOIN frames f ON f.frame_id = d.frame_id JOIN rigs r ON r.rig_id = f.rig_id").fetchall()
+    assert sorted(row[0] for row in frames) == names
+    assert all(camera == ref == sensor and ref_type == 0 for _, camera, ref, ref_type, sensor in frames)
+    assert conn.execute("SELECT COUNT(*) FROM rigs").fetchone()[0] == num_rigs
+    conn.close()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Tests for sparse point cloud filtering."""
+
+from pathlib import Path
+
+import numpy as np
+
+from colmap_model import read_model, select_points
+from filter_points import knn_mean_distance, statistical_outliers, voxel_downsample
+from test_colmap_model import write_test_model
+
+
+def test_knn_matches_brute_force():
+    rng = np.random.default_rng(1)
+    plane = np.c_[rng.random((2000, 2)) * 10, rng.normal(0, 0.01, 2000)]
+    stray = rng.random((10, 3)) * 10 + (0, 0, 5)
+    xyz = np.concatenate([plane, stray])
+
+    dist = np.sqrt(((xyz[:, None] - xyz[None]) ** 2).sum(axis=-1))
+    np.fill_diagonal(dist, np.inf)
+    expected = np.sort(dist, axis=1)[:, :8].mean(axis=1)
+    assert np.allclose(knn_mean_distance(xyz, k=8), expected, rtol=1e-5)
+    assert statistical_outliers(xyz, k=8)[-10:].all()
+
+
+def test_voxel_downsample_keeps_priority_point():
+    xyz = np.array([[0.0, 0, 0], [0.1, 0, 0], [5, 0, 0], [5.1, 0, 0]])
+    keep = voxel_downsample(xyz, target=2, priority=np.array([1.0, 3.0, 2.0, 0.0]))
+    assert keep.tolist() == [1, 2]
+
+
+def test_select_points_unlinks_keypoints(tmp_path: Path):
+    write_test_model(tmp_path, num_images=2, num_points=4)
+    model = select_points(read_model(tmp_path), np.array([True, False, True, False]))
+    assert model.points3D.ids.tolist() == [1, 3]
+    assert model.points3D.track_offsets.tolist() == [0, 2, 4]
+    assert model.images.point3D_ids.tolist() == [1, -1, 3, -1] * 2
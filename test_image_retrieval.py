@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Tests for global-descriptor retrieval and its descriptor cache."""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from colmap_matching import retrieval_pairs
+from image_retrieval import DESCRIPTOR_DIM, load_raw_descriptors, top_k_neighbours
+
+
+def write_image(path: Path, colour: tuple[int, int, int]) -> None:
+    import cv2
+    img = np.zeros((32, 32, 3), dtype=np.uint8)
+    img[:] = colour
+    img[8:24, 8:24] = (255, 255, 255)
+    cv2.imwrite(str(path), img)
+
+
+def test_top_k_neighbours_excludes_self_and_batches():
+    rng = np.random.default_rng(0)
+    desc = rng.normal(size=(50, 8)).astype(np.float32)
+    desc /= np.linalg.norm(desc, axis=1, keepdims=True)
+
+    neighbours = top_k_neighbours(desc, 5, batch_size=7)
+    sims = desc @ desc.T
+    np.fill_diagonal(sims, -np.inf)
+    assert np.array_equal(neighbours, np.argsort(-sims, axis=1)[:, :5])
+
+    subset = top_k_neighbours(desc, 5, queries=np.array([3, 40]))
+    assert np.array_equal(subset, neighbours[[3, 40]])
+    # k is capped at the other images; a single image has no neighbours.
+    assert top_k_neighbours(desc[:3], 10).shape == (3, 2)
+    assert top_k_neighbours(desc[:1], 10).shape == (1, 0)
+
+
+def test_retrieval_pairs_link_similar_images(tmp_path: Path):
+    colours = [(0, 0, 255), (0, 0, 250), (255, 0, 0), (250, 0, 0), (0, 255, 0), (0, 250, 0)]
+    names = [f"img_{i}.png" for i in range(len(colours))]
+    for name, colour in zip(names, colours):
+        write_image(tmp_path / name, colour)
+
+    pairs = retrieval_pairs(tmp_path, names, top_k=1)
+    assert {tuple(p) for p in pairs.tolist()} == {(0, 1), (2, 3), (4, 5)}
+    assert retrieval_pairs(tmp_path, names, top_k=1, queries=np.array([2])).tolist() == [[2, 3]]
+
+
+def test_descriptor_cache_follows_file_changes(tmp_path: Path, capsys):
+    images = tmp_path / "images"
+    images.mkdir()
+    cache_path = tmp_path / "retrieval_descriptors.npz"
+    write_image(images / "a.png", (0, 0, 255))
+    write_image(images / "b.png", (255, 0, 0))
+
+    first = load_raw_descriptors(images, ["a.png", "b.png"], cache_path)
+    assert first.shape == (2, DESCRIPTOR_DIM)
+    capsys.readouterr()
+    assert np.array_equal(load_raw_descriptors(images, ["b.png", "a.png"], cache_path), first[::-1])
+    assert "Computing" not in capsys.readouterr().out
+
+    # Replacing an image under the same name invalidates its cached row only.
+    write_image(images / "a.png", (0, 255, 0))
+    stat = (images / "a.png").stat()
+    os.utime(images / "a.png", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    replaced = load_raw_descriptors(images, ["a.png", "b.png"], cache_path)
+    assert "for 1 images (1 cached)" in capsys.readouterr().out
+    assert not np.array_equal(replaced[0], first[0])
+    assert np.array_equal(replaced[1], first[1])
+    with np.load(cache_path) as data:
+        assert sorted(data["names"].tolist()) == ["a.png", "b.png"]
+
+
+def test_descriptor_cache_without_stamps_is_recomputed(tmp_path: Path, capsys):
+    write_image(tmp_path / "a.png", (0, 0, 255))
+    cache_path = tmp_path / "retrieval_descriptors.npz"
+    np.savez(cache_path, names=np.array(["a.png"]), raw=np.zeros((1, DESCRIPTOR_DIM), np.float32))
+
+    raw = load_raw_descriptors(tmp_path, ["a.png"], cache_path)
+    assert "for 1 images (0 cached)" in capsys.readouterr().out
+    assert raw.sum() == pytest.approx(2.0)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Tests for zero-copy image staging."""
+
+import errno
+import os
+from pathlib import Path
+
+import pytest
+
+import image_staging
+from image_staging import Linker, is_staged, manifest_path, stage_images
+
+
+def make_images(root: Path, names: list[str]) -> Path:
+    for name in names:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        (root / name).write_bytes(name.encode())
+    return root
+
+
+def test_rerun_leaves_staged_files_alone(tmp_path: Path):
+    src = make_images(tmp_path / "src", ["a.jpg", "sub/b.jpg"])
+    first = stage_images(src, tmp_path / "dst")
+    assert sum(first.methods.values()) == 2
+    assert all(is_staged(src / name, tmp_path / "dst" / name) for name in ("a.jpg", "sub/b.jpg"))
+    second = stage_images(src, tmp_path / "dst")
+    assert not second.methods and second.unchanged == 2 and second.removed == 0
+
+
+def test_auto_mode_falls_back_when_hardlinks_fail(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    monkeypatch.setattr(image_staging.os, "link", cross_device)
+    src = make_images(tmp_path / "src", ["a.jpg", "b.jpg"])
+    report = stage_images(src, tmp_path / "dst")
+    assert "hardlink" not in report.methods and sum(report.methods.values()) == 2
+    assert (tmp_path / "dst" / "a.jpg").read_bytes() == b"a.jpg"
+    # A single explicit mode does not fall back.
+    with pytest.raises(OSError):
+        Linker("hardlink").link(src / "a.jpg", tmp_path / "other" / "a.jpg")
+
+
+def test_prune_removes_only_previously_staged_files(tmp_path: Path):
+    src = make_images(tmp_path / "src", ["a.jpg", "b.jpg"])
+    dst = tmp_path / "dst"
+    stage_images(src, dst)
+    make_images(dst, ["notes.txt", "a_mask.png"])     # written by other tools
+    report = stage_images(src, dst, names=["a.jpg"])
+    assert report.removed == 1 and not (dst / "b.jpg").exists()
+    assert (dst / "notes.txt").exists() and (dst / "a_mask.png").exists()
+    assert manifest_path(dst) == tmp_path / ".dst.staged" and manifest_path(dst).read_text() == "a.jpg\n"
+
+
+def test_prune_without_manifest_only_touches_images(tmp_path: Path):
+    src = make_images(tmp_path / "src", ["a.jpg"])
+    dst = make_images(tmp_path / "dst", ["old.jpg", "readme.txt"])
+    os.symlink(src / "a.jpg", dst / "stale.jpg")
+    report = stage_images(src, dst)
+    assert report.removed == 2
+    assert sorted(p.name for p in dst.iterdir()) == ["a.jpg", "readme.txt"]
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Tests for list-based image subsets and subset training runs."""
+
+from pathlib import Path
+
+from colmap_model import read_model
+from image_subsets import SubsetSpec, load_subset, make_subset_run, select_subset, write_subset
+from test_colmap_model import write_test_model
+
+
+def test_select_subset_keeps_front_back_pairs():
+    names = [f"frame_{i:06d}_{side}.jpg" for side in ("back", "front") for i in range(1, 11)]
+
+    odd = select_subset(names, SubsetSpec(every=2))
+    assert odd == [f"frame_{i:06d}_{side}.jpg" for side in ("back", "front") for i in (1, 3, 5, 7, 9)]
+
+    window = select_subset(names, SubsetSpec(start_s=4, end_s=8, frame_interval_s=2.0))
+    assert window == [f"frame_{i:06d}_{side}.jpg" for side in ("back", "front") for i in (3, 4, 5)]
+
+
+def test_subset_run_reuses_full_model(tmp_path: Path):
+    run_dir = tmp_path / "run"
+    write_test_model(run_dir / "sparse" / "0", num_images=4, num_points=10)
+    (run_dir / "images").mkdir()
+    for i in range(4):
+        (run_dir / "images" / f"img_{i:03d}.jpg").write_bytes(b"jpg")
+
+    names = select_subset([f"img_{i:03d}.jpg" for i in range(4)], SubsetSpec(every=2))
+    subset = load_subset(write_subset(tmp_path / "subsets" / "even", names, run_dir / "images", {"every": 2}))
+    assert subset.name == "even"
+    assert subset.names == ["img_000.jpg", "img_002.jpg"]
+
+    out_dir = make_subset_run(run_dir, subset)
+    assert out_dir == tmp_path / "run__even"
+    assert sorted(p.name for p in (out_dir / "images").iterdir()) == ["img_000.jpg", "img_002.jpg"]
+    assert read_model(out_dir / "sparse" / "0").images.names == ["img_000.jpg", "img_002.jpg"]
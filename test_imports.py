@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""Scripts import as libraries: no filesystem access or exit at import, heavy modules loaded lazily."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent
+LIGHT_MODULES = ["async_runner", "colmap_features", "downsample_images", "extract_360video_imu", "pipeline",
+                 "run_3dgrut_train", "run_batch", "skybox_faces", "colmap_matching"]
+
+
+def _run(code: str, tmp_path: Path) -> subprocess.CompletedProcess:
+    env = {**os.environ, "DATASET_ROOT": str(tmp_path / "missing"), "DATASETS_TOML": str(tmp_path / "none.toml")}
+    env.pop("DATASET", None)
+    return subprocess.run([sys.executable, *code], cwd=REPO_DIR, env=env, capture_output=True, text=True, timeout=60)
+
+
+@pytest.mark.parametrize("module", LIGHT_MODULES)
+def test_import_has_no_side_effects(module: str, tmp_path: Path):
+    code = f"import sys, {module}; print(sorted(m for m in ('cv2', 'tqdm') if m in sys.modules))"
+    result = _run(["-c", code], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+    assert not (tmp_path / "missing").exists()
+
+
+def test_help_without_dataset(tmp_path: Path):
+    result = _run(["extract_360video_imu.py", "--help"], tmp_path)
+    assert result.returncode == 0 and "--every-seconds" in result.stdout
+    result = _run(["extract_360video_imu.py"], tmp_path)
+    assert result.returncode == 1 and "video not found" in result.stderr
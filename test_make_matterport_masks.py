@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Tests for the Matterport skybox mask links."""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from image_staging import is_staged
+from make_matterport_masks import create_matterport_masks
+
+
+def write_image(path: Path, width: int, height: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cv2.imwrite(str(path), np.zeros((height, width, 3), dtype=np.uint8))
+
+
+def test_masks_follow_colmap_mask_layout(tmp_path: Path):
+    masks, images, out = tmp_path / "canonical", tmp_path / "images", tmp_path / "masks"
+    for name in ("top_mask.png", "bottom_mask.png", "other_mask.png"):
+        write_image(masks / name, 32, 32)
+    write_image(images / "pano1_skybox0.jpg", 32, 32)
+    write_image(images / "pano1_skybox3.jpg", 32, 32)
+    write_image(images / "pano1_skybox5.jpg", 16, 16)    # size mismatch: no mask
+    write_image(out / "gone_skybox1.jpg.png", 32, 32)   # image no longer there
+
+    create_matterport_masks(masks, images, out, mode="auto")
+    assert is_staged(masks / "top_mask.png", out / "pano1_skybox0.jpg.png")
+    assert is_staged(masks / "other_mask.png", out / "pano1_skybox3.jpg.png")
+    assert not (out / "pano1_skybox5.jpg.png").exists()
+    assert not (out / "gone_skybox1.jpg.png").exists()
+    # Nothing is written next to the input images.
+    assert sorted(p.name for p in images.iterdir()) == ["pano1_skybox0.jpg", "pano1_skybox3.jpg", "pano1_skybox5.jpg"]
+
+    # A re-run leaves the links alone.
+    mtime = (out / "pano1_skybox0.jpg.png").stat().st_mtime_ns
+    create_matterport_masks(masks, images, out, mode="auto")
+    assert (out / "pano1_skybox0.jpg.png").stat().st_mtime_ns == mtime
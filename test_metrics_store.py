@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Tests for live 3DGRUT log parsing, driven by a stand-in trainer."""
+
+import sys
+from pathlib import Path
+
+from metrics_store import LogParser, MetricsStore, run_and_record
+from run_3dgrut_eval import experiment_name
+
+FAKE_TRAINER = r'''
+import sys
+for step in (1000, 2000, 3000):
+    sys.stdout.write(f"\rTraining  {step}/3000 [00:10<00:20, {40 + step / 1000:.2f}it/s, loss={0.1 / step:.5f}]")
+    sys.stdout.flush()
+print()
+print("┃ n_steps ┃ n_epochs ┃ training_time ┃ iteration_speed ┃")
+print("│ 3000    │ 6        │ 70.50 s       │ 42.55 it/s      │")
+print("\x1b[1mMean PSNR : 27.125\x1b[0m")
+print("Mean LPIPS: 0.301")
+sys.exit(3)
+'''
+
+
+def test_parser_tracks_step_and_tables():
+    parser = LogParser()
+    assert parser.feed(" 45%|████▌     | 1350/3000 [00:20<00:30, 51.18it/s, loss=0.0231]") == [
+        (1350, "it_s", 51.18), (1350, "loss", 0.0231)]
+    assert parser.feed("┃ Mean PSNR ┃ Mean SSIM ┃") == []
+    assert parser.feed("│ 28.211    │ 0.886     │") == [(1350, "mean_psnr", 28.211), (1350, "mean_ssim", 0.886)]
+    assert parser.feed("Std PSNR  : 3.361") == [(1350, "std_psnr", 3.361)]
+
+
+def test_run_and_record_stores_metrics(tmp_path: Path):
+    db_path = tmp_path / "metrics.db"
+    returncode, run_id = run_and_record([sys.executable, "-c", FAKE_TRAINER], tmp_path, "train", "FullSet_QuarterRes",
+                                        {"n_iterations": 3000}, store_path=db_path)
+    assert returncode == 3
+
+    store = MetricsStore(db_path)
+    (run,) = store.runs(["FullSet%"])
+    assert run["run_id"] == run_id and run["returncode"] == 3
+    summary = store.summary(run_id)
+    assert summary["it_s"] == 42.0  # median of the progress samples
+    assert summary["loss"] == round(0.1 / 3000, 5)
+    assert summary["training_time"] == 70.5 and summary["n_steps"] == 3000
+    assert summary["mean_psnr"] == 27.125 and summary["mean_lpips"] == 0.301
+    steps = [row[0] for row in store.conn.execute("SELECT step FROM metrics WHERE name = 'it_s' ORDER BY rowid")]
+    assert steps == [1000, 2000, 3000]
+    store.close()
+
+
+def test_eval_experiment_matches_training_run():
+    runs = Path("/data/ds/3dgrut_runs/FullSet_QuarterRes")
+    assert experiment_name(runs / "FullSet_QuarterRes-1009_145116" / "ours_100000" / "ckpt_100000.pt") == \
+        "FullSet_QuarterRes"
+    run = runs / "FullSet_QuarterRes__filtered__even__50000it__ds2-0110_080000"
+    assert experiment_name(run / "ours_50000" / "ckpt_50000.pt") == "FullSet_QuarterRes__filtered__even__50000it__ds2"
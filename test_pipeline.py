@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Tests for the pipeline DAG: dependency order, hash-based skipping and concurrent branches."""
+
+import os
+import sys
+from pathlib import Path
+
+from pipeline import Pipeline, Stage
+
+# Concatenates the input files into the output file (after a short sleep), logging start and end times.
+STAND_IN = """
+import sys, time
+out, times, *inputs = sys.argv[1:]
+start = time.time()
+time.sleep(0.3)
+text = "".join(open(p).read() for p in inputs) + out.rsplit("/", 1)[-1] + "\\n"
+open(out, "w").write(text)
+open(times, "a").write(f"{out.rsplit('/', 1)[-1]} {start} {time.time()}\\n")
+"""
+
+
+def _pipeline(tmp_path: Path, factors: list[int]) -> Pipeline:
+    script = tmp_path / "stand_in.py"
+    script.write_text(STAND_IN)
+    source, times = tmp_path / "source.txt", tmp_path / "times.txt"
+    pipeline = Pipeline(tmp_path / "pipeline_state.json")
+
+    def stage(name: str, inputs: list[Path], **kwargs) -> Path:
+        out = tmp_path / f"{name}.txt"
+        pipeline.add(Stage(name, [sys.executable, str(script), str(out), str(times), *map(str, inputs)],
+                           inputs=inputs, outputs=[out], **kwargs))
+        return out
+
+    for factor in factors:
+        images = stage(f"downsample_x{factor}", [source], params={"factor": factor})
+        sparse = stage(f"sfm_x{factor}", [images], gpu=True)
+        stage(f"train_x{factor}", [sparse], gpu=True)
+    return pipeline
+
+
+def _ran(tmp_path: Path) -> list[tuple[str, float, float]]:
+    times = tmp_path / "times.txt"
+    rows = [line.split() for line in times.read_text().splitlines()] if times.exists() else []
+    times.unlink(missing_ok=True)
+    return [(name[:-4], float(start), float(end)) for name, start, end in rows]
+
+
+def test_dependencies_follow_inputs(tmp_path: Path):
+    pipeline = _pipeline(tmp_path, [2, 4])
+    deps = pipeline.dependencies()
+    assert deps["sfm_x2"] == ["downsample_x2"] and deps["train_x4"] == ["sfm_x4"]
+    assert deps["downsample_x2"] == []
+    order = pipeline.order()
+    assert order.index("downsample_x4") < order.index("sfm_x4") < order.index("train_x4")
+
+
+def test_skips_unchanged_and_reruns_downstream(tmp_path: Path):
+    (tmp_path / "source.txt").write_text("images v1\n")
+    outcome = _pipeline(tmp_path, [2, 4]).run(jobs=4)
+    assert set(outcome.values()) == {"done"}
+    ran = _ran(tmp_path)
+    assert len(ran) == 6
+    # The two downsample branches overlap; GPU stages never do.
+    spans = {name: (start, end) for name, start, end in ran}
+    assert spans["downsample_x4"][0] < spans["downsample_x2"][1] and spans["downsample_x2"][0] < spans["downsample_x4"][1]
+    gpu = sorted(span for name, span in spans.items() if not name.startswith("downsample"))
+    assert all(a[1] <= b[0] for a, b in zip(gpu, gpu[1:]))
+
+    # Same content, new mtime: nothing runs.
+    os.utime(tmp_path / "source.txt", (1, 1))
+    outcome = _pipeline(tmp_path, [2, 4]).run(jobs=4)
+    assert set(outcome.values()) == {"up to date"} and _ran(tmp_path) == []
+
+    # A parameter change re-runs only that stage; its output is unchanged here, so nothing below it.
+    pipeline = _pipeline(tmp_path, [2, 4])
+    pipeline.stages["downsample_x4"].params["interpolation"] = "lanczos"
+    assert pipeline.run(jobs=4, dry_run=True) == {
+        "downsample_x2": "up to date", "sfm_x2": "up to date", "train_x2": "up to date",
+        "downsample_x4": "stale", "sfm_x4": "stale", "train_x4": "stale"}
+    outcome = pipeline.run(jobs=4)
+    assert [name for name, _, _ in _ran(tmp_path)] == ["downsample_x4"]
+    assert outcome["sfm_x4"] == "up to date"
+
+    # New input content rebuilds everything downstream of it.
+    (tmp_path / "source.txt").write_text("images v2\n")
+    outcome = _pipeline(tmp_path, [2]).run(jobs=4)
+    assert set(outcome.values()) == {"done"} and len(_ran(tmp_path)) == 3
+    assert (tmp_path / "train_x2.txt").read_text().startswith("images v2")
+
+    # A deleted output re-runs its stage; identical output leaves the stages below untouched.
+    (tmp_path / "sfm_x2.txt").unlink()
+    outcome = _pipeline(tmp_path, [2, 4]).run(jobs=4)
+    assert outcome["sfm_x2"] == "done" and outcome["train_x2"] == "up to date"
+
+
+def test_failure_blocks_downstream(tmp_path: Path):
+    pipeline = _pipeline(tmp_path, [2])  # source.txt missing
+    outcome = pipeline.run(jobs=2)
+    assert outcome == {"downsample_x2": "failed", "sfm_x2": "blocked", "train_x2": "blocked"}
+
+
+def test_workflow_stage_outputs_match_what_training_writes(tmp_path: Path, monkeypatch):
+    import config
+    from pipeline import photo_pipeline, video_pipeline
+    from run_3dgrut_train import record_last_run
+    monkeypatch.setattr(config, "DATASET_PATH", tmp_path)
+
+    pipelines = [photo_pipeline(tmp_path / "_source" / "original", [2, 4]),
+                 video_pipeline(tmp_path / "video.insv", 5, ["front", "both"])]
+    trains = [stage for pipeline in pipelines for stage in pipeline.stages.values() if stage.name.startswith("train_")]
+    assert [stage.name for stage in trains] == ["train_x2", "train_x4", "train_front", "train_both"]
+    out_dir = tmp_path / "3dgrut_runs"
+    for pipeline in pipelines:
+        deps = pipeline.dependencies()
+        assert all(deps[name] == [name.replace("train_", "sfm_")] for name in deps if name.startswith("train_"))
+
+    # 3DGRUT writes <experiment>-<DDMM_HHMMSS>/ per run; training records it in the declared output.
+    for stage in trains:
+        experiment = Path(stage.command[stage.command.index("--run") + 1]).name
+        run = out_dir / f"{experiment}-1810_120000"
+        (run / "ckpt").mkdir(parents=True)
+        (run / "ckpt" / "export_last.ply").write_bytes(b"ply")
+        assert not any(path.exists() for path in stage.outputs)
+        assert record_last_run(out_dir, experiment, since=0) == run
+        assert all(path.exists() for path in stage.outputs)
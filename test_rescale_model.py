@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Tests for rescaling a sparse model to another image resolution."""
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from colmap_model import read_model
+from rescale_model import scale_model, target_scales
+from test_colmap_model import write_test_model
+
+
+def test_rescale_to_double_resolution(tmp_path: Path):
+    write_test_model(tmp_path / "model", num_images=3, num_points=5)
+    model = read_model(tmp_path / "model")
+    for name in model.images.names:
+        cv2.imwrite(str(tmp_path / name), np.zeros((960, 1280, 3), np.uint8))
+
+    scales, sizes = target_scales(model, tmp_path)
+    assert scales == {1: (2.0, 2.0)} and sizes == {1: (1280, 960)}
+
+    scaled = scale_model(model, scales, sizes)
+    assert scaled.cameras.camera_params(0).tolist() == [1000.0, 1020.0, 640.0, 480.0]
+    assert scaled.cameras.widths.tolist() == [1280]
+    assert np.allclose(scaled.images.xys, 2 * model.images.xys)
+    assert np.array_equal(scaled.images.tvecs, model.images.tvecs)
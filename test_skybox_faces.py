@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Tests for skybox face stitching."""
+
+import cv2
+import numpy as np
+
+from skybox_faces import _yaw_rotation, face_rotations, parse_skybox_name, stitch_lut
+
+
+def _direction_colours(dirs: np.ndarray) -> np.ndarray:
+    dirs = dirs / np.linalg.norm(dirs, axis=-1, keepdims=True)
+    return ((dirs + 1) * 127).astype(np.float32)
+
+
+def _pixel_rays(width: int, height: int, focal: float) -> np.ndarray:
+    u = (np.arange(width) + 0.5 - width / 2) / focal
+    v = (np.arange(height) + 0.5 - height / 2) / focal
+    return np.stack(np.broadcast_arrays(u[None, :], v[:, None], 1.0), axis=-1)
+
+
+def test_stitched_view_matches_cube():
+    # Faces rendered from a colour field over directions must stitch into the same field.
+    size = 128
+    rotations = face_rotations()
+    faces = {f: _direction_colours(_pixel_rays(size, size, size / 2) @ rotations[f].T) for f in range(6)}
+
+    for yaw in (45.0, 170.0):
+        map_x, map_y, used = stitch_lut(size, yaw, 130.0)
+        atlas = np.concatenate([faces[f] for f in used], axis=0)
+        view = cv2.remap(atlas, map_x, map_y, cv2.INTER_LINEAR)
+        height, width = map_x.shape
+        expected = _direction_colours(_pixel_rays(width, height, size / 2) @ _yaw_rotation(np.deg2rad(yaw)).T)
+        assert width > size
+        assert np.abs(view - expected).max() < 1.0
+
+
+def test_parse_skybox_name():
+    assert parse_skybox_name("abc_skybox3.jpg") == ("abc", 3)
+    assert parse_skybox_name("floor1/abc_skybox0.jpg") == ("floor1/abc", 0)
+    assert parse_skybox_name("abc_skybox3_mask.png") is None
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Tests for stage telemetry and the results tables built from it."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from results_table import group_runs, markdown_tables, read_run_logs
+from telemetry import RunLog
+
+# Holds ~200 MB for half a second and writes 5 MB.
+CHILD = """
+import sys, time
+block = bytearray(200 * 1024 * 1024)
+for i in range(0, len(block), 4096):
+    block[i] = 1
+time.sleep(0.6)
+open(sys.argv[1], "wb").write(b"x" * 5 * 1024 * 1024)
+"""
+
+
+def test_stage_records_subprocess_resources(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv("RUN_LOG", str(tmp_path / "run_log.jsonl"))
+    log = RunLog("colmap_sfm_test", variant="FullSet_QuarterRes", run_dir=tmp_path / "run_a")
+    with log.stage("matching", matcher="exhaustive_matcher") as info:
+        subprocess.run([sys.executable, "-c", CHILD, str(tmp_path / "out.bin")], check=True)
+        info["pairs"] = 10
+    with pytest.raises(RuntimeError):
+        with log.stage("mapper"):
+            raise RuntimeError("mapper failed")
+
+    matching, mapper = read_run_logs([tmp_path / "run_log.jsonl"])
+    assert matching["stage"] == "matching" and matching["status"] == "ok"
+    assert matching["wall_s"] >= 0.5 and matching["cpu_s"] > 0
+    assert matching["peak_rss_mb"] >= 150
+    assert matching["write_mb"] >= 5
+    assert matching["pairs"] == 10 and matching["run_dir"] == str(tmp_path / "run_a")
+    assert mapper["status"] == "failed" and mapper["run_id"] == matching["run_id"]
+
+
+def test_markdown_tables_group_runs_by_script(tmp_path: Path):
+    records = [
+        {"run_id": "a", "script": "colmap_sfm_pinhole", "dataset": "D", "stage": "feature_extraction",
+         "start": "2026-01-01T10:00:00", "wall_s": 30.0, "cpu_s": 100.0, "peak_rss_mb": 900.0,
+         "read_mb": 10.0, "write_mb": 5.0, "status": "ok", "run_dir": "/data/D/colmap_runs/FullSet_QuarterRes"},
+        {"run_id": "a", "script": "colmap_sfm_pinhole", "dataset": "D", "stage": "mapper",
+         "start": "2026-01-01T10:00:30", "wall_s": 90.0, "cpu_s": 300.0, "peak_rss_mb": 2048.0,
+         "read_mb": 1.0, "write_mb": 1.0, "status": "ok"},
+        {"run_id": "b", "script": "run_3dgrut_train", "dataset": "D", "stage": "train",
+         "start": "2026-01-01T11:00:00", "wall_s": 790.4, "cpu_s": 800.0, "peak_rss_mb": 4000.0,
+         "read_mb": 0.0, "write_mb": 0.0, "status": "failed", "experiment_name": "FullSet_QuarterRes"},
+    ]
+    text = markdown_tables(group_runs(records))
+    assert text.count("# D\n") == 1
+    assert "## colmap_sfm_pinhole" in text and "## run_3dgrut_train" in text
+    assert ("| FullSet_QuarterRes | 2026-01-01 10:00:00 | 30.00 s | 1.500 min | 2.000 min | 6.667 min "
+            "| 2.00 GB | 11 MB | 6 MB | ok |") in text
+    assert "| failed |" in text